@@ -4,11 +4,11 @@ Main Flask application entry point
 """
 
 import os
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from datetime import timedelta
-import logging
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,8 +16,22 @@ load_dotenv()
 
 def create_app():
     """Application factory pattern"""
+    started = time.perf_counter()
     app = Flask(__name__)
     
+    # Behind a reverse proxy, take the client address from X-Forwarded-For so
+    # rate limits and logs see clients rather than the proxy. Only as many
+    # hops as there are trusted proxies are honoured; more would let clients
+    # spoof their address.
+    trusted_proxies = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+    if trusted_proxies:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+    
+    # Encode responses with orjson when available; models serialize via __json__
+    from backend.utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-secret-key')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-secret-key')
@@ -29,11 +43,9 @@ def create_app():
     CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','))
     jwt = JWTManager(app)
     
-    # Configure logging
-    logging.basicConfig(
-        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    # Configure logging (records are sampled and written by a background thread)
+    from backend.utils.logging_config import configure_logging, logging_stats
+    configure_logging()
     
     # Register blueprints
     from routes.auth import auth_bp
@@ -48,15 +60,31 @@ def create_app():
     app.register_blueprint(orders_bp, url_prefix='/api/orders')
     app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     
+    from backend.utils.database import db_manager
+    from backend.utils.passwords import password_hasher
+    
+    # Calibrate the bcrypt cost once per worker before serving logins
+    app.config['BCRYPT_ROUNDS'] = password_hasher.rounds
+    
     # Health check endpoint
     @app.route('/health')
     def health_check():
         return jsonify({
             'status': 'healthy',
             'service': 'e-commerce-chatbot-api',
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'worker': {
+                'app_startup_ms': app.config['APP_STARTUP_MS'],
+                **db_manager.get_startup_report(),
+                'logging': logging_stats()
+            }
         })
     
+    @app.route('/health/cache')
+    def cache_health():
+        from backend.utils.cache import cache_stats
+        return jsonify(cache_stats())
+    
     # Global error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -67,11 +95,42 @@ def create_app():
         return jsonify({'error': 'Internal server error'}), 500
     
     # Rate limiting middleware
+    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+    from backend.utils.rate_limit import rate_limiter, buckets_for_request, apply_headers
+    
     @app.before_request
     def rate_limit():
-        # Basic rate limiting logic would go here
-        # For now, just log the request
-        app.logger.info(f"Request: {request.method} {request.path} from {request.remote_addr}")
+        app.logger.info("Request: %s %s from %s", request.method, request.path, request.remote_addr,
+                        extra={'route': request.endpoint})
+        if request.method == 'OPTIONS' or request.path.startswith('/health'):
+            return None
+        
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+        except Exception:
+            # Invalid or expired tokens are rejected by the route itself
+            user_id = None
+        
+        buckets = buckets_for_request(request.endpoint, request.remote_addr or 'unknown', user_id)
+        state = rate_limiter.check(buckets)
+        g.rate_limit = state
+        if state is not None and not state.allowed:
+            app.logger.warning("Rate limited %s for %s", request.path, user_id or request.remote_addr)
+            response = jsonify({'error': 'Too many requests', 'retry_after': state.retry_after})
+            response.status_code = 429
+            return apply_headers(response, state)
+        return None
+    
+    @app.after_request
+    def rate_limit_headers(response):
+        state = g.get('rate_limit')
+        if state is not None and state.allowed:
+            apply_headers(response, state)
+        return response
+    
+    app.config['APP_STARTUP_MS'] = round((time.perf_counter() - started) * 1000, 3)
+    app.logger.info(f"Application created in {app.config['APP_STARTUP_MS']} ms (pid {os.getpid()})")
     
     return app
 
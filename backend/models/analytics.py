@@ -0,0 +1,289 @@
+"""
+Analytics models and database operations
+"""
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from backend.utils.database import db_manager, copy_rows
+import psycopg2
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AnalyticsEvent:
+    """Client telemetry event, written in bulk"""
+    
+    COLUMNS = (
+        'id', 'user_id', 'session_id', 'event_type', 'event_data',
+        'ip_address', 'user_agent', 'created_at'
+    )
+    
+    def __init__(self, event_id=None, event_type=None, event_data=None,
+                 user_id=None, session_id=None, ip_address=None,
+                 user_agent=None, created_at=None):
+        self.event_id = event_id or str(uuid.uuid4())
+        self.event_type = event_type
+        self.event_data = event_data or {}
+        self.user_id = user_id
+        self.session_id = session_id
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.created_at = created_at or datetime.utcnow()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert event to dictionary"""
+        return {
+            'id': self.event_id,
+            'event_type': self.event_type,
+            'event_data': self.event_data,
+            'user_id': self.user_id,
+            'session_id': self.session_id,
+            'ip_address': self.ip_address,
+            'user_agent': self.user_agent,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def to_row(self) -> tuple:
+        """Convert event to a row tuple ordered like COLUMNS"""
+        return (
+            self.event_id, self.user_id, self.session_id, self.event_type,
+            self.event_data, self.ip_address, self.user_agent, self.created_at
+        )
+    
+    @classmethod
+    def save_many(cls, events: List['AnalyticsEvent']) -> int:
+        """Write a batch of events with one COPY stream
+        
+        COPY fails as a whole if any row is rejected (e.g. a user_id that
+        violates the foreign key), so a batch failing on bad data is split in
+        half and retried until the offending rows are isolated and dropped.
+        Connection and pool errors are raised unchanged so the caller can
+        retry the whole batch later. Returns the number of events written.
+        """
+        if not events:
+            return 0
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                return copy_rows(cursor, 'analytics_events', cls.COLUMNS,
+                                 [event.to_row() for event in events])
+                
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            if len(events) == 1:
+                logger.error(f"Dropping analytics event {events[0].event_id}: {e}")
+                return 0
+            middle = len(events) // 2
+            return cls.save_many(events[:middle]) + cls.save_many(events[middle:])
+
+class SalesRollup:
+    """Pre-aggregated orders and revenue per day, week or month
+    
+    Rows are maintained incrementally by the maintain_sales_rollups
+    trigger on orders (see scripts/init-db.sql), so reports read one row
+    per bucket and shard instead of scanning orders.
+    """
+    
+    PERIODS = ('day', 'week', 'month')
+    
+    @classmethod
+    def report(cls, start_date, end_date, period: str = 'day') -> List[Dict[str, Any]]:
+        """Orders and revenue per bucket between two dates (inclusive)"""
+        if period not in cls.PERIODS:
+            raise ValueError(f"Unsupported period: {period}")
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                # Include the bucket that contains start_date
+                cursor.execute("""
+                    SELECT bucket_start, SUM(orders_count) AS orders, SUM(revenue) AS revenue
+                    FROM sales_rollups
+                    WHERE period = %s
+                    AND bucket_start >= date_trunc(%s, %s::date)::date
+                    AND bucket_start <= %s::date
+                    GROUP BY bucket_start
+                    ORDER BY bucket_start
+                """, (period, period, start_date, end_date))
+                rows = cursor.fetchall()
+                
+                return [
+                    {
+                        'date': row['bucket_start'].isoformat(),
+                        'orders': int(row['orders']),
+                        'revenue': float(row['revenue'])
+                    }
+                    for row in rows
+                ]
+                
+        except Exception as e:
+            logger.error(f"Failed to read sales rollups ({period}, {start_date} - {end_date}): {e}")
+            return []
+    
+    @classmethod
+    def rebuild(cls) -> bool:
+        """Recompute every rollup from orders, e.g. after a backfill
+        
+        Runs in one transaction and blocks order writes while it runs, so
+        the trigger-maintained deltas cannot drift from the rebuilt totals.
+        """
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("LOCK TABLE orders IN SHARE MODE")
+                cursor.execute("DELETE FROM sales_rollups")
+                for period in cls.PERIODS:
+                    cursor.execute("""
+                        INSERT INTO sales_rollups (period, bucket_start, shard, orders_count, revenue)
+                        SELECT %s, date_trunc(%s, created_at AT TIME ZONE 'UTC')::date, 0,
+                               COUNT(*), COALESCE(SUM(total_amount), 0)
+                        FROM orders
+                        WHERE status <> 'cancelled'
+                        GROUP BY 2
+                    """, (period, period))
+                
+                logger.info("Sales rollups rebuilt from orders")
+                return True
+                
+        except Exception as e:
+            logger.error(f"Failed to rebuild sales rollups: {e}")
+            return False
+
+class ChatReport:
+    """Chat analytics computed from stored messages"""
+    
+    @classmethod
+    def common_intents(cls, start_date, end_date) -> List[Dict[str, Any]]:
+        """User messages per classified intent between two dates (inclusive)"""
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("""
+                    SELECT COALESCE(metadata->>'intent', 'other') AS intent, COUNT(*) AS count
+                    FROM chat_messages
+                    WHERE sender_type = 'user'
+                    AND created_at >= %s::date
+                    AND created_at < %s::date + 1
+                    GROUP BY 1
+                    ORDER BY count DESC
+                """, (start_date, end_date))
+                rows = cursor.fetchall()
+                
+                total = sum(row['count'] for row in rows)
+                return [
+                    {
+                        'intent': row['intent'],
+                        'count': row['count'],
+                        'percentage': round(row['count'] * 100.0 / total, 1)
+                    }
+                    for row in rows
+                ]
+                
+        except Exception as e:
+            logger.error(f"Failed to count chat intents ({start_date} - {end_date}): {e}")
+            return []
+
+class DashboardMetrics:
+    """Aggregations behind the analytics dashboard, one query group per section
+    
+    Methods raise on database errors so the dashboard cache can keep
+    serving the previous payload instead of caching an empty one.
+    """
+    
+    @classmethod
+    def users(cls) -> Dict[str, Any]:
+        with db_manager.get_pg_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS total_users FROM users WHERE is_active = true")
+            return {'total_users': cursor.fetchone()['total_users']}
+    
+    @classmethod
+    def sessions(cls) -> Dict[str, Any]:
+        with db_manager.get_pg_cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'active'
+                                     AND updated_at > now() - interval '30 minutes') AS active_sessions,
+                    COALESCE(AVG(EXTRACT(EPOCH FROM (updated_at - created_at))), 0) AS avg_session_duration
+                FROM chat_sessions
+                WHERE created_at > now() - interval '30 days'
+            """)
+            row = cursor.fetchone()
+            return {
+                'active_sessions': row['active_sessions'],
+                'avg_session_duration': round(float(row['avg_session_duration']))
+            }
+    
+    @classmethod
+    def sales(cls) -> Dict[str, Any]:
+        with db_manager.get_pg_cursor() as cursor:
+            # Monthly rollups: a handful of rows instead of scanning orders
+            cursor.execute("""
+                SELECT COALESCE(SUM(orders_count), 0) AS total_orders,
+                       COALESCE(SUM(revenue), 0) AS revenue
+                FROM sales_rollups WHERE period = 'month'
+            """)
+            totals = cursor.fetchone()
+            cursor.execute("""
+                SELECT COUNT(*) AS sessions FROM chat_sessions
+                WHERE created_at > now() - interval '30 days'
+            """)
+            sessions = cursor.fetchone()['sessions']
+            cursor.execute("""
+                SELECT COUNT(*) AS orders FROM orders
+                WHERE created_at > now() - interval '30 days' AND status <> 'cancelled'
+            """)
+            recent_orders = cursor.fetchone()['orders']
+            return {
+                'total_orders': int(totals['total_orders']),
+                'revenue': float(totals['revenue']),
+                'conversion_rate': round(100.0 * recent_orders / sessions, 1) if sessions else 0.0
+            }
+    
+    @classmethod
+    def top_products(cls, limit: int = 5) -> Dict[str, Any]:
+        with db_manager.get_pg_cursor() as cursor:
+            cursor.execute("""
+                SELECT p.name, SUM(oi.quantity) AS sales, SUM(oi.total_price) AS revenue
+                FROM order_items oi
+                JOIN products p ON p.product_id = oi.product_id
+                WHERE oi.created_at > now() - interval '30 days'
+                GROUP BY p.product_id, p.name
+                ORDER BY revenue DESC
+                LIMIT %s
+            """, (limit,))
+            return {'top_products': [
+                {'name': row['name'], 'sales': int(row['sales']), 'revenue': float(row['revenue'])}
+                for row in cursor.fetchall()
+            ]}
+    
+    @classmethod
+    def chat(cls) -> Dict[str, Any]:
+        with db_manager.get_pg_cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*) AS total_messages,
+                       COUNT(DISTINCT session_id) AS sessions
+                FROM chat_messages
+                WHERE created_at > now() - interval '30 days'
+            """)
+            row = cursor.fetchone()
+            return {'chat_metrics': {
+                'total_messages': row['total_messages'],
+                'avg_messages_per_session': round(row['total_messages'] / row['sessions'], 1)
+                if row['sessions'] else 0.0
+            }}
+    
+    @classmethod
+    def traffic_sources(cls) -> Dict[str, Any]:
+        with db_manager.get_pg_cursor() as cursor:
+            cursor.execute("""
+                SELECT COALESCE(event_data->>'source', 'direct') AS source,
+                       COUNT(DISTINCT COALESCE(session_id::text, ip_address::text)) AS visitors
+                FROM analytics_events
+                WHERE event_type = 'page_view' AND created_at > now() - interval '30 days'
+                GROUP BY 1
+                ORDER BY visitors DESC
+            """)
+            rows = cursor.fetchall()
+            total = sum(row['visitors'] for row in rows)
+            return {'traffic_sources': [
+                {
+                    'source': row['source'],
+                    'visitors': row['visitors'],
+                    'percentage': round(100.0 * row['visitors'] / total, 1)
+                }
+                for row in rows
+            ]}
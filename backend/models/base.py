@@ -0,0 +1,69 @@
+"""
+Shared helpers for slot-based models
+"""
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """Accept a datetime (from psycopg2) or an ISO 8601 string (from caches)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class SlotModel:
+    """Base for slot-based models
+    
+    ``__json__`` hands the JSON provider the raw field values (datetimes,
+    Decimals, UUIDs) so they are encoded natively rather than converted
+    field by field in ``to_dict``. ``JSON_FIELDS`` limits the fields
+    exposed; it defaults to every slot.
+    """
+    
+    __slots__ = ()
+    JSON_FIELDS = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = tuple(cls.JSON_FIELDS or cls.__slots__)
+        cls._json_fields = fields
+        cls._json_values = attrgetter(*fields)
+    
+    def __json__(self) -> Dict[str, Any]:
+        return dict(zip(self._json_fields, self._json_values(self)))
+
+
+class RowMapper:
+    """Build model instances straight from database rows
+    
+    Skips ``dict(row)``, ``from_dict`` and ``__init__``: a mapping function
+    specialised for the class (generated once, as dataclasses does for
+    ``__init__``) assigns each slot from the row column of the same name,
+    keeping values as psycopg2 returns them. ``defaults`` maps slot names
+    to factories used when the column is missing or NULL.
+    """
+    
+    def __init__(self, cls: type, defaults: Dict[str, Callable[[], Any]] = None):
+        self.cls = cls
+        defaults = defaults or {}
+        namespace = {'_new': object.__new__, '_cls': cls}
+        lines = ['def map_row(row):', '    obj = _new(_cls)', '    get = row.get']
+        for name in cls.__slots__:
+            if name in defaults:
+                namespace[f'_default_{name}'] = defaults[name]
+                lines.append(f'    value = get({name!r})')
+                lines.append(f'    obj.{name} = _default_{name}() if value is None else value')
+            else:
+                lines.append(f'    obj.{name} = get({name!r})')
+        lines.append('    return obj')
+        exec('\n'.join(lines), namespace)
+        self.map_row = namespace['map_row']
+    
+    def __call__(self, row) -> Any:
+        return self.map_row(row)
+    
+    def map_all(self, rows: Iterable) -> List[Any]:
+        """Map every row in order"""
+        return list(map(self.map_row, rows))
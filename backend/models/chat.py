@@ -3,15 +3,22 @@ Chat session and message models with database operations
 """
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from backend.utils.database import db_manager
+from typing import Optional, Dict, Any, List, Iterator
+from backend.utils.database import db_manager, bulk_upsert
+from backend.models.base import SlotModel, RowMapper, parse_datetime
+from backend.utils.cache import session_cache, recent_messages, CACHE_MISS
+from backend.utils.pagination import Page, InvalidCursor, KEYSET_TYPES, encode_cursor, decode_cursor
+from backend.services.intents import intent_classifier
+import psycopg2
 import logging
 
 logger = logging.getLogger(__name__)
 
-class ChatSession:
+class ChatSession(SlotModel):
     """Chat session model with database operations"""
     
+    __slots__ = ('session_id', 'user_id', 'status', 'created_at', 'updated_at', 'metadata')
+    
     def __init__(self, session_id=None, user_id=None, status='active', 
                  created_at=None, updated_at=None, metadata=None):
         self.session_id = session_id or str(uuid.uuid4())
@@ -39,11 +46,16 @@ class ChatSession:
             session_id=data.get('session_id'),
             user_id=data.get('user_id'),
             status=data.get('status', 'active'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
-            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None,
+            created_at=parse_datetime(data.get('created_at')),
+            updated_at=parse_datetime(data.get('updated_at')),
             metadata=data.get('metadata', {})
         )
     
+    @classmethod
+    def from_row(cls, row) -> 'ChatSession':
+        """Create ChatSession instance directly from a database row"""
+        return _map_chat_session(row)
+    
     def save(self) -> bool:
         """Save chat session to database"""
         try:
@@ -71,8 +83,12 @@ class ChatSession:
                         self.created_at, self.updated_at, self.metadata
                     ))
                 
-                logger.info(f"Chat session {self.session_id} saved successfully")
-                return True
+                logger.info("Chat session %s saved successfully", self.session_id)
+            
+            session_cache.delete(self.session_id)
+            if self.status != 'active':
+                recent_messages.delete(self.session_id)
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to save chat session {self.session_id}: {e}")
@@ -80,20 +96,60 @@ class ChatSession:
     
     @classmethod
     def find_by_id(cls, session_id: str) -> Optional['ChatSession']:
-        """Find chat session by ID"""
+        """Find chat session by ID (read-through Redis cache)"""
+        cached = session_cache.get(session_id)
+        if cached is not CACHE_MISS:
+            return cls.from_dict(cached) if cached else None
+        
         try:
             with db_manager.get_pg_cursor() as cursor:
                 cursor.execute("SELECT * FROM chat_sessions WHERE session_id = %s", (session_id,))
                 row = cursor.fetchone()
                 
                 if row:
-                    return cls.from_dict(dict(row))
+                    session = cls.from_row(row)
+                    session_cache.set(session_id, session.to_dict())
+                    return session
+                
+                session_cache.set_missing(session_id)
                 return None
                 
         except Exception as e:
             logger.error(f"Failed to find chat session by ID {session_id}: {e}")
             return None
     
+    @classmethod
+    def record_turn(cls, session_id: str, messages: List['ChatMessage']) -> bool:
+        """Store one chat turn as a single unit of work
+        
+        Touches the session's updated_at (which also validates that it
+        exists) and inserts all messages in one transaction on one pooled
+        connection. Returns False without writing anything if the session
+        does not exist; database errors propagate to the caller.
+        
+        The cached copy of the session is kept, so its updated_at may lag
+        by up to the session cache TTL.
+        """
+        intent_classifier.tag(messages)
+        with db_manager.get_pg_cursor() as cursor:
+            cursor.execute("""
+                UPDATE chat_sessions SET updated_at = %s
+                WHERE session_id = %s
+                RETURNING session_id
+            """, (datetime.utcnow(), session_id))
+            if not cursor.fetchone():
+                return False
+            
+            bulk_upsert(cursor, 'chat_messages', ChatMessage.COLUMNS,
+                        [m.to_row() for m in messages],
+                        conflict_columns=('message_id',),
+                        update_columns=[])
+        
+        # After commit, so context readers never see uncommitted messages
+        recent_messages.append(session_id, *(m.to_dict() for m in messages))
+        logger.info("Recorded %s messages for chat session %s", len(messages), session_id)
+        return True
+    
     @classmethod
     def find_by_user_id(cls, user_id: str, limit: int = 10) -> List['ChatSession']:
         """Find chat sessions by user ID"""
@@ -107,15 +163,18 @@ class ChatSession:
                 """, (user_id, limit))
                 rows = cursor.fetchall()
                 
-                return [cls.from_dict(dict(row)) for row in rows]
+                return _map_chat_session.map_all(rows)
                 
         except Exception as e:
             logger.error(f"Failed to find chat sessions for user {user_id}: {e}")
             return []
 
-class ChatMessage:
+class ChatMessage(SlotModel):
     """Chat message model with database operations"""
     
+    COLUMNS = ('message_id', 'session_id', 'sender_type', 'content', 'created_at', 'metadata')
+    __slots__ = COLUMNS
+    
     def __init__(self, message_id=None, session_id=None, sender_type='user', 
                  content=None, created_at=None, metadata=None):
         self.message_id = message_id or str(uuid.uuid4())
@@ -144,52 +203,206 @@ class ChatMessage:
             session_id=data.get('session_id'),
             sender_type=data.get('sender_type', 'user'),
             content=data.get('content'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
+            created_at=parse_datetime(data.get('created_at')),
             metadata=data.get('metadata', {})
         )
     
+    @classmethod
+    def from_row(cls, row) -> 'ChatMessage':
+        """Create ChatMessage instance directly from a database row"""
+        return _map_chat_message(row)
+    
+    def to_row(self) -> tuple:
+        """Convert chat message to a row tuple ordered like COLUMNS"""
+        return (
+            self.message_id, self.session_id, self.sender_type,
+            self.content, self.created_at, self.metadata
+        )
+    
     def save(self) -> bool:
         """Save chat message to database"""
+        intent_classifier.tag([self])
         try:
             with db_manager.get_pg_cursor() as cursor:
                 cursor.execute("""
                     INSERT INTO chat_messages (
                         message_id, session_id, sender_type, content, created_at, metadata
                     ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    self.message_id, self.session_id, self.sender_type,
-                    self.content, self.created_at, self.metadata
-                ))
+                """, self.to_row())
                 
-                logger.info(f"Chat message {self.message_id} saved successfully")
-                return True
+                logger.info("Chat message %s saved successfully", self.message_id)
+            
+            recent_messages.append(self.session_id, self.to_dict())
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to save chat message {self.message_id}: {e}")
             return False
     
+    @classmethod
+    def save_many(cls, messages: List['ChatMessage'], page_size: int = 1000) -> bool:
+        """Insert many chat messages with one multi-row statement per page
+        
+        Messages are immutable, so rows whose message_id already exists are
+        skipped, which makes retried batches idempotent.
+        """
+        if not messages:
+            return True
+        # Imported histories get intents too, scored in one batch
+        intent_classifier.tag(messages)
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                written = bulk_upsert(cursor, 'chat_messages', cls.COLUMNS,
+                                      [m.to_row() for m in messages],
+                                      conflict_columns=('message_id',),
+                                      update_columns=[],
+                                      page_size=page_size)
+                
+                logger.info("Saved %s chat messages in bulk", written)
+            
+            by_session = {}
+            for message in messages:
+                by_session.setdefault(message.session_id, []).append(message.to_dict())
+            for session_id, entries in by_session.items():
+                recent_messages.append(session_id, *entries)
+            return True
+                
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(messages)} chat messages: {e}")
+            return False
+    
     @classmethod
     def find_by_session_id(cls, session_id: str, limit: int = 100) -> List['ChatMessage']:
         """Find chat messages by session ID"""
+        return cls.find_page_by_session_id(session_id, limit).items
+    
+    @staticmethod
+    def _after_condition(session_id: str, cursor: str = None, since_id: str = None):
+        """Keyset condition for messages after a cursor or a known message
+        
+        Raises InvalidCursor for a malformed cursor or a ``since_id`` that is
+        not a message of this session, rather than returning an empty page.
+        """
+        if cursor:
+            after = decode_cursor(cursor, 'chat_messages:session', KEYSET_TYPES)
+            return "(created_at, message_id) > (%s, %s)", list(after)
+        if since_id:
+            try:
+                with db_manager.get_pg_cursor(commit=False) as db_cursor:
+                    db_cursor.execute("""
+                        SELECT created_at, message_id FROM chat_messages
+                        WHERE message_id = %s AND session_id = %s
+                    """, (since_id, session_id))
+                    anchor = db_cursor.fetchone()
+            except psycopg2.DataError:
+                # Not a UUID
+                anchor = None
+            if anchor is None:
+                raise InvalidCursor(f"Message {since_id} is not part of this session")
+            return "(created_at, message_id) > (%s, %s)", [anchor['created_at'], anchor['message_id']]
+        return None, []
+    
+    @classmethod
+    def start_cursor(cls, session_id: str, cursor: str = None, since_id: str = None) -> Optional[str]:
+        """Cursor for the position a read with ``cursor`` or ``since_id`` starts after
+        
+        Lets a stream that turns out empty still hand the client a cursor to
+        resume from. Raises InvalidCursor like _after_condition.
+        """
+        if cursor or not since_id:
+            return cursor
+        _, anchor = cls._after_condition(session_id, since_id=since_id)
+        return encode_cursor('chat_messages:session', anchor)
+    
+    @classmethod
+    def find_page_by_session_id(cls, session_id: str, limit: int = 100,
+                                cursor: str = None, since_id: str = None) -> Page:
+        """Find a page of a session's messages in chronological order
+        
+        Pages by keyset on (created_at, message_id), so long histories can
+        be walked page by page at constant cost. ``since_id`` returns only
+        messages newer than that message. Raises InvalidCursor for a bad
+        cursor or an unknown ``since_id``.
+        """
+        conditions = ["session_id = %s"]
+        params = [session_id]
+        
+        after, after_params = cls._after_condition(session_id, cursor, since_id)
+        if after:
+            conditions.append(after)
+            params.extend(after_params)
+        
+        params.append(limit + 1)
+        
         try:
-            with db_manager.get_pg_cursor() as cursor:
-                cursor.execute("""
+            with db_manager.get_pg_cursor() as db_cursor:
+                db_cursor.execute(f"""
                     SELECT * FROM chat_messages 
-                    WHERE session_id = %s 
-                    ORDER BY created_at ASC 
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY created_at ASC, message_id ASC 
                     LIMIT %s
-                """, (session_id, limit))
-                rows = cursor.fetchall()
+                """, params)
+                rows = db_cursor.fetchall()
                 
-                return [cls.from_dict(dict(row)) for row in rows]
+                messages = _map_chat_message.map_all(rows[:limit])
+                next_cursor = None
+                if len(rows) > limit:
+                    last = messages[-1]
+                    next_cursor = encode_cursor('chat_messages:session', [last.created_at, last.message_id])
+                return Page(messages, next_cursor)
                 
         except Exception as e:
             logger.error(f"Failed to find chat messages for session {session_id}: {e}")
-            return []
+            return Page([], None)
+    
+    @classmethod
+    def stream_by_session_id(cls, session_id: str, cursor: str = None,
+                             since_id: str = None, batch_size: int = 500) -> Iterator['ChatMessage']:
+        """Yield a session's messages in chronological order from a server-side cursor
+        
+        Rows are fetched ``batch_size`` at a time, so memory stays constant
+        however long the history is. The pooled connection is held until
+        the generator is exhausted or closed. Raises InvalidCursor for a bad
+        cursor immediately; database errors propagate during iteration.
+        """
+        conditions = ["session_id = %s"]
+        params = [session_id]
+        
+        after, after_params = cls._after_condition(session_id, cursor, since_id)
+        if after:
+            conditions.append(after)
+            params.extend(after_params)
+        
+        query = f"""
+            SELECT * FROM chat_messages 
+            WHERE {" AND ".join(conditions)}
+            ORDER BY created_at ASC, message_id ASC
+        """
+        return cls._stream_rows(query, params, batch_size)
+    
+    @staticmethod
+    def _stream_rows(query: str, params: list, batch_size: int) -> Iterator['ChatMessage']:
+        with db_manager.get_pg_cursor(name='chat_history_stream', itersize=batch_size) as db_cursor:
+            db_cursor.execute(query, params)
+            for row in db_cursor:
+                yield _map_chat_message(row)
     
     @classmethod
     def get_recent_messages(cls, session_id: str, count: int = 10) -> List['ChatMessage']:
-        """Get recent messages for a session"""
+        """Get recent messages for a session, oldest first
+        
+        Served from the session's Redis ring buffer; on a miss the buffer is
+        rebuilt from Postgres. Counts beyond the buffer size go to Postgres.
+        """
+        if count <= recent_messages.size:
+            buffered = recent_messages.read(session_id)
+            if buffered is not None:
+                # Retried saves can append a message twice
+                seen = set()
+                unique = [e for e in buffered if not (e['message_id'] in seen or seen.add(e['message_id']))]
+                return [cls.from_dict(entry) for entry in unique[-count:]] if count else []
+        
+        generation = recent_messages.generation(session_id)
         try:
             with db_manager.get_pg_cursor() as cursor:
                 cursor.execute("""
@@ -197,12 +410,17 @@ class ChatMessage:
                     WHERE session_id = %s 
                     ORDER BY created_at DESC 
                     LIMIT %s
-                """, (session_id, count))
+                """, (session_id, max(count, recent_messages.size)))
                 rows = cursor.fetchall()
                 
-                # Reverse to get chronological order
-                return [cls.from_dict(dict(row)) for row in reversed(rows)]
-                
         except Exception as e:
             logger.error(f"Failed to get recent messages for session {session_id}: {e}")
             return []
+        
+        # Reverse to get chronological order
+        messages = _map_chat_message.map_all(reversed(rows))
+        recent_messages.rebuild(session_id, [m.to_dict() for m in messages], generation)
+        return messages[-count:] if count else []
+
+_map_chat_session = RowMapper(ChatSession, {'metadata': dict})
+_map_chat_message = RowMapper(ChatMessage, {'metadata': dict})
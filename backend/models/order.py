@@ -5,14 +5,33 @@ import uuid
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from decimal import Decimal
-from backend.utils.database import db_manager
+from psycopg2.extras import execute_values
+from backend.utils.database import db_manager, bulk_upsert
+from backend.models.base import SlotModel, RowMapper, parse_datetime
+from backend.utils.cache import product_cache
+from backend.services.search import product_search
+from backend.utils.pagination import Page, KEYSET_TYPES, encode_cursor, decode_cursor
 import logging
 
 logger = logging.getLogger(__name__)
 
-class Order:
+class OrderRejected(Exception):
+    """An order that cannot be placed as requested; nothing was written"""
+    
+    def __init__(self, message: str, product_ids: List[str], status: int = 409):
+        super().__init__(message)
+        self.product_ids = product_ids
+        self.status = status
+
+class Order(SlotModel):
     """Order model with database operations"""
     
+    __slots__ = (
+        'order_id', 'user_id', 'status', 'total_amount', 'shipping_address',
+        'billing_address', 'payment_method', 'payment_status',
+        'created_at', 'updated_at', 'metadata'
+    )
+    
     def __init__(self, order_id=None, user_id=None, status='pending',
                  total_amount=None, shipping_address=None, billing_address=None,
                  payment_method=None, payment_status='pending',
@@ -57,11 +76,16 @@ class Order:
             billing_address=data.get('billing_address', {}),
             payment_method=data.get('payment_method'),
             payment_status=data.get('payment_status', 'pending'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
-            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None,
+            created_at=parse_datetime(data.get('created_at')),
+            updated_at=parse_datetime(data.get('updated_at')),
             metadata=data.get('metadata', {})
         )
     
+    @classmethod
+    def from_row(cls, row) -> 'Order':
+        """Create Order instance directly from a database row"""
+        return _map_order(row)
+    
     def save(self) -> bool:
         """Save order to database"""
         try:
@@ -87,26 +111,95 @@ class Order:
                         self.updated_at, self.metadata, self.order_id
                     ))
                 else:
-                    # Insert new order
-                    cursor.execute("""
-                        INSERT INTO orders (
-                            order_id, user_id, status, total_amount,
-                            shipping_address, billing_address, payment_method,
-                            payment_status, created_at, updated_at, metadata
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        self.order_id, self.user_id, self.status, self.total_amount,
-                        self.shipping_address, self.billing_address, self.payment_method,
-                        self.payment_status, self.created_at, self.updated_at, self.metadata
-                    ))
+                    self._insert(cursor)
                 
-                logger.info(f"Order {self.order_id} saved successfully")
+                logger.info("Order %s saved successfully", self.order_id)
                 return True
                 
         except Exception as e:
             logger.error(f"Failed to save order {self.order_id}: {e}")
             return False
     
+    def _insert(self, cursor):
+        """Insert this order as a new row on an open cursor"""
+        cursor.execute("""
+            INSERT INTO orders (
+                order_id, user_id, status, total_amount,
+                shipping_address, billing_address, payment_method,
+                payment_status, created_at, updated_at, metadata
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            self.order_id, self.user_id, self.status, self.total_amount,
+            self.shipping_address, self.billing_address, self.payment_method,
+            self.payment_status, self.created_at, self.updated_at, self.metadata
+        ))
+    
+    @classmethod
+    def place(cls, user_id: str, quantities: Dict[str, int], shipping_address=None,
+              billing_address=None) -> tuple:
+        """Reserve stock and write an order with its items in one transaction
+        
+        ``quantities`` maps product_id to a positive quantity. Stock is taken
+        with a conditional UPDATE that returns each product's catalog price,
+        so lines are priced from the rows just reserved rather than from a
+        cache. Any failure rolls back the whole order, reservation included.
+        The products are queued for re-indexing once the order commits.
+        Raises OrderRejected for unknown, unpriced or out-of-stock products.
+        Returns (order, items).
+        """
+        rejected = None
+        with db_manager.get_pg_cursor() as cursor:
+            # Sorted so concurrent orders lock product rows in the same order
+            rows = execute_values(cursor, """
+                UPDATE products AS p
+                SET stock_quantity = p.stock_quantity - v.quantity, updated_at = now()
+                FROM (VALUES %s) AS v(product_id, quantity)
+                WHERE p.product_id = v.product_id
+                AND p.is_active = true
+                AND p.price IS NOT NULL
+                AND p.stock_quantity >= v.quantity
+                RETURNING p.product_id, p.price
+            """, sorted(quantities.items()), template="(%s::uuid, %s::integer)",
+                page_size=len(quantities), fetch=True)
+            prices = {str(row['product_id']): row['price'] for row in rows}
+            
+            missing = [pid for pid in quantities if pid not in prices]
+            if missing:
+                cursor.execute("""
+                    SELECT product_id FROM products
+                    WHERE product_id = ANY(%s::uuid[]) AND is_active = true AND price IS NOT NULL
+                """, (missing,))
+                orderable = {str(row['product_id']) for row in cursor.fetchall()}
+                cursor.connection.rollback()
+                unknown = [pid for pid in missing if pid not in orderable]
+                if unknown:
+                    rejected = OrderRejected('Unknown or unavailable products', unknown, status=400)
+                else:
+                    rejected = OrderRejected('Insufficient stock', missing, status=409)
+            else:
+                order = cls(user_id=user_id, shipping_address=shipping_address,
+                            billing_address=billing_address)
+                items = [
+                    OrderItem(order_id=order.order_id, product_id=pid, quantity=quantity,
+                              unit_price=prices[pid])
+                    for pid, quantity in quantities.items()
+                ]
+                order.total_amount = sum(item.total_price for item in items)
+                order._insert(cursor)
+                bulk_upsert(cursor, 'order_items', OrderItem.COLUMNS,
+                            [item.to_row() for item in items],
+                            conflict_columns=('item_id',),
+                            update_columns=OrderItem.UPDATE_COLUMNS)
+        
+        if rejected is not None:
+            raise rejected
+        
+        product_cache.delete(*quantities)
+        # The search index carries stock_quantity; the retry thread re-reads these rows
+        product_search.mark_dirty(list(quantities))
+        logger.info("Order %s placed with %s items", order.order_id, len(items))
+        return order, items
+    
     @classmethod
     def find_by_id(cls, order_id: str) -> Optional['Order']:
         """Find order by ID"""
@@ -116,7 +209,7 @@ class Order:
                 row = cursor.fetchone()
                 
                 if row:
-                    return cls.from_dict(dict(row))
+                    return cls.from_row(row)
                 return None
                 
         except Exception as e:
@@ -124,27 +217,62 @@ class Order:
             return None
     
     @classmethod
-    def find_by_user_id(cls, user_id: str, limit: int = 20, offset: int = 0) -> List['Order']:
+    def find_by_user_id(cls, user_id: str, limit: int = 20, cursor: str = None) -> List['Order']:
         """Find orders by user ID"""
+        return cls.find_page_by_user_id(user_id, limit, cursor).items
+    
+    @classmethod
+    def find_page_by_user_id(cls, user_id: str, limit: int = 20, cursor: str = None,
+                             status: str = None) -> Page:
+        """Find a page of a user's orders, newest first
+        
+        Pages by keyset on (created_at, order_id), so every page costs the
+        same regardless of depth. Raises InvalidCursor for a bad cursor.
+        """
+        conditions = ["user_id = %s"]
+        params = [user_id]
+        
+        if status:
+            conditions.append("status = %s")
+            params.append(status)
+        
+        if cursor:
+            conditions.append("(created_at, order_id) < (%s, %s)")
+            params.extend(decode_cursor(cursor, 'orders:user', KEYSET_TYPES))
+        
+        params.append(limit + 1)
+        
         try:
-            with db_manager.get_pg_cursor() as cursor:
-                cursor.execute("""
+            with db_manager.get_pg_cursor() as db_cursor:
+                db_cursor.execute(f"""
                     SELECT * FROM orders 
-                    WHERE user_id = %s 
-                    ORDER BY created_at DESC 
-                    LIMIT %s OFFSET %s
-                """, (user_id, limit, offset))
-                rows = cursor.fetchall()
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY created_at DESC, order_id DESC 
+                    LIMIT %s
+                """, params)
+                rows = db_cursor.fetchall()
                 
-                return [cls.from_dict(dict(row)) for row in rows]
+                orders = _map_order.map_all(rows[:limit])
+                next_cursor = None
+                if len(rows) > limit:
+                    last = orders[-1]
+                    next_cursor = encode_cursor('orders:user', [last.created_at, last.order_id])
+                return Page(orders, next_cursor)
                 
         except Exception as e:
             logger.error(f"Failed to find orders for user {user_id}: {e}")
-            return []
+            return Page([], None)
 
-class OrderItem:
+class OrderItem(SlotModel):
     """Order item model with database operations"""
     
+    COLUMNS = (
+        'item_id', 'order_id', 'product_id', 'quantity',
+        'unit_price', 'total_price', 'created_at'
+    )
+    UPDATE_COLUMNS = ('quantity', 'unit_price', 'total_price')
+    __slots__ = COLUMNS
+    
     def __init__(self, item_id=None, order_id=None, product_id=None,
                  quantity=1, unit_price=None, total_price=None,
                  created_at=None):
@@ -178,35 +306,57 @@ class OrderItem:
             quantity=data.get('quantity', 1),
             unit_price=data.get('unit_price'),
             total_price=data.get('total_price'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None
+            created_at=parse_datetime(data.get('created_at'))
+        )
+    
+    @classmethod
+    def from_row(cls, row) -> 'OrderItem':
+        """Create OrderItem instance directly from a database row"""
+        return _map_order_item(row)
+    
+    def to_row(self) -> tuple:
+        """Convert order item to a row tuple ordered like COLUMNS"""
+        return (
+            self.item_id, self.order_id, self.product_id,
+            self.quantity, self.unit_price, self.total_price,
+            self.created_at
         )
     
     def save(self) -> bool:
         """Save order item to database"""
         try:
             with db_manager.get_pg_cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO order_items (
-                        item_id, order_id, product_id, quantity,
-                        unit_price, total_price, created_at
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (item_id) DO UPDATE SET
-                        quantity = EXCLUDED.quantity,
-                        unit_price = EXCLUDED.unit_price,
-                        total_price = EXCLUDED.total_price
-                """, (
-                    self.item_id, self.order_id, self.product_id,
-                    self.quantity, self.unit_price, self.total_price,
-                    self.created_at
-                ))
+                bulk_upsert(cursor, 'order_items', self.COLUMNS, [self.to_row()],
+                            conflict_columns=('item_id',),
+                            update_columns=self.UPDATE_COLUMNS)
                 
-                logger.info(f"Order item {self.item_id} saved successfully")
+                logger.info("Order item %s saved successfully", self.item_id)
                 return True
                 
         except Exception as e:
             logger.error(f"Failed to save order item {self.item_id}: {e}")
             return False
     
+    @classmethod
+    def save_many(cls, items: List['OrderItem'], page_size: int = 1000) -> bool:
+        """Upsert many order items with one multi-row statement per page"""
+        if not items:
+            return True
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                written = bulk_upsert(cursor, 'order_items', cls.COLUMNS,
+                                      [item.to_row() for item in items],
+                                      conflict_columns=('item_id',),
+                                      update_columns=cls.UPDATE_COLUMNS,
+                                      page_size=page_size)
+                
+                logger.info("Saved %s order items in bulk", written)
+                return True
+                
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(items)} order items: {e}")
+            return False
+    
     @classmethod
     def find_by_order_id(cls, order_id: str) -> List['OrderItem']:
         """Find order items by order ID"""
@@ -219,8 +369,11 @@ class OrderItem:
                 """, (order_id,))
                 rows = cursor.fetchall()
                 
-                return [cls.from_dict(dict(row)) for row in rows]
+                return _map_order_item.map_all(rows)
                 
         except Exception as e:
             logger.error(f"Failed to find order items for order {order_id}: {e}")
             return []
+
+_map_order = RowMapper(Order, {'shipping_address': dict, 'billing_address': dict, 'metadata': dict})
+_map_order_item = RowMapper(OrderItem)
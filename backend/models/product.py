@@ -4,14 +4,28 @@ Product model and database operations
 import uuid
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from backend.utils.database import db_manager
+from backend.utils.database import db_manager, bulk_upsert
+from backend.models.base import SlotModel, RowMapper, parse_datetime
+from psycopg2.extras import execute_values
+from backend.utils.cache import product_cache, CACHE_MISS
+from backend.services.search import product_search
+from backend.services.embeddings import product_embeddings
+from backend.utils.pagination import encode_cursor, decode_cursor, cursor_kind, InvalidCursor, KEYSET_TYPES
 import logging
 
 logger = logging.getLogger(__name__)
 
-class Product:
+class Product(SlotModel):
     """Product model with database operations"""
     
+    COLUMNS = (
+        'product_id', 'name', 'description', 'price', 'category',
+        'brand', 'sku', 'stock_quantity', 'images', 'specifications',
+        'is_active', 'created_at', 'updated_at'
+    )
+    UPDATE_COLUMNS = tuple(c for c in COLUMNS if c not in ('product_id', 'created_at'))
+    __slots__ = COLUMNS
+    
     def __init__(self, product_id=None, name=None, description=None, price=None,
                  category=None, brand=None, sku=None, stock_quantity=0,
                  images=None, specifications=None, is_active=True,
@@ -63,76 +77,210 @@ class Product:
             images=data.get('images', []),
             specifications=data.get('specifications', {}),
             is_active=data.get('is_active', True),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
-            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None
+            created_at=parse_datetime(data.get('created_at')),
+            updated_at=parse_datetime(data.get('updated_at'))
+        )
+    
+    @classmethod
+    def from_row(cls, row) -> 'Product':
+        """Create Product instance directly from a database row"""
+        return _map_product(row)
+    
+    def to_row(self) -> tuple:
+        """Convert product to a row tuple ordered like COLUMNS"""
+        return (
+            self.product_id, self.name, self.description, self.price,
+            self.category, self.brand, self.sku, self.stock_quantity,
+            self.images, self.specifications, self.is_active,
+            self.created_at, self.updated_at
         )
     
     def save(self) -> bool:
-        """Save product to database"""
+        """Save product to database (single-statement upsert)"""
         try:
+            self.updated_at = datetime.utcnow()
             with db_manager.get_pg_cursor() as cursor:
-                # Check if product exists
-                cursor.execute("SELECT product_id FROM products WHERE product_id = %s", (self.product_id,))
-                exists = cursor.fetchone()
+                bulk_upsert(cursor, 'products', self.COLUMNS, [self.to_row()],
+                            conflict_columns=('product_id',),
+                            update_columns=self.UPDATE_COLUMNS)
                 
-                if exists:
-                    # Update existing product
-                    self.updated_at = datetime.utcnow()
-                    cursor.execute("""
-                        UPDATE products SET 
-                            name = %s, description = %s, price = %s, category = %s,
-                            brand = %s, sku = %s, stock_quantity = %s, images = %s,
-                            specifications = %s, is_active = %s, updated_at = %s
-                        WHERE product_id = %s
-                    """, (
-                        self.name, self.description, self.price, self.category,
-                        self.brand, self.sku, self.stock_quantity, self.images,
-                        self.specifications, self.is_active, self.updated_at,
-                        self.product_id
-                    ))
-                else:
-                    # Insert new product
-                    cursor.execute("""
-                        INSERT INTO products (
-                            product_id, name, description, price, category,
-                            brand, sku, stock_quantity, images, specifications,
-                            is_active, created_at, updated_at
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        self.product_id, self.name, self.description, self.price,
-                        self.category, self.brand, self.sku, self.stock_quantity,
-                        self.images, self.specifications, self.is_active,
-                        self.created_at, self.updated_at
-                    ))
-                
-                logger.info(f"Product {self.product_id} saved successfully")
-                return True
+                logger.info("Product %s saved successfully", self.product_id)
+            
+            product_cache.delete(self.product_id)
+            product_search.sync_products([self])
+            self._index_embeddings([self])
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to save product {self.product_id}: {e}")
             return False
     
+    @classmethod
+    def save_many(cls, products: List['Product'], page_size: int = 1000) -> bool:
+        """Upsert many products with one multi-row statement per page"""
+        if not products:
+            return True
+        try:
+            now = datetime.utcnow()
+            for product in products:
+                product.updated_at = now
+            
+            with db_manager.get_pg_cursor() as cursor:
+                written = bulk_upsert(cursor, 'products', cls.COLUMNS,
+                                      [p.to_row() for p in products],
+                                      conflict_columns=('product_id',),
+                                      update_columns=cls.UPDATE_COLUMNS,
+                                      page_size=page_size)
+                
+                logger.info("Saved %s products in bulk", written)
+            
+            product_cache.delete(*(p.product_id for p in products))
+            product_search.sync_products(products)
+            cls._index_embeddings(products)
+            return True
+                
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(products)} products: {e}")
+            return False
+    
+    @staticmethod
+    def _index_embeddings(products: List['Product']):
+        """Append embeddings for saved products; the database stays authoritative"""
+        try:
+            product_embeddings.upsert(products)
+        except Exception as e:
+            logger.warning(f"Failed to update embeddings for {len(products)} products: {e}")
+    
+    @classmethod
+    def semantic_search(cls, query: str, limit: int = 10) -> List['Product']:
+        """Products closest in meaning to free text, best match first"""
+        return cls.semantic_search_batch([query], limit)[0]
+    
+    @classmethod
+    def semantic_search_batch(cls, queries: List[str], limit: int = 10) -> List[List['Product']]:
+        """Semantic search for many texts with one index pass and one product lookup"""
+        matches = product_embeddings.search_text(queries, k=limit)
+        wanted = list({pid for hits in matches for pid, score in hits if score > 0})
+        products = {p.product_id: p for p in cls.find_by_ids(wanted)}
+        return [
+            [products[pid] for pid, score in hits if score > 0 and pid in products and products[pid].is_active]
+            for hits in matches
+        ]
+    
     @classmethod
     def find_by_id(cls, product_id: str) -> Optional['Product']:
-        """Find product by ID"""
+        """Find product by ID (local LRU, then Redis, then Postgres)"""
+        cached = product_cache.get(product_id)
+        if cached:
+            return cls.from_dict(cached)
+        
         try:
             with db_manager.get_pg_cursor() as cursor:
                 cursor.execute("SELECT * FROM products WHERE product_id = %s AND is_active = true", (product_id,))
                 row = cursor.fetchone()
                 
                 if row:
-                    return cls.from_dict(dict(row))
+                    product = cls.from_row(row)
+                    product_cache.set(product_id, product.to_dict())
+                    return product
                 return None
                 
         except Exception as e:
             logger.error(f"Failed to find product by ID {product_id}: {e}")
             return None
     
+    @classmethod
+    def find_by_ids(cls, product_ids: List[str]) -> List['Product']:
+        """Find many products by ID, cache first; preserves input order and skips unknown IDs"""
+        if not product_ids:
+            return []
+        
+        found = product_cache.get_many(product_ids)
+        missing = [pid for pid in dict.fromkeys(product_ids) if pid not in found]
+        
+        if missing:
+            try:
+                with db_manager.get_pg_cursor() as cursor:
+                    cursor.execute(
+                        "SELECT * FROM products WHERE product_id IN %s AND is_active = true",
+                        (tuple(missing),)
+                    )
+                    loaded = {}
+                    for row in cursor.fetchall():
+                        product = cls.from_row(row)
+                        loaded[str(product.product_id)] = product.to_dict()
+                    
+                product_cache.set_many(loaded)
+                found.update(loaded)
+                
+            except Exception as e:
+                logger.error(f"Failed to find products by IDs: {e}")
+        
+        return [cls.from_dict(found[pid]) for pid in product_ids if pid in found]
+    
     @classmethod
     def search(cls, query: str = None, category: str = None, brand: str = None,
                min_price: float = None, max_price: float = None,
-               limit: int = 20, offset: int = 0) -> List['Product']:
+               limit: int = 20, cursor: str = None) -> List['Product']:
         """Search products with filters"""
+        return cls.search_with_facets(query, category, brand, min_price, max_price,
+                                      limit, cursor)['products']
+    
+    @classmethod
+    def search_with_facets(cls, query: str = None, category: str = None, brand: str = None,
+                           min_price: float = None, max_price: float = None,
+                           limit: int = 20, cursor: str = None) -> Dict[str, Any]:
+        """Relevance-ranked search with facets, falling back to Postgres
+        
+        Returns {'products', 'total', 'facets', 'engine', 'next_cursor'}.
+        When Elasticsearch is unavailable results come from Postgres ordered
+        by recency, with no facets and total set to None. A cursor is only
+        valid for the engine that issued it; raises InvalidCursor otherwise.
+        """
+        kind = cursor_kind(cursor) if cursor else None
+        
+        if kind in (None, 'product_search:es'):
+            search_after = decode_cursor(cursor, 'product_search:es') if cursor else None
+            result = product_search.search(query, category, brand, min_price, max_price,
+                                           limit, search_after)
+            if result is not None:
+                return {
+                    'products': [cls.from_dict(hit) for hit in result['hits']],
+                    'total': result['total'],
+                    'facets': result['facets'],
+                    'engine': 'elasticsearch',
+                    'next_cursor': encode_cursor('product_search:es', result['search_after'])
+                    if result['search_after'] else None
+                }
+            if cursor:
+                raise InvalidCursor("Search cursor expired, please restart the search")
+        
+        after = decode_cursor(cursor, 'product_search:pg', KEYSET_TYPES) if cursor else None
+        products = cls._search_postgres(query, category, brand, min_price, max_price,
+                                        limit + 1, after)
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = encode_cursor('product_search:pg', [last.updated_at, last.product_id])
+        
+        return {
+            'products': products,
+            'total': None,
+            'facets': {},
+            'engine': 'postgres',
+            'next_cursor': next_cursor
+        }
+    
+    @classmethod
+    def _search_postgres(cls, query: str = None, category: str = None, brand: str = None,
+                         min_price: float = None, max_price: float = None,
+                         limit: int = 20, after: List[Any] = None) -> List['Product']:
+        """Substring search in Postgres, used when Elasticsearch is unavailable
+        
+        Pages by keyset on (updated_at, product_id) descending; ``after`` is
+        the sort key of the previous page's last row.
+        """
         try:
             with db_manager.get_pg_cursor() as cursor:
                 conditions = ["is_active = true"]
@@ -158,18 +306,22 @@ class Product:
                     conditions.append("price <= %s")
                     params.append(max_price)
                 
+                if after:
+                    conditions.append("(updated_at, product_id) < (%s, %s)")
+                    params.extend(after)
+                
                 where_clause = " AND ".join(conditions)
-                params.extend([limit, offset])
+                params.append(limit)
                 
                 cursor.execute(f"""
                     SELECT * FROM products 
                     WHERE {where_clause}
-                    ORDER BY updated_at DESC
-                    LIMIT %s OFFSET %s
+                    ORDER BY updated_at DESC, product_id DESC
+                    LIMIT %s
                 """, params)
                 
                 rows = cursor.fetchall()
-                return [cls.from_dict(dict(row)) for row in rows]
+                return _map_product.map_all(rows)
                 
         except Exception as e:
             logger.error(f"Failed to search products: {e}")
@@ -195,46 +347,173 @@ class Product:
     @classmethod
     def get_recommendations(cls, product_id: str = None, user_id: str = None,
                           limit: int = 5) -> List['Product']:
-        """Get product recommendations (simplified algorithm)"""
+        """Products frequently bought with a product, or with a user's recent purchases
+        
+        Reads the co-purchase neighbor table (see CoPurchaseModel). Products
+        nobody has bought together yet fall back to the same category; with
+        no product or purchase history, the most purchased products.
+        """
         try:
-            with db_manager.get_pg_cursor() as cursor:
+            with db_manager.get_pg_cursor(commit=False) as cursor:
                 if product_id:
-                    # Get products from same category
                     cursor.execute("""
-                        SELECT p2.* FROM products p1
-                        JOIN products p2 ON p1.category = p2.category
-                        WHERE p1.product_id = %s AND p2.product_id != %s
-                        AND p2.is_active = true
-                        ORDER BY p2.updated_at DESC
+                        SELECT p.* FROM product_neighbors n
+                        JOIN products p ON p.product_id = n.neighbor_id
+                        WHERE n.product_id = %s AND p.is_active = true
+                        ORDER BY n.score DESC
                         LIMIT %s
-                    """, (product_id, product_id, limit))
-                else:
-                    # Get popular products (by stock quantity as proxy)
+                    """, (product_id, limit))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        cursor.execute("""
+                            SELECT p2.* FROM products p1
+                            JOIN products p2 ON p1.category = p2.category
+                            WHERE p1.product_id = %s AND p2.product_id != %s
+                            AND p2.is_active = true
+                            ORDER BY p2.updated_at DESC
+                            LIMIT %s
+                        """, (product_id, product_id, limit))
+                        rows = cursor.fetchall()
+                    return _map_product.map_all(rows)
+                
+                rows = []
+                if user_id:
+                    # Neighbors of the user's recent purchases they don't own yet
+                    cursor.execute("""
+                        WITH recent AS (
+                            SELECT DISTINCT product_id FROM (
+                                SELECT oi.product_id FROM orders o
+                                JOIN order_items oi ON oi.order_id = o.order_id
+                                WHERE o.user_id = %s
+                                ORDER BY o.created_at DESC
+                                LIMIT 20
+                            ) latest
+                        )
+                        SELECT p.* FROM (
+                            SELECT n.neighbor_id, SUM(n.score) AS score
+                            FROM product_neighbors n
+                            WHERE n.product_id IN (SELECT product_id FROM recent)
+                            AND n.neighbor_id NOT IN (SELECT product_id FROM recent)
+                            GROUP BY n.neighbor_id
+                        ) r
+                        JOIN products p ON p.product_id = r.neighbor_id
+                        WHERE p.is_active = true
+                        ORDER BY r.score DESC
+                        LIMIT %s
+                    """, (user_id, limit))
+                    rows = cursor.fetchall()
+                
+                if not rows:
+                    cursor.execute("""
+                        SELECT p.* FROM product_purchase_counts c
+                        JOIN products p ON p.product_id = c.product_id
+                        WHERE p.is_active = true
+                        ORDER BY c.order_count DESC
+                        LIMIT %s
+                    """, (limit,))
+                    rows = cursor.fetchall()
+                
+                if not rows:
+                    # No orders yet
                     cursor.execute("""
                         SELECT * FROM products 
                         WHERE is_active = true
-                        ORDER BY stock_quantity DESC, updated_at DESC
+                        ORDER BY updated_at DESC
                         LIMIT %s
                     """, (limit,))
+                    rows = cursor.fetchall()
                 
-                rows = cursor.fetchall()
-                return [cls.from_dict(dict(row)) for row in rows]
+                return _map_product.map_all(rows)
                 
         except Exception as e:
             logger.error(f"Failed to get recommendations: {e}")
             return []
     
     def update_stock(self, quantity_change: int) -> bool:
-        """Update stock quantity"""
+        """Update stock quantity atomically in the database"""
+        new_quantity = self.adjust_stock(self.product_id, quantity_change)
+        if new_quantity is None:
+            return False
+        
+        self.stock_quantity = new_quantity
+        return True
+    
+    @classmethod
+    def adjust_stock(cls, product_id: str, quantity_change: int) -> Optional[int]:
+        """Add ``quantity_change`` to stock with a conditional in-database update
+        
+        The row is never taken below zero and only the stock columns are
+        written; the product is queued for re-indexing rather than indexed
+        inline. Returns the new quantity, or None if the product is unknown
+        or has insufficient stock.
+        """
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("""
+                    UPDATE products
+                    SET stock_quantity = stock_quantity + %s, updated_at = %s
+                    WHERE product_id = %s AND stock_quantity + %s >= 0
+                    RETURNING stock_quantity
+                """, (quantity_change, datetime.utcnow(), product_id, quantity_change))
+                row = cursor.fetchone()
+            
+            if row is None:
+                logger.warning(f"Cannot adjust stock by {quantity_change} for product {product_id}")
+                return None
+            
+            product_cache.delete(product_id)
+            product_search.mark_dirty([product_id])
+            return row['stock_quantity']
+            
+        except Exception as e:
+            logger.error(f"Failed to update stock for product {product_id}: {e}")
+            return None
+    
+    @classmethod
+    def reserve_stock(cls, quantities: Dict[str, int]) -> Dict[str, int]:
+        """Decrement stock for many products in a single statement
+        
+        ``quantities`` maps product_id to the quantity to take. Each row is
+        only decremented if it has enough stock, so concurrent reservations
+        can never oversell. Returns {product_id: remaining_stock} for the
+        rows that were reserved; callers decide whether a partial result is
+        acceptable and can hand it back with release_stock().
+        """
+        return cls._apply_stock_deltas(quantities, sign=-1)
+    
+    @classmethod
+    def release_stock(cls, quantities: Dict[str, int]) -> Dict[str, int]:
+        """Return previously reserved stock for many products in one statement"""
+        return cls._apply_stock_deltas(quantities, sign=1)
+    
+    @classmethod
+    def _apply_stock_deltas(cls, quantities: Dict[str, int], sign: int) -> Dict[str, int]:
+        """Apply signed per-product stock changes in one UPDATE ... FROM (VALUES ...)"""
+        if not quantities:
+            return {}
+        if any(quantity <= 0 for quantity in quantities.values()):
+            raise ValueError("Stock quantities must be positive")
+        
         try:
-            new_quantity = self.stock_quantity + quantity_change
-            if new_quantity < 0:
-                logger.warning(f"Cannot reduce stock below 0 for product {self.product_id}")
-                return False
+            with db_manager.get_pg_cursor() as cursor:
+                rows = execute_values(cursor, """
+                    UPDATE products AS p
+                    SET stock_quantity = p.stock_quantity + v.delta, updated_at = now()
+                    FROM (VALUES %s) AS v(product_id, delta)
+                    WHERE p.product_id = v.product_id
+                    AND p.stock_quantity + v.delta >= 0
+                    RETURNING p.product_id, p.stock_quantity
+                """, [(pid, sign * quantity) for pid, quantity in quantities.items()],
+                    template="(%s::uuid, %s::integer)", page_size=len(quantities), fetch=True)
             
-            self.stock_quantity = new_quantity
-            return self.save()
+            updated = {str(row['product_id']): row['stock_quantity'] for row in rows}
+            product_cache.delete(*updated)
+            if updated:
+                product_search.mark_dirty(list(updated))
+            return updated
             
         except Exception as e:
-            logger.error(f"Failed to update stock for product {self.product_id}: {e}")
-            return False
+            logger.error(f"Failed to apply stock changes for {len(quantities)} products: {e}")
+            return {}
+
+_map_product = RowMapper(Product, {'images': list, 'specifications': dict})
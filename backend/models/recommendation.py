@@ -0,0 +1,124 @@
+"""
+Item-to-item co-purchase model
+"""
+from backend.utils.database import db_manager
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity over per-order purchase sets, top-k per product
+_RANK_NEIGHBORS = """
+    INSERT INTO product_neighbors (product_id, neighbor_id, score, co_count)
+    SELECT product_id, other_id, score, co_count FROM (
+        SELECT pc.product_id, pc.other_id, pc.co_count, s.score,
+               row_number() OVER (PARTITION BY pc.product_id ORDER BY s.score DESC, pc.other_id) AS rank
+        FROM product_pair_counts pc
+        JOIN product_purchase_counts a ON a.product_id = pc.product_id
+        JOIN product_purchase_counts b ON b.product_id = pc.other_id
+        CROSS JOIN LATERAL (
+            SELECT pc.co_count / sqrt(a.order_count::float8 * b.order_count) AS score
+        ) s
+        WHERE pc.co_count >= %(min_co_count)s {condition}
+    ) ranked
+    WHERE rank <= %(top_k)s
+"""
+
+
+class CoPurchaseModel:
+    """Sparse top-k neighbor table built from order_items
+    
+    Purchase and pair counts cover orders that are not cancelled. Triggers
+    on order_items and orders (see scripts/init-db.sql) keep them current
+    as items are added or deleted and orders are cancelled, un-cancelled or
+    deleted, and list the products whose pair counts changed in
+    recommendation_dirty; no periodic rebuild is needed to undo purchases.
+    ``refresh_dirty`` re-ranks just those products, so serving a
+    recommendation is one indexed read of product_neighbors. A product's
+    order count also shifts the scores of its neighbors' lists; those
+    drift slightly until they are next refreshed or ``rebuild`` runs.
+    
+    The triggers' cost is paid at checkout, in the order's transaction;
+    see the note on shift_co_purchases for measured numbers.
+    """
+    
+    def __init__(self, top_k: int = 20, min_co_count: int = 1):
+        self.top_k = top_k
+        self.min_co_count = min_co_count
+    
+    def refresh_dirty(self, batch_size: int = 500) -> int:
+        """Re-rank neighbors for up to ``batch_size`` dirty products; returns how many"""
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                # SKIP LOCKED lets several workers drain the queue concurrently
+                cursor.execute("""
+                    DELETE FROM recommendation_dirty
+                    WHERE product_id IN (
+                        SELECT product_id FROM recommendation_dirty
+                        ORDER BY marked_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING product_id
+                """, (batch_size,))
+                product_ids = [str(row['product_id']) for row in cursor.fetchall()]
+                if not product_ids:
+                    return 0
+                
+                cursor.execute("DELETE FROM product_neighbors WHERE product_id = ANY(%s::uuid[])",
+                               (product_ids,))
+                cursor.execute(
+                    _RANK_NEIGHBORS.format(condition="AND pc.product_id = ANY(%(product_ids)s::uuid[])"),
+                    {'product_ids': product_ids, 'min_co_count': self.min_co_count, 'top_k': self.top_k}
+                )
+                
+                logger.debug("Refreshed co-purchase neighbors for %s products", len(product_ids))
+                return len(product_ids)
+        
+        except Exception as e:
+            logger.error(f"Failed to refresh co-purchase neighbors: {e}")
+            return 0
+    
+    def rebuild(self) -> bool:
+        """Recompute counts and every neighbor list from order_items, e.g. after a backfill
+        
+        Runs in one transaction and blocks order and order item writes while
+        it runs, so the trigger-maintained counts cannot drift from the
+        rebuilt ones.
+        """
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("LOCK TABLE orders, order_items IN SHARE MODE")
+                cursor.execute("DELETE FROM product_neighbors")
+                cursor.execute("DELETE FROM product_pair_counts")
+                cursor.execute("DELETE FROM product_purchase_counts")
+                cursor.execute("DELETE FROM recommendation_dirty")
+                
+                cursor.execute("""
+                    INSERT INTO product_purchase_counts (product_id, order_count)
+                    SELECT i.product_id, COUNT(DISTINCT i.order_id)
+                    FROM order_items i
+                    JOIN orders o ON o.order_id = i.order_id
+                    WHERE o.status <> 'cancelled'
+                    GROUP BY i.product_id
+                """)
+                cursor.execute("""
+                    WITH basket AS (
+                        SELECT DISTINCT i.order_id, i.product_id FROM order_items i
+                        JOIN orders o ON o.order_id = i.order_id
+                        WHERE o.status <> 'cancelled'
+                    )
+                    INSERT INTO product_pair_counts (product_id, other_id, co_count)
+                    SELECT a.product_id, b.product_id, COUNT(*)
+                    FROM basket a
+                    JOIN basket b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+                    GROUP BY a.product_id, b.product_id
+                """)
+                cursor.execute(_RANK_NEIGHBORS.format(condition=''),
+                               {'min_co_count': self.min_co_count, 'top_k': self.top_k})
+                
+                logger.info(f"Co-purchase neighbors rebuilt: {cursor.rowcount} rows")
+                return True
+        
+        except Exception as e:
+            logger.error(f"Failed to rebuild co-purchase neighbors: {e}")
+            return False
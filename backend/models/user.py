@@ -4,16 +4,27 @@ User model and database operations
 import hashlib
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any
-import bcrypt
-from backend.utils.database import db_manager
+from typing import Optional, Dict, Any, List
+from backend.utils.database import db_manager, bulk_upsert
+from backend.models.base import SlotModel, RowMapper, parse_datetime
+from backend.utils.passwords import password_hasher, HasherBusyError
+from backend.utils.cache import user_cache, CACHE_MISS
 import logging
 
 logger = logging.getLogger(__name__)
 
-class User:
+class User(SlotModel):
     """User model with database operations"""
     
+    COLUMNS = (
+        'user_id', 'email', 'username', 'password_hash',
+        'first_name', 'last_name', 'phone', 'is_active',
+        'created_at', 'updated_at', 'preferences'
+    )
+    UPDATE_COLUMNS = tuple(c for c in COLUMNS if c not in ('user_id', 'created_at'))
+    __slots__ = COLUMNS
+    JSON_FIELDS = tuple(c for c in COLUMNS if c != 'password_hash')
+    
     def __init__(self, user_id=None, email=None, username=None, password_hash=None, 
                  first_name=None, last_name=None, phone=None, is_active=True, 
                  created_at=None, updated_at=None, preferences=None):
@@ -31,14 +42,21 @@ class User:
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash password using bcrypt on the hashing pool"""
+        return password_hasher.hash(password)
     
     def verify_password(self, password: str) -> bool:
-        """Verify password against hash"""
+        """Verify password against hash on the hashing pool"""
         if not self.password_hash:
             return False
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return password_hasher.verify(password, self.password_hash)
+    
+    def upgrade_password_hash(self, password: str) -> bool:
+        """Re-hash with the current bcrypt cost if the stored hash uses a lower one"""
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        self.password_hash = self.hash_password(password)
+        return self.save()
     
     def to_dict(self, include_sensitive=False) -> Dict[str, Any]:
         """Convert user to dictionary"""
@@ -72,71 +90,139 @@ class User:
             last_name=data.get('last_name'),
             phone=data.get('phone'),
             is_active=data.get('is_active', True),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
-            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None,
+            created_at=parse_datetime(data.get('created_at')),
+            updated_at=parse_datetime(data.get('updated_at')),
             preferences=data.get('preferences', {})
         )
     
+    @classmethod
+    def from_row(cls, row) -> 'User':
+        """Create User instance directly from a database row"""
+        return _map_user(row)
+    
+    def to_row(self) -> tuple:
+        """Convert user to a row tuple ordered like COLUMNS"""
+        return (
+            self.user_id, self.email, self.username, self.password_hash,
+            self.first_name, self.last_name, self.phone, self.is_active,
+            self.created_at, self.updated_at, self.preferences
+        )
+    
     def save(self) -> bool:
-        """Save user to database"""
+        """Save user to database (single-statement upsert)"""
         try:
+            if not self.password_hash:
+                # Users read from the identity cache carry no hash
+                raise ValueError("user has no password hash; load it with find_by_id(cached=False)")
+            self.updated_at = datetime.utcnow()
             with db_manager.get_pg_cursor() as cursor:
-                # Check if user exists
-                cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (self.user_id,))
-                exists = cursor.fetchone()
-                
-                if exists:
-                    # Update existing user
-                    self.updated_at = datetime.utcnow()
-                    cursor.execute("""
-                        UPDATE users SET 
-                            email = %s, username = %s, password_hash = %s,
-                            first_name = %s, last_name = %s, phone = %s,
-                            is_active = %s, updated_at = %s, preferences = %s
-                        WHERE user_id = %s
-                    """, (
-                        self.email, self.username, self.password_hash,
-                        self.first_name, self.last_name, self.phone,
-                        self.is_active, self.updated_at, self.preferences,
-                        self.user_id
-                    ))
-                else:
-                    # Insert new user
-                    cursor.execute("""
-                        INSERT INTO users (
-                            user_id, email, username, password_hash,
-                            first_name, last_name, phone, is_active,
-                            created_at, updated_at, preferences
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        self.user_id, self.email, self.username, self.password_hash,
-                        self.first_name, self.last_name, self.phone, self.is_active,
-                        self.created_at, self.updated_at, self.preferences
-                    ))
+                bulk_upsert(cursor, 'users', self.COLUMNS, [self.to_row()],
+                            conflict_columns=('user_id',),
+                            update_columns=self.UPDATE_COLUMNS)
                 
-                logger.info(f"User {self.user_id} saved successfully")
-                return True
+                logger.info("User %s saved successfully", self.user_id)
+            
+            user_cache.delete(self.user_id)
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to save user {self.user_id}: {e}")
             return False
     
     @classmethod
-    def find_by_id(cls, user_id: str) -> Optional['User']:
-        """Find user by ID"""
+    def save_many(cls, users: List['User'], page_size: int = 1000) -> bool:
+        """Upsert many users with one multi-row statement per page"""
+        if not users:
+            return True
+        try:
+            now = datetime.utcnow()
+            for user in users:
+                user.updated_at = now
+            
+            with db_manager.get_pg_cursor() as cursor:
+                written = bulk_upsert(cursor, 'users', cls.COLUMNS,
+                                      [u.to_row() for u in users],
+                                      conflict_columns=('user_id',),
+                                      update_columns=cls.UPDATE_COLUMNS,
+                                      page_size=page_size)
+                
+                logger.info("Saved %s users in bulk", written)
+            
+            user_cache.delete(*(u.user_id for u in users))
+            return True
+                
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(users)} users: {e}")
+            return False
+    
+    @classmethod
+    def find_by_id(cls, user_id: str, cached: bool = True) -> Optional['User']:
+        """Find user by ID (short-TTL Redis cache, invalidated by save)
+        
+        Cached users have no password hash; pass ``cached=False`` to load
+        one that will be saved.
+        """
+        if cached:
+            entry = user_cache.get(user_id)
+            if entry is not CACHE_MISS:
+                return cls.from_dict(entry) if entry else None
+        
         try:
             with db_manager.get_pg_cursor() as cursor:
                 cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
                 row = cursor.fetchone()
                 
                 if row:
-                    return cls.from_dict(dict(row))
+                    user = cls.from_row(row)
+                    user.cache()
+                    return user
+                
+                user_cache.set_missing(user_id)
                 return None
                 
         except Exception as e:
             logger.error(f"Failed to find user by ID {user_id}: {e}")
             return None
     
+    def cache(self):
+        """Store this user in the identity cache, without the password hash"""
+        user_cache.set(self.user_id, self.to_dict())
+    
+    @classmethod
+    def find_by_login(cls, email_or_username: str) -> Optional['User']:
+        """Find user by email or username in one query, preferring an email match"""
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("""
+                    SELECT * FROM users
+                    WHERE email = %s OR username = %s
+                    ORDER BY (email = %s) DESC
+                    LIMIT 1
+                """, (email_or_username, email_or_username, email_or_username))
+                row = cursor.fetchone()
+                
+                if row:
+                    return cls.from_row(row)
+                return None
+                
+        except Exception as e:
+            logger.error(f"Failed to find user by login {email_or_username}: {e}")
+            return None
+    
+    @classmethod
+    def exists(cls, email: str = None, username: str = None) -> bool:
+        """Check in one query whether the email or the username is taken"""
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("""
+                    SELECT 1 FROM users WHERE email = %s OR username = %s LIMIT 1
+                """, (email, username))
+                return cursor.fetchone() is not None
+                
+        except Exception as e:
+            logger.error(f"Failed to check for existing user {email} / {username}: {e}")
+            return False
+    
     @classmethod
     def find_by_email(cls, email: str) -> Optional['User']:
         """Find user by email"""
@@ -146,7 +232,7 @@ class User:
                 row = cursor.fetchone()
                 
                 if row:
-                    return cls.from_dict(dict(row))
+                    return cls.from_row(row)
                 return None
                 
         except Exception as e:
@@ -162,7 +248,7 @@ class User:
                 row = cursor.fetchone()
                 
                 if row:
-                    return cls.from_dict(dict(row))
+                    return cls.from_row(row)
                 return None
                 
         except Exception as e:
@@ -173,16 +259,23 @@ class User:
     def authenticate(cls, email_or_username: str, password: str) -> Optional['User']:
         """Authenticate user with email/username and password"""
         try:
-            # Try to find by email first, then username
-            user = cls.find_by_email(email_or_username)
-            if not user:
-                user = cls.find_by_username(email_or_username)
+            # Always read from Postgres; the identity cache holds no hashes
+            user = cls.find_by_login(email_or_username)
             
             if user and user.verify_password(password) and user.is_active:
+                # Transparently move old hashes to the current cost
+                try:
+                    user.upgrade_password_hash(password)
+                except HasherBusyError:
+                    pass
+                # Prime the identity cache for the requests that follow login
+                user.cache()
                 return user
             
             return None
             
+        except HasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Authentication failed for {email_or_username}: {e}")
             return None
@@ -196,3 +289,5 @@ class User:
         except Exception as e:
             logger.error(f"Failed to delete user {self.user_id}: {e}")
             return False
+
+_map_user = RowMapper(User, {'preferences': dict})
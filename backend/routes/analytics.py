@@ -5,13 +5,29 @@ Handles analytics data collection and reporting
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+import os
 import uuid
 import logging
 from datetime import datetime, timedelta
+from backend.models.analytics import AnalyticsEvent, SalesRollup, ChatReport
+from backend.services.events import event_buffer
+from backend.services.dashboard import get_dashboard
 
 analytics_bp = Blueprint('analytics', __name__)
 logger = logging.getLogger(__name__)
 
+def _is_admin(user_id):
+    """Admins are listed by user ID in ADMIN_USER_IDS (comma separated)"""
+    admin_ids = {uid.strip() for uid in os.getenv('ADMIN_USER_IDS', '').split(',') if uid.strip()}
+    return user_id in admin_ids
+
+def _uuid_or_none(value):
+    """Keep only well-formed UUIDs so one bad reference can't poison a batch"""
+    try:
+        return str(uuid.UUID(str(value))) if value else None
+    except ValueError:
+        return None
+
 @analytics_bp.route('/event', methods=['POST'])
 def track_event():
     """Track an analytics event"""
@@ -21,25 +37,25 @@ def track_event():
         if not data or 'event_type' not in data:
             return jsonify({'error': 'Event type is required'}), 400
         
-        event_data = {
-            'id': str(uuid.uuid4()),
-            'event_type': data['event_type'],
-            'event_data': data.get('event_data', {}),
-            'user_id': data.get('user_id'),
-            'session_id': data.get('session_id'),
-            'ip_address': request.remote_addr,
-            'user_agent': request.headers.get('User-Agent'),
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        # TODO: Store event in database/Elasticsearch
+        event = AnalyticsEvent(
+            event_type=str(data['event_type'])[:100],
+            event_data=data.get('event_data') if isinstance(data.get('event_data'), dict) else {},
+            user_id=_uuid_or_none(data.get('user_id')),
+            session_id=_uuid_or_none(data.get('session_id')),
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent')
+        )
         
-        logger.info(f"Event tracked: {data['event_type']}")
+        # Acknowledge immediately; the buffer writes events in batches
+        if not event_buffer.offer(event):
+            response = jsonify({'error': 'Event buffer full, retry later'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
         
         return jsonify({
             'success': True,
-            'message': 'Event tracked successfully'
-        })
+            'message': 'Event accepted'
+        }), 202
         
     except Exception as e:
         logger.error(f"Error tracking event: {str(e)}")
@@ -51,34 +67,12 @@ def get_dashboard_data():
     """Get analytics dashboard data"""
     try:
         # TODO: Implement role-based access control
-        # TODO: Retrieve analytics data from Elasticsearch
-        
-        # Mock dashboard data for now
-        dashboard_data = {
-            'total_users': 1250,
-            'active_sessions': 45,
-            'total_orders': 890,
-            'revenue': 125000.50,
-            'conversion_rate': 3.2,
-            'avg_session_duration': 420,  # seconds
-            'top_products': [
-                {'name': 'MacBook Pro 16"', 'sales': 45, 'revenue': 112455.00},
-                {'name': 'iPhone 15 Pro', 'sales': 78, 'revenue': 77922.00},
-                {'name': 'iPad Pro 12.9"', 'sales': 32, 'revenue': 35168.00}
-            ],
-            'chat_metrics': {
-                'total_messages': 5420,
-                'avg_messages_per_session': 8.5,
-                'resolution_rate': 85.2,
-                'satisfaction_score': 4.3
-            },
-            'traffic_sources': [
-                {'source': 'organic', 'visitors': 450, 'percentage': 45.0},
-                {'source': 'direct', 'visitors': 300, 'percentage': 30.0},
-                {'source': 'social', 'visitors': 150, 'percentage': 15.0},
-                {'source': 'referral', 'visitors': 100, 'percentage': 10.0}
-            ]
-        }
+        force_refresh = request.args.get('refresh', 'false').lower() == 'true'
+        if force_refresh and not _is_admin(get_jwt_identity()):
+            return jsonify({'error': 'Only admins can force a refresh'}), 403
+        
+        # Served from cache; stale sections are refreshed by one worker in the background
+        dashboard_data = get_dashboard(force_refresh=force_refresh)
         
         return jsonify({
             'success': True,
@@ -94,27 +88,33 @@ def get_dashboard_data():
 def get_sales_report():
     """Get sales analytics report"""
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
         period = request.args.get('period', 'day')  # day, week, month
+        if period not in SalesRollup.PERIODS:
+            return jsonify({'error': 'Period must be day, week or month'}), 400
+        
+        try:
+            end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+                if request.args.get('end_date') else datetime.utcnow().date()
+            start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+                if request.args.get('start_date') else end_date - timedelta(days=29)
+        except ValueError:
+            return jsonify({'error': 'Dates must use YYYY-MM-DD format'}), 400
+        
+        if start_date > end_date:
+            return jsonify({'error': 'start_date must not be after end_date'}), 400
         
-        # TODO: Generate actual sales report from database
-        # Mock sales data for now
-        sales_data = [
-            {'date': '2024-01-01', 'orders': 25, 'revenue': 12500.00},
-            {'date': '2024-01-02', 'orders': 30, 'revenue': 15000.00},
-            {'date': '2024-01-03', 'orders': 28, 'revenue': 14000.00},
-            {'date': '2024-01-04', 'orders': 35, 'revenue': 17500.00},
-            {'date': '2024-01-05', 'orders': 32, 'revenue': 16000.00}
-        ]
+        # Reads pre-aggregated rollups, one row per bucket
+        sales_data = SalesRollup.report(start_date, end_date, period)
         
         return jsonify({
             'success': True,
             'data': {
                 'sales': sales_data,
                 'period': period,
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
                 'total_orders': sum(item['orders'] for item in sales_data),
-                'total_revenue': sum(item['revenue'] for item in sales_data)
+                'total_revenue': round(sum(item['revenue'] for item in sales_data), 2)
             }
         })
         
@@ -127,11 +127,16 @@ def get_sales_report():
 def get_chat_report():
     """Get chat analytics report"""
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        try:
+            end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+                if request.args.get('end_date') else datetime.utcnow().date()
+            start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+                if request.args.get('start_date') else end_date - timedelta(days=29)
+        except ValueError:
+            return jsonify({'error': 'Dates must use YYYY-MM-DD format'}), 400
         
-        # TODO: Generate actual chat report from database
-        # Mock chat analytics for now
+        # TODO: Generate the remaining chat metrics from the database
+        # Mock chat analytics for now; intents are classified on each message
         chat_data = {
             'total_sessions': 1250,
             'total_messages': 8500,
@@ -145,13 +150,7 @@ def get_chat_report():
                 {'date': '2024-01-04', 'score': 4.4},
                 {'date': '2024-01-05', 'score': 4.3}
             ],
-            'common_intents': [
-                {'intent': 'product_search', 'count': 2100, 'percentage': 35.0},
-                {'intent': 'order_status', 'count': 1200, 'percentage': 20.0},
-                {'intent': 'product_info', 'count': 900, 'percentage': 15.0},
-                {'intent': 'support', 'count': 600, 'percentage': 10.0},
-                {'intent': 'other', 'count': 1200, 'percentage': 20.0}
-            ]
+            'common_intents': ChatReport.common_intents(start_date, end_date)
         }
         
         return jsonify({
@@ -7,10 +7,17 @@ import uuid
 from datetime import datetime, timedelta
 import logging
 from backend.models.user import User
+from backend.utils.passwords import HasherBusyError
 
 auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
 
+def _busy_response():
+    """Password hashing pool is saturated; ask the client to retry shortly"""
+    response = jsonify({'error': 'Too many authentication requests, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -26,8 +33,7 @@ def register():
         password = data['password']
         
         # Check if user already exists
-        existing_user = User.find_by_email(email) or User.find_by_username(username)
-        if existing_user:
+        if User.exists(email=email, username=username):
             return jsonify({'error': 'User with this email or username already exists'}), 409
         
         # Create new user with hashed password
@@ -44,7 +50,7 @@ def register():
             # Create access token
             access_token = create_access_token(identity=user.user_id)
             
-            logger.info(f"User registered: {username} ({email})")
+            logger.info("User registered: %s (%s)", username, email)
             
             return jsonify({
                 'success': True,
@@ -56,7 +62,7 @@ def register():
         else:
             return jsonify({'error': 'Failed to create user'}), 500
         
-        logger.info(f"User registered: {username} ({email})")
+        logger.info("User registered: %s (%s)", username, email)
         
         return jsonify({
             'success': True,
@@ -66,6 +72,8 @@ def register():
             }
         }), 201
         
+    except HasherBusyError:
+        return _busy_response()
     except Exception as e:
         logger.error(f"Error registering user: {str(e)}")
         return jsonify({'error': 'Failed to register user'}), 500
@@ -89,7 +97,7 @@ def login():
             # Create access token
             access_token = create_access_token(identity=user.user_id)
             
-            logger.info(f"User logged in: {email}")
+            logger.info("User logged in: %s", email)
             
             return jsonify({
                 'success': True,
@@ -101,6 +109,8 @@ def login():
         else:
             return jsonify({'error': 'Invalid email or password'}), 401
         
+    except HasherBusyError:
+        return _busy_response()
     except Exception as e:
         logger.error(f"Error logging in user: {str(e)}")
         return jsonify({'error': 'Failed to login'}), 500
@@ -110,22 +120,13 @@ def login():
 def get_profile():
     """Get user profile"""
     try:
-        user_id = get_jwt_identity()
-        
-        # TODO: Retrieve user from database
-        # Mock user data for now
-        user_data = {
-            'id': user_id,
-            'username': 'testuser',
-            'email': 'test@example.com',
-            'first_name': 'Test',
-            'last_name': 'User',
-            'created_at': datetime.utcnow().isoformat()
-        }
+        user = User.find_by_id(get_jwt_identity())
+        if not user or not user.is_active:
+            return jsonify({'error': 'User not found'}), 404
         
         return jsonify({
             'success': True,
-            'data': user_data
+            'data': user.to_dict()
         })
         
     except Exception as e:
@@ -138,25 +139,24 @@ def update_profile():
     """Update user profile"""
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
+        data = request.get_json() or {}
+        
+        user = User.find_by_id(user_id, cached=False)
+        if not user or not user.is_active:
+            return jsonify({'error': 'User not found'}), 404
+        
+        for field in ('first_name', 'last_name', 'phone'):
+            if field in data:
+                setattr(user, field, data[field])
         
-        # TODO: Update user in database
-        # Mock update for now
-        updated_data = {
-            'id': user_id,
-            'username': data.get('username', 'testuser'),
-            'email': data.get('email', 'test@example.com'),
-            'first_name': data.get('first_name', 'Test'),
-            'last_name': data.get('last_name', 'User'),
-            'phone': data.get('phone', ''),
-            'updated_at': datetime.utcnow().isoformat()
-        }
+        if not user.save():
+            return jsonify({'error': 'Failed to update profile'}), 500
         
-        logger.info(f"Profile updated for user: {user_id}")
+        logger.info("Profile updated for user: %s", user_id)
         
         return jsonify({
             'success': True,
-            'data': updated_data
+            'data': user.to_dict()
         })
         
     except Exception as e:
@@ -1,13 +1,19 @@
 """
 Chat service routes with session management and message handling
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import uuid
 from datetime import datetime
 import logging
 from backend.models.chat import ChatSession, ChatMessage
 from backend.models.user import User
+from backend.utils.timing import StageTimer
+from backend.utils.pagination import InvalidCursor, encode_cursor
+from backend.utils.json_provider import dumps, dumps_bytes
+from backend.services.responder import responder
+from backend.services.intents import intent_classifier
+from backend.services.response_cache import response_cache
 
 logger = logging.getLogger(__name__)
 chat_bp = Blueprint('chat', __name__)
@@ -23,7 +29,7 @@ def create_chat_session():
         session = ChatSession(user_id=user_id)
         
         if session.save():
-            logger.info(f"Created chat session: {session.session_id}")
+            logger.info("Created chat session: %s", session.session_id)
             return jsonify({
                 'success': True,
                 'data': session.to_dict()
@@ -39,6 +45,7 @@ def create_chat_session():
 def send_message():
     """Send a message and get AI response"""
     try:
+        timer = StageTimer()
         data = request.get_json()
         
         if not data or 'message' not in data:
@@ -50,48 +57,119 @@ def send_message():
         if not session_id:
             return jsonify({'error': 'Session ID is required'}), 400
         
-        # Verify session exists
-        session = ChatSession.find_by_id(session_id)
+        # Served from the session cache; unknown IDs are negatively cached
+        with timer.stage('validate'):
+            session = ChatSession.find_by_id(session_id)
         if not session:
-            return jsonify({'error': 'Invalid session ID'}), 404
+            return timer.apply(jsonify({'error': 'Invalid session ID'})), 404
         
-        # Save user message
         user_message = ChatMessage(
             session_id=session_id,
             sender_type='user',
             content=message
         )
-        user_message.save()
+        with timer.stage('intent'):
+            intent_classifier.tag([user_message])
         
-        # Generate AI response (mock for now)
-        ai_content = f"I received your message: '{message}'. How can I help you find products today?"
+        if data.get('stream') or request.accept_mimetypes.best == 'text/event-stream':
+            return timer.apply(Response(
+                _stream_reply(session_id, user_message),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            ))
         
-        # Save AI response
-        ai_message = ChatMessage(
-            session_id=session_id,
-            sender_type='bot',
-            content=ai_content,
-            metadata={
-                'suggestions': [
-                    'Show me laptops',
-                    'I need a smartphone',
-                    'What\'s on sale?'
-                ]
-            }
-        )
-        ai_message.save()
+        with timer.stage('context'):
+            context = ChatMessage.get_recent_messages(session_id)
         
-        logger.info(f"Processed message for session: {session_id}")
+        with timer.stage('generate'):
+            intent = user_message.metadata.get('intent')
+            context_key = responder.context_key(context) if responder.shares_replies else ''
+            cached = response_cache.get(message, intent, context_key, responder.version)
+            if cached:
+                ai_content, metadata = cached['content'], dict(cached['metadata'], cached=True)
+            else:
+                ai_content = responder.complete(message, context)
+                metadata = responder.metadata(message, ai_content)
+                response_cache.put(message, intent, ai_content, metadata, context_key, responder.version)
+            
+            ai_message = ChatMessage(
+                session_id=session_id,
+                sender_type='bot',
+                content=ai_content,
+                metadata=metadata
+            )
         
-        return jsonify({
+        # Validate session, save both messages and touch the session at once
+        with timer.stage('persist'):
+            recorded = ChatSession.record_turn(session_id, [user_message, ai_message])
+        if not recorded:
+            return timer.apply(jsonify({'error': 'Invalid session ID'})), 404
+        
+        logger.info("Processed message for session: %s", session_id)
+        
+        response = jsonify({
             'success': True,
             'data': ai_message.to_dict()
         })
+        return timer.apply(response)
         
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
         return jsonify({'error': 'Failed to process message'}), 500
 
+def _sse(event: str, payload) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {dumps(payload)}\n\n"
+
+def _stream_reply(session_id, user_message):
+    """Send the bot reply as SSE chunks, then persist the turn
+    
+    Events: ``start`` (message id), ``delta`` per chunk, then ``done`` with
+    the stored message or ``error``. If the client disconnects mid-reply
+    the turn is still stored, with the partial reply marked truncated.
+    """
+    ai_message = ChatMessage(session_id=session_id, sender_type='bot', content='')
+    chunks = []
+    finished = False
+    try:
+        yield _sse('start', {'message_id': ai_message.message_id, 'session_id': session_id})
+        context = ChatMessage.get_recent_messages(session_id)
+        intent = user_message.metadata.get('intent')
+        context_key = responder.context_key(context) if responder.shares_replies else ''
+        cached = response_cache.get(user_message.content, intent, context_key, responder.version)
+        if cached:
+            chunks.append(cached['content'])
+            yield _sse('delta', {'text': cached['content']})
+            ai_message.metadata = dict(cached['metadata'], cached=True)
+        else:
+            for chunk in responder.stream(user_message.content, context):
+                chunks.append(chunk)
+                yield _sse('delta', {'text': chunk})
+            ai_message.metadata = responder.metadata(user_message.content, ''.join(chunks))
+            response_cache.put(user_message.content, intent, ''.join(chunks),
+                               ai_message.metadata, context_key, responder.version)
+        
+        ai_message.content = ''.join(chunks)
+        finished = True
+        if not ChatSession.record_turn(session_id, [user_message, ai_message]):
+            yield _sse('error', {'error': 'Invalid session ID'})
+            return
+        
+        logger.info("Streamed message for session: %s", session_id)
+        yield _sse('done', ai_message)
+        
+    except Exception as e:
+        logger.error(f"Error streaming message: {str(e)}")
+        yield _sse('error', {'error': 'Failed to process message'})
+    finally:
+        if not finished:
+            ai_message.content = ''.join(chunks)
+            ai_message.metadata = {'truncated': True}
+            try:
+                ChatSession.record_turn(session_id, [user_message, ai_message])
+            except Exception as e:
+                logger.error(f"Failed to store interrupted reply for session {session_id}: {e}")
+
 @chat_bp.route('/history/<session_id>', methods=['GET'])
 @jwt_required(optional=True)
 def get_chat_history(session_id):
@@ -102,20 +180,77 @@ def get_chat_history(session_id):
         if not session:
             return jsonify({'error': 'Invalid session ID'}), 404
         
-        # Get chat messages from database
-        messages = ChatMessage.find_by_session_id(session_id)
+        cursor = request.args.get('cursor')
+        limit = max(min(request.args.get('limit', 100, type=int), 500), 1)
         
-        # Convert to response format
-        history = [message.to_dict() for message in messages]
+        # Get chat messages from database
+        page = ChatMessage.find_page_by_session_id(session_id, limit=limit, cursor=cursor,
+                                                   since_id=request.args.get('since_id'))
         
         return jsonify({
             'success': True,
             'data': {
                 'session_id': session_id,
-                'messages': history
+                'messages': page.items,
+                'next_cursor': page.next_cursor
             }
         })
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error retrieving chat history: {str(e)}")
         return jsonify({'error': 'Failed to retrieve chat history'}), 500
+
+def _ndjson_history(messages, cursor, lines_per_chunk=100):
+    """Encode messages as NDJSON, ending with a line carrying the resume cursor"""
+    chunk = []
+    last = None
+    try:
+        for message in messages:
+            last = message
+            chunk.append(dumps_bytes(message))
+            if len(chunk) >= lines_per_chunk:
+                yield b'\n'.join(chunk) + b'\n'
+                chunk = []
+    except Exception as e:
+        logger.error(f"Chat history stream interrupted: {e}")
+        chunk.append(dumps_bytes({'error': 'History stream interrupted'}))
+        yield b'\n'.join(chunk) + b'\n'
+        return
+    
+    if last is not None:
+        cursor = encode_cursor('chat_messages:session', [last.created_at, last.message_id])
+    chunk.append(dumps_bytes({'next_cursor': cursor}))
+    yield b'\n'.join(chunk) + b'\n'
+
+@chat_bp.route('/history/<session_id>/stream', methods=['GET'])
+@jwt_required(optional=True)
+def stream_chat_history(session_id):
+    """Stream a session's history as NDJSON, optionally only messages since a cursor
+    
+    Each line is one message; the last line is {"next_cursor": ...}, which a
+    reconnecting client passes back as ?cursor= to fetch only the delta.
+    ?since_id=<message_id> does the same from a known message.
+    """
+    try:
+        session = ChatSession.find_by_id(session_id)
+        if not session:
+            return jsonify({'error': 'Invalid session ID'}), 404
+        
+        # since_id is resolved to a cursor so an empty delta can still end with one
+        cursor = ChatMessage.start_cursor(session_id, request.args.get('cursor'),
+                                          request.args.get('since_id'))
+        messages = ChatMessage.stream_by_session_id(session_id, cursor=cursor)
+        
+        return Response(
+            _ndjson_history(messages, cursor),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error streaming chat history: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve chat history'}), 500
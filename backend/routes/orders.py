@@ -8,6 +8,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 import uuid
 import logging
 from datetime import datetime
+from backend.models.order import Order, OrderRejected
+from backend.services.recommendations import neighbor_refresher
+from backend.utils.pagination import InvalidCursor
 
 orders_bp = Blueprint('orders', __name__)
 logger = logging.getLogger(__name__)
@@ -27,32 +30,41 @@ def create_order():
         if not items:
             return jsonify({'error': 'At least one item is required'}), 400
         
-        # Calculate total amount
-        total_amount = sum(item.get('price', 0) * item.get('quantity', 1) for item in items)
+        quantities = {}
+        for item in items:
+            product_id = item.get('product_id')
+            quantity = item.get('quantity', 1)
+            if not product_id or not isinstance(quantity, int) or quantity <= 0:
+                return jsonify({'error': 'Each item needs a product_id and a positive quantity'}), 400
+            try:
+                product_id = str(uuid.UUID(str(product_id)))
+            except ValueError:
+                return jsonify({'error': 'Unknown or unavailable products', 'product_ids': [product_id]}), 400
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
         
-        # TODO: Validate items exist and are available
         # TODO: Process payment with Stripe
-        # TODO: Store order in database
         
-        order_id = str(uuid.uuid4())
-        order_data = {
-            'id': order_id,
-            'user_id': user_id,
-            'status': 'pending',
-            'total_amount': total_amount,
-            'currency': 'USD',
-            'payment_status': 'pending',
-            'items': items,
-            'shipping_address': data.get('shipping_address'),
-            'billing_address': data.get('billing_address'),
-            'created_at': datetime.utcnow().isoformat()
-        }
-        
-        logger.info(f"Order created: {order_id} for user: {user_id}")
+        # Reserve stock, price from the catalog rows and write the order in one transaction
+        try:
+            order, order_items = Order.place(
+                user_id,
+                quantities,
+                shipping_address=data.get('shipping_address'),
+                billing_address=data.get('billing_address')
+            )
+        except OrderRejected as e:
+            return jsonify({'error': str(e), 'product_ids': e.product_ids}), e.status
+        
+        logger.info("Order created: %s for user: %s", order.order_id, user_id)
+        # Re-rank co-purchase neighbors for the products just bought together
+        neighbor_refresher.notify()
         
         return jsonify({
             'success': True,
-            'data': order_data
+            'data': {
+                **order.to_dict(),
+                'items': [item.to_dict() for item in order_items]
+            }
         }), 201
         
     except Exception as e:
@@ -65,47 +77,23 @@ def get_orders():
     """Get user's orders"""
     try:
         user_id = get_jwt_identity()
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 10, type=int)
+        cursor = request.args.get('cursor')
+        limit = max(min(request.args.get('limit', 10, type=int), 100), 1)
         status = request.args.get('status')
         
-        # TODO: Retrieve orders from database with pagination
-        # Mock orders for now
-        mock_orders = [
-            {
-                'id': str(uuid.uuid4()),
-                'status': 'completed',
-                'total_amount': 2499.00,
-                'currency': 'USD',
-                'payment_status': 'paid',
-                'items_count': 1,
-                'created_at': datetime.utcnow().isoformat()
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'status': 'pending',
-                'total_amount': 999.00,
-                'currency': 'USD',
-                'payment_status': 'pending',
-                'items_count': 1,
-                'created_at': datetime.utcnow().isoformat()
-            }
-        ]
-        
-        # Filter by status if specified
-        if status:
-            mock_orders = [order for order in mock_orders if order['status'] == status]
+        page = Order.find_page_by_user_id(user_id, limit=limit, cursor=cursor, status=status)
         
         return jsonify({
             'success': True,
             'data': {
-                'orders': mock_orders,
-                'total': len(mock_orders),
-                'page': page,
+                'orders': page.items,
+                'next_cursor': page.next_cursor,
                 'limit': limit
             }
         })
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error retrieving orders: {str(e)}")
         return jsonify({'error': 'Failed to retrieve orders'}), 500
@@ -168,7 +156,7 @@ def cancel_order(order_id):
         # TODO: Process refund if payment was made
         # TODO: Update order status in database
         
-        logger.info(f"Order cancelled: {order_id} by user: {user_id}")
+        logger.info("Order cancelled: %s by user: %s", order_id, user_id)
         
         return jsonify({
             'success': True,
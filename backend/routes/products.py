@@ -3,10 +3,9 @@ Product service routes with search, retrieval, and recommendations
 """
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import uuid
-from datetime import datetime
 import logging
 from backend.models.product import Product
+from backend.utils.pagination import InvalidCursor
 
 products_bp = Blueprint('products', __name__)
 logger = logging.getLogger(__name__)
@@ -17,102 +16,78 @@ def search_products():
     try:
         query = request.args.get('q', '')
         category = request.args.get('category', '')
+        brand = request.args.get('brand', '')
         min_price = request.args.get('min_price', type=float)
         max_price = request.args.get('max_price', type=float)
-        limit = request.args.get('limit', 20, type=int)
+        limit = max(min(request.args.get('limit', 20, type=int), 100), 1)
+        cursor = request.args.get('cursor')
         
         if not query and not category:
             return jsonify({'error': 'Query or category is required'}), 400
         
-        # TODO: Implement actual product search with database/API
-        # Mock products for now
-        mock_products = [
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'MacBook Pro 16"',
-                'description': 'Apple MacBook Pro with M2 chip',
-                'price': 2499.00,
-                'currency': 'USD',
-                'category': 'laptops',
-                'brand': 'Apple',
-                'image_url': 'https://example.com/macbook.jpg',
-                'product_url': 'https://example.com/product/macbook',
-                'availability': 'in_stock',
-                'rating': 4.8,
-                'reviews_count': 1250
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'iPhone 15 Pro',
-                'description': 'Latest iPhone with A17 Pro chip',
-                'price': 999.00,
-                'currency': 'USD',
-                'category': 'smartphones',
-                'brand': 'Apple',
-                'image_url': 'https://example.com/iphone.jpg',
-                'product_url': 'https://example.com/product/iphone',
-                'availability': 'in_stock',
-                'rating': 4.7,
-                'reviews_count': 2100
-            }
-        ]
-        
-        # Filter by price if specified
-        if min_price is not None:
-            mock_products = [p for p in mock_products if p['price'] >= min_price]
-        if max_price is not None:
-            mock_products = [p for p in mock_products if p['price'] <= max_price]
+        result = Product.search_with_facets(
+            query=query or None,
+            category=category or None,
+            brand=brand or None,
+            min_price=min_price,
+            max_price=max_price,
+            limit=limit,
+            cursor=cursor
+        )
+        products = result['products']
         
-        # Limit results
-        mock_products = mock_products[:limit]
-        
-        logger.info(f"Product search: query='{query}', category='{category}', results={len(mock_products)}")
+        logger.info("Product search: query='%s', category='%s', results=%s, engine=%s",
+                    query, category, len(products), result['engine'])
         
         return jsonify({
             'success': True,
             'data': {
-                'products': mock_products,
-                'total': len(mock_products),
+                'products': products,
+                'total': result['total'] if result['total'] is not None else len(products),
+                'facets': result['facets'],
+                'next_cursor': result['next_cursor'],
                 'query': query,
                 'category': category
             }
         })
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error searching products: {str(e)}")
         return jsonify({'error': 'Failed to search products'}), 500
 
+@products_bp.route('/semantic', methods=['GET'])
+def semantic_search_products():
+    """Find products matching free text by meaning (embedding index)"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = max(min(request.args.get('limit', 10, type=int), 100), 1)
+        
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+        
+        products = Product.semantic_search(query, limit=limit)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'products': products,
+                'query': query
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in semantic product search: {str(e)}")
+        return jsonify({'error': 'Failed to search products'}), 500
+
 @products_bp.route('/<product_id>', methods=['GET'])
 def get_product(product_id):
     """Get product details by ID"""
     try:
-        # TODO: Retrieve product from database/API
-        # Mock product for now
-        product = {
-            'id': product_id,
-            'name': 'MacBook Pro 16"',
-            'description': 'Apple MacBook Pro with M2 chip, 16GB RAM, 512GB SSD',
-            'price': 2499.00,
-            'currency': 'USD',
-            'category': 'laptops',
-            'brand': 'Apple',
-            'image_url': 'https://example.com/macbook.jpg',
-            'product_url': 'https://example.com/product/macbook',
-            'availability': 'in_stock',
-            'rating': 4.8,
-            'reviews_count': 1250,
-            'specifications': {
-                'processor': 'Apple M2 Pro',
-                'memory': '16GB',
-                'storage': '512GB SSD',
-                'display': '16.2-inch Liquid Retina XDR',
-                'weight': '4.7 lbs'
-            },
-            'images': [
-                'https://example.com/macbook1.jpg',
-                'https://example.com/macbook2.jpg'
-            ]
-        }
+        product = Product.find_by_id(product_id)
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
         
         return jsonify({
             'success': True,
@@ -124,36 +99,21 @@ def get_product(product_id):
         return jsonify({'error': 'Product not found'}), 404
 
 @products_bp.route('/recommendations', methods=['GET'])
+@jwt_required(optional=True)
 def get_recommendations():
-    """Get product recommendations"""
+    """Get products frequently bought together with a product or by the signed-in user"""
     try:
-        user_id = request.args.get('user_id')
-        category = request.args.get('category')
-        limit = request.args.get('limit', 10, type=int)
-        
-        # TODO: Implement AI-based recommendations
-        # Mock recommendations for now
-        recommendations = [
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'iPad Pro 12.9"',
-                'price': 1099.00,
-                'image_url': 'https://example.com/ipad.jpg',
-                'reason': 'Frequently bought together'
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'AirPods Pro',
-                'price': 249.00,
-                'image_url': 'https://example.com/airpods.jpg',
-                'reason': 'Perfect complement'
-            }
-        ]
+        product_id = request.args.get('product_id')
+        limit = max(min(request.args.get('limit', 10, type=int), 50), 1)
+        # Purchase history is private: only the caller's own, never a user_id argument
+        user_id = get_jwt_identity()
+        
+        recommendations = Product.get_recommendations(product_id=product_id, user_id=user_id, limit=limit)
         
         return jsonify({
             'success': True,
             'data': {
-                'recommendations': recommendations[:limit],
+                'recommendations': recommendations,
                 'total': len(recommendations)
             }
         })
@@ -0,0 +1 @@
+# Backend services package
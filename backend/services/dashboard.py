@@ -0,0 +1,43 @@
+"""
+Analytics dashboard payload, computed in the background and served from cache
+"""
+import os
+from typing import Any, Dict
+from backend.models.analytics import DashboardMetrics
+from backend.utils.cache import StaleWhileRevalidateCache
+
+
+def _ttl(section: str, default: int) -> int:
+    return int(os.getenv(f"DASHBOARD_TTL_{section.upper()}", default))
+
+
+# Section name -> (loader, TTL in seconds); cheap, fast-moving sections refresh more often
+DASHBOARD_SECTIONS = {
+    'users': (DashboardMetrics.users, _ttl('users', 300)),
+    'sessions': (DashboardMetrics.sessions, _ttl('sessions', 30)),
+    'sales': (DashboardMetrics.sales, _ttl('sales', 60)),
+    'top_products': (DashboardMetrics.top_products, _ttl('top_products', 300)),
+    'chat': (DashboardMetrics.chat, _ttl('chat', 120)),
+    'traffic_sources': (DashboardMetrics.traffic_sources, _ttl('traffic_sources', 600))
+}
+
+dashboard_cache = StaleWhileRevalidateCache(
+    'dashboard',
+    DASHBOARD_SECTIONS,
+    max_stale=int(os.getenv('DASHBOARD_MAX_STALE', '3600'))
+)
+
+
+def get_dashboard(force_refresh: bool = False) -> Dict[str, Any]:
+    """Merge every cached section into one payload plus per-section freshness"""
+    payload = {}
+    freshness = {}
+    for name, section in dashboard_cache.get_all(force=force_refresh).items():
+        if section['value']:
+            payload.update(section['value'])
+        freshness[name] = {
+            'computed_at': section['computed_at'],
+            'stale': section['stale']
+        }
+    payload['freshness'] = freshness
+    return payload
@@ -0,0 +1,381 @@
+"""
+Product embeddings in a memory-mapped vector index for semantic search
+"""
+import os
+import re
+import time
+import zlib
+import fcntl
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """Deterministic local stand-in for an embedding model
+    
+    Words and their character trigrams are hashed (CRC32, so stable across
+    processes and runs) into ``dim`` signed buckets and the vector is L2
+    normalized. Texts sharing words or word fragments get similar vectors.
+    """
+    
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+    
+    def _features(self, text: str) -> List[int]:
+        features = []
+        for word in _WORD_RE.findall(text.lower()):
+            features.append(zlib.crc32(word.encode('utf-8')))
+            padded = f"#{word}#"
+            features.extend(zlib.crc32(padded[i:i + 3].encode('utf-8')) for i in range(len(padded) - 2))
+        return features
+    
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into an (n, dim) float32 matrix of unit vectors"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.array(self._features(text or ''), dtype=np.uint32)
+            if hashes.size:
+                signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+                np.add.at(vectors[row], hashes % self.dim, signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+    
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+
+def product_text(product) -> str:
+    """Text a product is embedded from"""
+    return ' '.join(filter(None, [product.name, product.brand, product.category, product.description]))
+
+
+def _text_hash(text: str) -> str:
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+class EmbeddingIndex:
+    """Append-only vector index memory-mapped from disk
+    
+    ``CURRENT`` names the active generation directory, which holds
+    ``vectors.f32`` (float32 unit vectors, one per row) and ``ids.txt``
+    (line i describes row i: the product id and a hash of its text, or
+    ``-id`` for a removal). The latest row per id wins, so updates only
+    append; products whose text is unchanged are skipped, and once
+    ``compact_ratio`` of the rows are superseded the live rows are copied
+    into a new generation.
+    
+    Every worker maps the same files read-only, so they share one copy in
+    the page cache and see each other's appends. Writers serialize on an
+    flock.
+    """
+    
+    def __init__(self, path: str, embedder: HashingEmbedder = None, refresh_interval: float = 1.0,
+                 block_rows: int = 65536, compact_ratio: float = 0.5, compact_min_rows: int = 10000):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.refresh_interval = refresh_interval
+        self.block_rows = block_rows
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self._lock = threading.RLock()
+        self._generation = None
+        self._checked_at = 0.0
+        self._reset()
+    
+    def _reset(self):
+        self._ids: List[str] = []
+        self._hashes: List[Optional[str]] = []
+        self._latest: Dict[str, int] = {}
+        self._valid = np.zeros(0, dtype=bool)
+        self._ids_offset = 0
+        self._vectors = None
+    
+    def _current_dir(self) -> str:
+        try:
+            with open(os.path.join(self.path, 'CURRENT')) as f:
+                return os.path.join(self.path, f.read().strip())
+        except FileNotFoundError:
+            return None
+    
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _new_generation(self) -> str:
+        """Create an empty generation directory and return its name"""
+        name = f"gen-{time.time_ns()}"
+        os.makedirs(os.path.join(self.path, name))
+        for filename in ('vectors.f32', 'ids.txt'):
+            open(os.path.join(self.path, name, filename), 'wb').close()
+        return name
+    
+    def _switch_generation(self, name: str):
+        pointer = os.path.join(self.path, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(self.path, 'CURRENT'))
+    
+    def refresh(self, force: bool = False):
+        """Pick up appended rows or a new generation written by any process"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            directory = self._current_dir()
+            if directory != self._generation:
+                self._reset()
+                self._generation = directory
+            if directory is None:
+                return
+            
+            ids_path = os.path.join(directory, 'ids.txt')
+            try:
+                with open(ids_path, 'rb') as f:
+                    f.seek(self._ids_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # Only whole lines; a writer may be mid-append
+            complete = data.rfind(b'\n') + 1
+            if not complete:
+                return
+            
+            start = len(self._ids)
+            lines = data[:complete].decode('utf-8').splitlines()
+            try:
+                vectors = np.memmap(os.path.join(directory, 'vectors.f32'), dtype=np.float32,
+                                    mode='r', shape=(start + len(lines), self.dim))
+            except FileNotFoundError:
+                # Generation removed after we read CURRENT; the next refresh follows it
+                return
+            
+            valid = np.zeros(start + len(lines), dtype=bool)
+            valid[:start] = self._valid
+            for row, line in enumerate(lines, start):
+                removed = line.startswith('-')
+                product_id, _, text_hash = line.lstrip('-').partition('\t')
+                previous = self._latest.get(product_id)
+                if previous is not None:
+                    valid[previous] = False
+                self._latest[product_id] = row
+                valid[row] = not removed
+                self._ids.append(product_id)
+                self._hashes.append(None if removed else text_hash)
+            self._valid = valid
+            self._ids_offset += complete
+            self._vectors = vectors
+    
+    def _indexed_hash(self, product_id: str) -> Optional[str]:
+        """Text hash of a product's live row; None if it is not indexed"""
+        row = self._latest.get(product_id)
+        return self._hashes[row] if row is not None else None
+    
+    def __len__(self) -> int:
+        self.refresh()
+        return int(self._valid.sum())
+    
+    def dead_rows(self) -> int:
+        """Rows superseded by a later row for the same id, or removals"""
+        self.refresh()
+        with self._lock:
+            return len(self._ids) - int(self._valid.sum())
+    
+    def search(self, queries: np.ndarray, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Top-k (product_id, cosine) per query vector, best first
+        
+        Scores the matrix block by block so memory stays bounded by
+        ``block_rows`` whatever the catalog size.
+        """
+        self.refresh()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+        
+        with self._lock:
+            vectors, valid, ids = self._vectors, self._valid, self._ids
+        count = len(valid)
+        if vectors is None or not count or k <= 0:
+            return [[] for _ in range(len(queries))]
+        
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, count, self.block_rows):
+            end = min(start + self.block_rows, count)
+            scores = queries @ np.asarray(vectors[start:end]).T
+            scores[:, ~valid[start:end]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+        
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(ids[row], float(score)) for row, score in zip(rows, scores) if score != -np.inf]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+    
+    def search_text(self, texts: Sequence[str], k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Embed query texts and search them in one batch"""
+        return self.search(self.embedder.embed_batch(list(texts)), k)
+    
+    def _append(self, vectors: np.ndarray, lines: List[str]):
+        """Append rows to the current generation
+        
+        The caller holds the write lock and has just refreshed, so the rows
+        read so far are exactly the committed ones. Anything past them was
+        left by a writer that crashed between the two files and is cut off
+        first; otherwise the new vectors would land on the wrong rows.
+        """
+        name = self._current_dir()
+        if name is None:
+            generation = self._new_generation()
+            self._switch_generation(generation)
+            name = os.path.join(self.path, generation)
+        # Vectors first: readers only count rows that have an id line
+        with open(os.path.join(name, 'vectors.f32'), 'ab') as f:
+            f.truncate(len(self._ids) * self.dim * 4)
+            f.write(vectors.tobytes())
+        with open(os.path.join(name, 'ids.txt'), 'ab') as f:
+            f.truncate(self._ids_offset)
+            f.write(''.join(lines).encode('utf-8'))
+    
+    def upsert(self, products: Iterable) -> int:
+        """Append embeddings for products whose text changed; inactive products are removed
+        
+        Returns the number of rows written.
+        """
+        products = list(products)
+        if not products:
+            return 0
+        
+        with self._write_lock():
+            self.refresh(force=True)
+            changed = {}
+            with self._lock:
+                for product in products:
+                    text = product_text(product) if product.is_active else None
+                    text_hash = _text_hash(text) if text is not None else None
+                    indexed = self._indexed_hash(product.product_id)
+                    if text_hash != indexed:
+                        changed[product.product_id] = (text, text_hash)
+            if not changed:
+                return 0
+            
+            vectors = np.zeros((len(changed), self.dim), dtype=np.float32)
+            live = [row for row, (text, _) in enumerate(changed.values()) if text is not None]
+            if live:
+                vectors[live] = self.embedder.embed_batch([text for text, _ in changed.values() if text is not None])
+            self._append(vectors, [
+                f"{product_id}\t{text_hash}\n" if text_hash else f"-{product_id}\n"
+                for product_id, (_, text_hash) in changed.items()
+            ])
+        
+        self._compact_if_needed()
+        return len(changed)
+    
+    def remove(self, product_ids: Iterable[str]) -> int:
+        """Drop products from search results"""
+        with self._write_lock():
+            self.refresh(force=True)
+            with self._lock:
+                product_ids = [pid for pid in dict.fromkeys(product_ids) if self._indexed_hash(pid) is not None]
+            if not product_ids:
+                return 0
+            self._append(np.zeros((len(product_ids), self.dim), dtype=np.float32),
+                         [f"-{pid}\n" for pid in product_ids])
+        
+        self._compact_if_needed()
+        return len(product_ids)
+    
+    def _compact_if_needed(self):
+        dead = self.dead_rows()
+        if dead >= self.compact_min_rows and dead >= self.compact_ratio * len(self._ids):
+            self.compact()
+    
+    def rebuild(self, batches: Iterable[Sequence]) -> int:
+        """Write a fresh generation from batches of products and switch to it"""
+        with self._write_lock():
+            generation = self._new_generation()
+            directory = os.path.join(self.path, generation)
+            written = 0
+            with open(os.path.join(directory, 'vectors.f32'), 'ab') as vectors_file, \
+                    open(os.path.join(directory, 'ids.txt'), 'ab') as ids_file:
+                for batch in batches:
+                    active = [p for p in batch if p.is_active]
+                    if not active:
+                        continue
+                    texts = [product_text(p) for p in active]
+                    vectors_file.write(self.embedder.embed_batch(texts).tobytes())
+                    ids_file.write(''.join(
+                        f"{p.product_id}\t{_text_hash(text)}\n" for p, text in zip(active, texts)
+                    ).encode('utf-8'))
+                    written += len(active)
+            self._switch_generation(generation)
+            self._remove_old_generations(generation)
+        self.refresh(force=True)
+        return written
+    
+    def compact(self) -> int:
+        """Rewrite the current generation without superseded or removed rows"""
+        with self._write_lock():
+            self.refresh(force=True)
+            with self._lock:
+                vectors, valid, ids, hashes = self._vectors, self._valid, self._ids, self._hashes
+            if vectors is None:
+                return 0
+            
+            generation = self._new_generation()
+            directory = os.path.join(self.path, generation)
+            rows = np.flatnonzero(valid)
+            with open(os.path.join(directory, 'vectors.f32'), 'ab') as f:
+                for start in range(0, len(rows), self.block_rows):
+                    f.write(np.asarray(vectors[rows[start:start + self.block_rows]]).tobytes())
+            with open(os.path.join(directory, 'ids.txt'), 'ab') as f:
+                f.write(''.join(f"{ids[row]}\t{hashes[row]}\n" for row in rows).encode('utf-8'))
+            self._switch_generation(generation)
+            self._remove_old_generations(generation)
+        self.refresh(force=True)
+        logger.info("Compacted embedding index from %s to %s rows", len(valid), len(rows))
+        return len(rows)
+    
+    def _remove_old_generations(self, keep: str):
+        # Processes still mapping an old generation keep reading it until
+        # they refresh; unlinked files stay valid while mapped
+        for name in os.listdir(self.path):
+            if name.startswith('gen-') and name != keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+product_embeddings = EmbeddingIndex(
+    os.getenv('EMBEDDING_INDEX_DIR', 'data/embeddings'),
+    embedder=HashingEmbedder(dim=int(os.getenv('EMBEDDING_DIM', '256'))),
+    refresh_interval=float(os.getenv('EMBEDDING_INDEX_REFRESH_INTERVAL', '1.0')),
+    compact_ratio=float(os.getenv('EMBEDDING_INDEX_COMPACT_RATIO', '0.5')),
+    compact_min_rows=int(os.getenv('EMBEDDING_INDEX_COMPACT_MIN_ROWS', '10000'))
+)
@@ -0,0 +1,155 @@
+"""
+Buffered, batched ingestion of analytics events
+"""
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Callable, List, Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """Bounded in-memory buffer flushed to storage by a background thread
+    
+    ``offer`` never blocks: it enqueues and returns immediately, or returns
+    False when the buffer is full so the caller can push back on the
+    client. The writer thread flushes a batch as soon as it holds
+    ``batch_size`` events or ``flush_interval`` seconds have passed since
+    the first event of the batch, whichever comes first.
+    
+    If the sink raises (storage unreachable), the batch is kept and
+    retried with exponential backoff from ``retry_backoff`` up to
+    ``max_backoff`` seconds; new events keep queueing meanwhile. Rows the
+    sink rejects itself are reported through its return value.
+    """
+    
+    def __init__(self, sink: Callable[[List[Any]], int], max_size: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 1.0,
+                 name: str = 'events', retry_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.sink = sink
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._backoff = 0.0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'accepted': 0, 'rejected': 0, 'flushed': 0, 'failed': 0, 'batches': 0, 'retries': 0}
+    
+    def _ensure_writer(self):
+        """Start the writer thread once per process (threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked child: events queued in the parent belong to the parent
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+    
+    def offer(self, event: Any) -> bool:
+        """Enqueue an event without blocking; False means the buffer is full"""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._stats['rejected'] += 1
+            return False
+        self._stats['accepted'] += 1
+        return True
+    
+    def _take_batch(self) -> List[Any]:
+        """Block until a batch is full, the flush interval elapses or we stop"""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                timeout = 0.5 if not self._stop.is_set() else 0
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                event = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                if batch or self._stop.is_set():
+                    break
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(event)
+        return batch
+    
+    def _write(self, batch: List[Any]) -> bool:
+        """Hand a batch to the sink, counting what was stored; False means retry it"""
+        try:
+            written = self.sink(batch)
+        except Exception as e:
+            if self._stop.is_set():
+                logger.error(f"Dropping {len(batch)} {self.name} on shutdown: {e}")
+                self._stats['failed'] += len(batch)
+                return True
+            self._backoff = min(self._backoff * 2 or self.retry_backoff, self.max_backoff)
+            self._stats['retries'] += 1
+            logger.warning(f"Failed to flush {len(batch)} {self.name}, retrying in {self._backoff:.0f}s: {e}")
+            return False
+        self._backoff = 0.0
+        self._stats['batches'] += 1
+        self._stats['flushed'] += written
+        self._stats['failed'] += len(batch) - written
+        return True
+    
+    def _run(self):
+        batch = []
+        while True:
+            if not batch:
+                batch = self._take_batch()
+                if not batch:
+                    if self._stop.is_set():
+                        return
+                    continue
+            if self._write(batch):
+                batch = []
+            else:
+                # Returns early on close() for one last attempt
+                self._stop.wait(self._backoff)
+    
+    def close(self, timeout: float = 5.0):
+        """Flush what is buffered and stop the writer"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Buffer counters and current depth"""
+        return dict(self._stats, queued=self._queue.qsize(), max_size=self.max_size)
+
+
+def _write_events(events):
+    from backend.models.analytics import AnalyticsEvent
+    return AnalyticsEvent.save_many(events)
+
+
+event_buffer = EventBuffer(
+    _write_events,
+    max_size=int(os.getenv('ANALYTICS_BUFFER_MAX_SIZE', '10000')),
+    batch_size=int(os.getenv('ANALYTICS_BATCH_SIZE', '500')),
+    flush_interval=float(os.getenv('ANALYTICS_FLUSH_INTERVAL', '1.0')),
+    name='analytics events',
+    max_backoff=float(os.getenv('ANALYTICS_MAX_RETRY_BACKOFF', '30'))
+)
+atexit.register(event_buffer.close)
@@ -0,0 +1,179 @@
+"""
+In-process intent classification for chat messages
+"""
+import re
+import zlib
+from collections import namedtuple
+from typing import Dict, Iterable, List, Sequence
+import numpy as np
+
+IntentResult = namedtuple('IntentResult', ['intent', 'confidence'])
+
+INTENTS = ('product_search', 'order_status', 'product_info', 'support')
+OTHER = 'other'
+
+# High-precision phrases; each match adds PATTERN_WEIGHT to the intent's log score
+INTENT_PATTERNS = {
+    'order_status': [
+        r"track(?:ing)?(?: my)? (?:order|package|parcel)", r"order status", r"status of my order",
+        r"where(?:'s| is) my (?:order|package|parcel|delivery)", r"has my order shipped",
+        r"when will (?:it|my order) (?:arrive|ship|be delivered)", r"tracking number",
+        r"order #?\d{4,}", r"cancel my order"
+    ],
+    'support': [
+        r"(?:speak|talk) to (?:a |an )?(?:human|agent|person|representative)", r"customer (?:service|support)",
+        r"refund", r"return (?:this|my|an? )", r"complaint", r"(?:reset|forgot) (?:my )?password",
+        r"(?:doesn't|does not|won't|isn't) work", r"broken", r"damaged", r"charged twice", r"contact (?:you|support)"
+    ],
+    'product_info': [
+        r"spec(?:s|ification|ifications)\b", r"warranty", r"dimensions", r"how (?:big|heavy|long)",
+        r"battery life", r"compatible with", r"(?:is|are) (?:it|this|they) (?:in stock|available)",
+        r"difference between", r"(?:tell me|more) about (?:this|the|that)", r"what (?:colou?rs|sizes)",
+        r"reviews? (?:of|for)"
+    ],
+    'product_search': [
+        r"show me", r"looking for", r"i(?:'m| am) searching for", r"do you (?:have|sell)",
+        r"(?:find|recommend|suggest) (?:me )?(?:a|an|some)", r"i (?:need|want) (?:a|an|some|new)",
+        r"(?:under|below|less than) \$?\d+", r"on sale", r"best (?:\w+ )?for", r"cheapest"
+    ]
+}
+
+# Example messages the vectorized model is fitted on at start-up
+SEED_EXAMPLES = {
+    'product_search': [
+        "show me laptops", "i need a smartphone", "what's on sale", "looking for running shoes",
+        "do you have wireless headphones", "cheap gaming laptop under 1000", "recommend a good tablet",
+        "find me a gift for my dad", "best camera for travel", "i want a new tv",
+        "any deals on monitors", "search for black jackets", "budget phone with good camera"
+    ],
+    'order_status': [
+        "where is my order", "track my order", "has my package shipped", "order status please",
+        "when will my order arrive", "my delivery is late", "tracking number for my order",
+        "is my parcel on the way", "i haven't received my order", "cancel my order",
+        "check order 12345", "what is the shipping status"
+    ],
+    'product_info': [
+        "what are the specs of this laptop", "does it have a warranty", "how long is the battery life",
+        "is this phone compatible with my charger", "what colors does it come in", "is it in stock",
+        "tell me more about this product", "what sizes are available", "difference between these two models",
+        "how heavy is it", "what material is it made of", "reviews of this headset"
+    ],
+    'support': [
+        "i want a refund", "how do i return an item", "talk to a human", "my product is broken",
+        "the item arrived damaged", "i was charged twice", "i forgot my password", "contact customer service",
+        "the app doesn't work", "i have a complaint", "need help with my account", "payment failed"
+    ]
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9$']+")
+
+
+class IntentClassifier:
+    """Keyword/pattern matcher combined with a hashed naive Bayes model
+    
+    Messages are tokenized into unigrams and bigrams hashed into
+    ``n_features`` buckets; per-intent log probabilities for every bucket
+    live in one matrix, so scoring a batch is a gather plus a segmented sum
+    in NumPy. Pattern matches (one precompiled alternation for all intents)
+    add a fixed boost. Messages whose best posterior is below
+    ``min_confidence`` and that match no pattern are labelled ``other``.
+    """
+    
+    PATTERN_WEIGHT = 3.0
+    
+    def __init__(self, examples: Dict[str, Sequence[str]] = None,
+                 patterns: Dict[str, Sequence[str]] = None,
+                 n_features: int = 1 << 14, alpha: float = 0.1,
+                 min_confidence: float = 0.5, feature_cache_size: int = 100000):
+        examples = examples or SEED_EXAMPLES
+        patterns = patterns or INTENT_PATTERNS
+        self.intents = tuple(examples)
+        self._intent_index = {intent: i for i, intent in enumerate(self.intents)}
+        self.n_features = n_features
+        self.min_confidence = min_confidence
+        self._feature_cache = {}
+        self._feature_cache_size = feature_cache_size
+        
+        self._pattern = re.compile('|'.join(
+            f"(?P<{intent}>\\b(?:{'|'.join(patterns[intent])}))"
+            for intent in self.intents if patterns.get(intent)
+        ))
+        
+        # Column n_features is an all-zero bucket for messages with no tokens
+        counts = np.zeros((len(self.intents), n_features + 1), dtype=np.float64)
+        for intent, texts in examples.items():
+            row = self._intent_index[intent]
+            for text in texts:
+                np.add.at(counts[row], self._features(text.lower()), 1.0)
+        totals = counts[:, :n_features].sum(axis=1, keepdims=True)
+        self._log_prob = np.log((counts + alpha) / (totals + alpha * n_features)).astype(np.float32)
+        self._log_prob[:, n_features] = 0.0
+        # Score of a token seen in no example, per intent; subtracted so
+        # unknown words do not favour intents with fewer training tokens
+        self._unseen = np.log(alpha / (totals + alpha * n_features)).astype(np.float32)
+    
+    def _bucket(self, feature: str) -> int:
+        index = self._feature_cache.get(feature)
+        if index is None:
+            index = zlib.crc32(feature.encode('utf-8')) % self.n_features
+            if len(self._feature_cache) < self._feature_cache_size:
+                self._feature_cache[feature] = index
+        return index
+    
+    def _features(self, text: str) -> List[int]:
+        tokens = _TOKEN_RE.findall(text)
+        features = [self._bucket(token) for token in tokens]
+        features.extend(self._bucket(f"{a} {b}") for a, b in zip(tokens, tokens[1:]))
+        return features
+    
+    def classify(self, text: str) -> IntentResult:
+        """Classify one message"""
+        return self.classify_batch([text])[0]
+    
+    def classify_batch(self, texts: Iterable[str]) -> List[IntentResult]:
+        """Classify many messages with one vectorized scoring pass"""
+        texts = [(text or '').lower() for text in texts]
+        if not texts:
+            return []
+        
+        indices = []
+        offsets = np.empty(len(texts), dtype=np.intp)
+        lengths = np.empty(len(texts), dtype=np.float32)
+        boosts = np.zeros((len(self.intents), len(texts)), dtype=np.float32)
+        for i, text in enumerate(texts):
+            features = self._features(text) or [self.n_features]
+            offsets[i] = len(indices)
+            lengths[i] = len(features) if features[0] != self.n_features else 0
+            indices.extend(features)
+            for match in self._pattern.finditer(text):
+                boosts[self._intent_index[match.lastgroup], i] += self.PATTERN_WEIGHT
+        
+        scores = np.add.reduceat(self._log_prob[:, indices], offsets, axis=1)
+        scores -= self._unseen * lengths
+        scores += boosts
+        
+        # Softmax over intents
+        scores -= scores.max(axis=0)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=0)
+        
+        best = scores.argmax(axis=0)
+        confidence = scores[best, np.arange(len(texts))]
+        matched = boosts.any(axis=0)
+        return [
+            IntentResult(self.intents[b], round(float(c), 4))
+            if c >= self.min_confidence or m else IntentResult(OTHER, round(float(c), 4))
+            for b, c, m in zip(best, confidence, matched)
+        ]
+    
+    def tag(self, messages: Iterable) -> None:
+        """Record the intent in ``metadata`` of user messages that have none"""
+        pending = [m for m in messages if m.sender_type == 'user' and 'intent' not in (m.metadata or {})]
+        if not pending:
+            return
+        for message, result in zip(pending, self.classify_batch([m.content for m in pending])):
+            message.metadata = dict(message.metadata or {}, intent=result.intent,
+                                    intent_confidence=result.confidence)
+
+
+intent_classifier = IntentClassifier()
@@ -0,0 +1,76 @@
+"""
+Background refresh of the co-purchase neighbor table
+"""
+import os
+import logging
+import threading
+from backend.models.recommendation import CoPurchaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class NeighborRefresher:
+    """Re-ranks neighbors of recently bought products off the request path
+    
+    ``notify`` is called after an order is written and wakes a per-process
+    thread that drains recommendation_dirty in batches; the thread also
+    wakes every ``interval`` seconds to pick up orders written elsewhere.
+    Workers share the queue through SKIP LOCKED, so any number of them can
+    run a refresher.
+    """
+    
+    def __init__(self, model: CoPurchaseModel, interval: float = 30.0, batch_size: int = 500):
+        self.model = model
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def _ensure_thread(self):
+        """Start the refresh thread once per process (threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='recommendation-refresher', daemon=True)
+            self._thread.start()
+    
+    def notify(self):
+        """Ask for a refresh soon without blocking the caller"""
+        self._ensure_thread()
+        self._wake.set()
+    
+    def drain(self) -> int:
+        """Refresh every dirty product now; returns how many were refreshed"""
+        total = 0
+        while True:
+            refreshed = self.model.refresh_dirty(self.batch_size)
+            total += refreshed
+            if refreshed < self.batch_size:
+                return total
+    
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Recommendation refresh failed: {e}")
+
+
+co_purchases = CoPurchaseModel(
+    top_k=int(os.getenv('RECOMMENDATION_TOP_K', '20')),
+    min_co_count=int(os.getenv('RECOMMENDATION_MIN_CO_COUNT', '1'))
+)
+
+neighbor_refresher = NeighborRefresher(
+    co_purchases,
+    interval=float(os.getenv('RECOMMENDATION_REFRESH_INTERVAL', '30')),
+    batch_size=int(os.getenv('RECOMMENDATION_REFRESH_BATCH', '500'))
+)
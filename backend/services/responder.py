@@ -0,0 +1,63 @@
+"""
+Bot reply generation, produced incrementally so it can be streamed
+"""
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List
+
+DEFAULT_SUGGESTIONS = [
+    'Show me laptops',
+    'I need a smartphone',
+    'What\'s on sale?'
+]
+
+
+class StubResponder:
+    """Local stand-in for the language model
+    
+    Yields the canned reply word by word (optionally with a delay per
+    chunk) so streaming clients and tests see the same shape a real model
+    backend would produce.
+    
+    ``version`` is part of every response cache key, so bump it whenever
+    replies change. ``shares_replies`` says whether one user's reply may be
+    served to another; the stub's replies quote the message, so it may not.
+    """
+    
+    version = 'stub-1'
+    shares_replies = False
+    
+    def __init__(self, chunk_delay: float = 0.0):
+        self.chunk_delay = chunk_delay
+    
+    def stream(self, message: str, context: List[Any] = None) -> Iterator[str]:
+        """Yield reply chunks; joined they form the full reply"""
+        reply = f"I received your message: '{message}'. How can I help you find products today?"
+        for chunk in re.findall(r'\S+\s*', reply):
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield chunk
+    
+    def complete(self, message: str, context: List[Any] = None) -> str:
+        """Generate the whole reply at once"""
+        return ''.join(self.stream(message, context))
+    
+    def metadata(self, message: str, reply: str) -> Dict[str, Any]:
+        """Metadata stored with the bot message
+        
+        Set ``personalized`` for replies built from the user's own data so
+        the response cache never shares them.
+        """
+        return {'suggestions': list(DEFAULT_SUGGESTIONS)}
+    
+    def context_key(self, context: List[Any] = None) -> str:
+        """The part of the conversation that changes the reply; cached replies are keyed on it
+        
+        Must not be empty for replies to be cached. The stub ignores
+        context, so every conversation shares one key.
+        """
+        return 'stateless'
+
+
+responder = StubResponder(chunk_delay=float(os.getenv('CHAT_STUB_CHUNK_DELAY', '0')))
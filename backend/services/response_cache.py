@@ -0,0 +1,150 @@
+"""
+Cache of bot replies for repeated chat questions
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional
+from backend.utils.cache import TieredCache, CACHE_MISS
+
+_CONTRACTIONS = [
+    (re.compile(r"\bwhat's\b"), 'what is'), (re.compile(r"\bwhere's\b"), 'where is'),
+    (re.compile(r"\bit's\b"), 'it is'), (re.compile(r"\bwhats\b"), 'what is'),
+    (re.compile(r"n't\b"), ' not'), (re.compile(r"'re\b"), ' are'), (re.compile(r"'m\b"), ' am')
+]
+_NON_WORD = re.compile(r"[^a-z0-9$ ]+")
+_SPACES = re.compile(r"\s+")
+
+# Dropped from near-duplicate signatures; they rarely change the answer
+STOPWORDS = frozenset("""
+a an the is are am be do does can could would will you your i me my we our please pls
+hi hello hey thanks thank there any some of to for on in at it this that what which
+""".split())
+
+
+def normalize(text: str) -> str:
+    """Lowercase, expand common contractions, strip punctuation and extra spaces"""
+    text = (text or '').lower().replace('’', "'")
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return _SPACES.sub(' ', _NON_WORD.sub(' ', text)).strip()
+
+
+def signature(normalized: str) -> FrozenSet[str]:
+    """Content words of a normalized message, for near-duplicate matching"""
+    return frozenset(word for word in normalized.split() if word not in STOPWORDS)
+
+
+class ResponseCache:
+    """Replies keyed on normalized text, intent, responder version and a context key
+    
+    Entries live in a tiered cache (per-process LRU bounded by
+    ``local_maxsize`` in front of Redis with ``ttl``). With ``near_duplicates``
+    enabled (off by default), an exact miss falls back to the most similar
+    recently stored question of the same intent and context whose
+    content-word Jaccard similarity is at least ``similarity``; candidates
+    are kept per process, ``max_candidates`` per intent and context.
+    
+    Nothing is cached without a context key, so callers opt in explicitly.
+    Intents in ``exclude_intents``, replies marked ``personalized`` and
+    replies that quote the question are never cached.
+    """
+    
+    def __init__(self, ttl: int = 3600, local_maxsize: int = 10000, local_ttl: float = 300,
+                 near_duplicates: bool = False, similarity: float = 0.8,
+                 max_candidates: int = 256, exclude_intents=('order_status', 'support')):
+        self.store = TieredCache('chat_response', ttl=ttl, local_maxsize=local_maxsize,
+                                 local_ttl=local_ttl)
+        self.near_duplicates = near_duplicates
+        self.similarity = similarity
+        self.max_candidates = max_candidates
+        self.exclude_intents = frozenset(exclude_intents)
+        self._candidates: Dict[tuple, OrderedDict] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(normalized: str, intent: str, context_key: str, version: str) -> str:
+        return hashlib.sha1(f"{version}|{intent}|{context_key}|{normalized}".encode('utf-8')).hexdigest()
+    
+    def cacheable(self, intent: str, metadata: Dict[str, Any] = None) -> bool:
+        """Whether a reply for this intent and metadata may be shared"""
+        return intent not in self.exclude_intents and not (metadata or {}).get('personalized')
+    
+    def get(self, message: str, intent: str, context_key: str, version: str) -> Optional[Dict[str, Any]]:
+        """Return the cached {'content', 'metadata'} for a question, or None"""
+        if not context_key or intent in self.exclude_intents:
+            return None
+        normalized = normalize(message)
+        if not normalized:
+            return None
+        
+        entry = self.store.get(self._key(normalized, intent, context_key, version))
+        if entry is not CACHE_MISS and entry is not None:
+            return entry
+        if not self.near_duplicates:
+            return None
+        
+        key = self._nearest(signature(normalized), intent, f"{version}|{context_key}")
+        if key is None:
+            return None
+        entry = self.store.get(key)
+        return entry if entry is not CACHE_MISS else None
+    
+    def _nearest(self, words: FrozenSet[str], intent: str, context_key: str) -> Optional[str]:
+        if not words:
+            return None
+        with self._lock:
+            candidates = self._candidates.get((intent, context_key))
+            if not candidates:
+                return None
+            best_words, best_score = None, self.similarity
+            for other in candidates:
+                score = len(words & other) / len(words | other)
+                if score >= best_score:
+                    best_words, best_score = other, score
+            if best_words is None:
+                return None
+            candidates.move_to_end(best_words)
+            return candidates[best_words]
+    
+    def put(self, message: str, intent: str, content: str, metadata: Dict[str, Any],
+            context_key: str, version: str) -> bool:
+        """Store a reply; returns False if it must not be cached"""
+        if not context_key or not self.cacheable(intent, metadata):
+            return False
+        normalized = normalize(message)
+        if not normalized:
+            return False
+        if f" {normalized} " in f" {normalize(content)} ":
+            # A reply quoting the question would show one user's words to another
+            return False
+        
+        key = self._key(normalized, intent, context_key, version)
+        self.store.set(key, {'content': content, 'metadata': metadata or {}})
+        
+        if self.near_duplicates:
+            words = signature(normalized)
+            if words:
+                with self._lock:
+                    candidates = self._candidates.setdefault((intent, f"{version}|{context_key}"), OrderedDict())
+                    candidates[words] = key
+                    candidates.move_to_end(words)
+                    while len(candidates) > self.max_candidates:
+                        candidates.popitem(last=False)
+        return True
+
+
+def _exclude_intents():
+    value = os.getenv('RESPONSE_CACHE_EXCLUDE_INTENTS', 'order_status,support')
+    return tuple(intent.strip() for intent in value.split(',') if intent.strip())
+
+
+response_cache = ResponseCache(
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+    local_maxsize=int(os.getenv('RESPONSE_CACHE_LOCAL_SIZE', '10000')),
+    near_duplicates=os.getenv('RESPONSE_CACHE_NEAR_DUPLICATES', 'false').lower() == 'true',
+    similarity=float(os.getenv('RESPONSE_CACHE_SIMILARITY', '0.8')),
+    exclude_intents=_exclude_intents()
+)
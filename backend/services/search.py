@@ -0,0 +1,340 @@
+"""
+Elasticsearch-backed product search with Postgres fallback support
+"""
+import os
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, List
+from psycopg2.extras import execute_values
+from backend.utils.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_INDEX_SETTINGS = {
+    'analysis': {
+        'analyzer': {
+            'product_text': {
+                'type': 'custom',
+                'tokenizer': 'standard',
+                'filter': ['lowercase', 'asciifolding', 'porter_stem']
+            }
+        }
+    }
+}
+
+PRODUCT_INDEX_MAPPINGS = {
+    'dynamic': False,
+    'properties': {
+        'product_id': {'type': 'keyword'},
+        'name': {
+            'type': 'text',
+            'analyzer': 'product_text',
+            'fields': {'raw': {'type': 'keyword'}}
+        },
+        'description': {'type': 'text', 'analyzer': 'product_text'},
+        'price': {'type': 'scaled_float', 'scaling_factor': 100},
+        'category': {'type': 'keyword'},
+        'brand': {'type': 'keyword'},
+        'sku': {'type': 'keyword'},
+        'stock_quantity': {'type': 'integer'},
+        'is_active': {'type': 'boolean'},
+        'created_at': {'type': 'date'},
+        'updated_at': {'type': 'date'}
+    }
+}
+
+PRICE_FACET_RANGES = [
+    {'key': 'under_50', 'to': 50},
+    {'key': '50_200', 'from': 50, 'to': 200},
+    {'key': '200_1000', 'from': 200, 'to': 1000},
+    {'key': '1000_plus', 'from': 1000}
+]
+
+
+class ProductSearchEngine:
+    """Index products into Elasticsearch and serve ranked, faceted searches
+    
+    Every method fails soft: errors are logged, the engine is marked
+    unavailable for ``retry_interval`` seconds and callers get None/False,
+    so they can fall back to Postgres without paying a connection timeout
+    on every request while Elasticsearch is down. Writes that could not
+    reach the index are queued in search_index_dirty and replayed by a
+    background thread once Elasticsearch is back.
+    """
+    
+    def __init__(self, index: str = None, retry_interval: float = 30, retry_batch_size: int = 500):
+        self.index = index or os.getenv('PRODUCT_SEARCH_INDEX', 'products')
+        self.retry_interval = retry_interval
+        self.retry_batch_size = retry_batch_size
+        self._down_until = 0.0
+        self._index_ready = False
+        self._lock = threading.Lock()
+        self._retry_pid = None
+    
+    def available(self) -> bool:
+        """Whether Elasticsearch should be tried for this request"""
+        return time.monotonic() >= self._down_until
+    
+    def _mark_down(self, action: str, error: Exception):
+        logger.warning(f"Product search {action} failed, using fallback for {self.retry_interval}s: {error}")
+        self._down_until = time.monotonic() + self.retry_interval
+    
+    def ensure_index(self) -> bool:
+        """Create the product index with its mappings if it does not exist"""
+        if self._index_ready:
+            return True
+        with self._lock:
+            if self._index_ready:
+                return True
+            es = db_manager.get_es_client()
+            if not es.indices.exists(index=self.index):
+                es.indices.create(index=self.index, settings=PRODUCT_INDEX_SETTINGS,
+                                  mappings=PRODUCT_INDEX_MAPPINGS)
+                logger.info(f"Created Elasticsearch index {self.index}")
+            self._index_ready = True
+            return True
+    
+    def index_products(self, products: List[Any], refresh: bool = False) -> bool:
+        """Index or re-index products with one bulk request"""
+        if not products or not self.available():
+            return False
+        try:
+            from elasticsearch import helpers
+            
+            self.ensure_index()
+            actions = (
+                {
+                    '_op_type': 'index',
+                    '_index': self.index,
+                    '_id': str(product.product_id),
+                    '_source': product.to_dict()
+                }
+                for product in products
+            )
+            indexed, errors = helpers.bulk(db_manager.get_es_client(), actions,
+                                           raise_on_error=False, refresh=refresh)
+            if errors:
+                logger.warning(f"Failed to index {len(errors)} products: {errors[:3]}")
+            return not errors
+        except Exception as e:
+            self._mark_down('indexing', e)
+            return False
+    
+    def sync_products(self, products: List[Any]) -> bool:
+        """Index saved products, queueing them for retry if the index can't be updated"""
+        if not products:
+            return True
+        if self.index_products(products):
+            return True
+        self.mark_dirty([product.product_id for product in products])
+        return False
+    
+    def mark_dirty(self, product_ids: List[str]):
+        """Queue products for the retry thread to re-index from Postgres
+        
+        Used for failed index updates and for cheap, frequent changes such
+        as stock moves that are not worth a bulk request each.
+        """
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO search_index_dirty (product_id) VALUES %s
+                    ON CONFLICT (product_id) DO NOTHING
+                """, [(str(pid),) for pid in dict.fromkeys(product_ids)])
+        except Exception as e:
+            logger.error(f"Failed to queue {len(product_ids)} products for re-indexing: {e}")
+        self._ensure_retry_thread()
+    
+    def reindex_dirty(self, batch_size: int = None) -> int:
+        """Re-index up to ``batch_size`` queued products; returns how many
+        
+        Products that no longer exist are removed from the index. If
+        Elasticsearch fails again the batch is queued again.
+        """
+        if not self.available():
+            return 0
+        batch_size = batch_size or self.retry_batch_size
+        from backend.models.product import Product
+        
+        try:
+            with db_manager.get_pg_cursor() as cursor:
+                cursor.execute("""
+                    DELETE FROM search_index_dirty
+                    WHERE product_id IN (
+                        SELECT product_id FROM search_index_dirty
+                        ORDER BY marked_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING product_id
+                """, (batch_size,))
+                product_ids = [str(row['product_id']) for row in cursor.fetchall()]
+                if not product_ids:
+                    return 0
+                
+                cursor.execute("SELECT * FROM products WHERE product_id = ANY(%s::uuid[])", (product_ids,))
+                products = [Product.from_row(row) for row in cursor.fetchall()]
+                found = {str(product.product_id) for product in products}
+                missing = [pid for pid in product_ids if pid not in found]
+                
+                if ((products and not self.index_products(products))
+                        or (missing and not self.delete_products(missing))):
+                    # Still failing: put the batch back
+                    cursor.execute("""
+                        INSERT INTO search_index_dirty (product_id)
+                        SELECT unnest(%s::uuid[])
+                        ON CONFLICT (product_id) DO NOTHING
+                    """, (product_ids,))
+                    return 0
+                
+                logger.info(f"Re-indexed {len(product_ids)} queued products")
+                return len(product_ids)
+        
+        except Exception as e:
+            logger.error(f"Failed to re-index queued products: {e}")
+            return 0
+    
+    def _ensure_retry_thread(self):
+        """Start the retry thread once per process (threads do not survive fork)"""
+        if self._retry_pid == os.getpid():
+            return
+        with self._lock:
+            if self._retry_pid == os.getpid():
+                return
+            self._retry_pid = os.getpid()
+            threading.Thread(target=self._retry_loop, name='search-reindex', daemon=True).start()
+    
+    def _retry_loop(self):
+        while True:
+            time.sleep(self.retry_interval)
+            while self.reindex_dirty() == self.retry_batch_size:
+                pass
+    
+    def delete_products(self, product_ids: List[str]) -> bool:
+        """Remove products from the index"""
+        if not product_ids or not self.available():
+            return False
+        try:
+            from elasticsearch import helpers
+            
+            actions = (
+                {'_op_type': 'delete', '_index': self.index, '_id': str(pid)}
+                for pid in product_ids
+            )
+            helpers.bulk(db_manager.get_es_client(), actions, raise_on_error=False)
+            return True
+        except Exception as e:
+            self._mark_down('delete', e)
+            return False
+    
+    def build_query(self, query: str = None, category: str = None, brand: str = None,
+                    min_price: float = None, max_price: float = None) -> Dict[str, Any]:
+        """Build the bool query: relevance on text, exact filters in filter context"""
+        filters = [{'term': {'is_active': True}}]
+        if category:
+            filters.append({'term': {'category': category}})
+        if brand:
+            filters.append({'term': {'brand': brand}})
+        if min_price is not None or max_price is not None:
+            price_range = {}
+            if min_price is not None:
+                price_range['gte'] = min_price
+            if max_price is not None:
+                price_range['lte'] = max_price
+            filters.append({'range': {'price': price_range}})
+        
+        must = []
+        if query:
+            must.append({
+                'multi_match': {
+                    'query': query,
+                    'fields': ['name^3', 'brand^2', 'category', 'description'],
+                    'type': 'best_fields',
+                    'fuzziness': 'AUTO',
+                    'prefix_length': 1
+                }
+            })
+        
+        return {'bool': {'must': must or [{'match_all': {}}], 'filter': filters}}
+    
+    def search(self, query: str = None, category: str = None, brand: str = None,
+               min_price: float = None, max_price: float = None,
+               limit: int = 20, search_after: List[Any] = None) -> Optional[Dict[str, Any]]:
+        """Ranked search with category, brand and price facets
+        
+        Pages with ``search_after`` (the sort values of the previous page's
+        last hit) so deep pages cost the same as the first. Returns
+        {'hits': [product dicts], 'total': int, 'facets': {...},
+        'search_after': sort values for the next page or None} or None if
+        Elasticsearch is unavailable.
+        """
+        if not self.available():
+            return None
+        
+        params = {}
+        if search_after:
+            params['search_after'] = search_after
+        else:
+            # Facets describe the whole result set; only the first page needs them
+            params['aggs'] = {
+                'category': {'terms': {'field': 'category', 'size': 20}},
+                'brand': {'terms': {'field': 'brand', 'size': 20}},
+                'price': {'range': {'field': 'price', 'ranges': PRICE_FACET_RANGES}}
+            }
+        try:
+            response = db_manager.get_es_client().search(
+                index=self.index,
+                query=self.build_query(query, category, brand, min_price, max_price),
+                sort=['_score', {'updated_at': 'desc'}, {'product_id': 'asc'}],
+                size=limit + 1,
+                track_total_hits=True,
+                **params
+            )
+        except Exception as e:
+            self._mark_down('query', e)
+            return None
+        
+        hits = response['hits']['hits']
+        aggregations = response.get('aggregations', {})
+        return {
+            'hits': [hit['_source'] for hit in hits[:limit]],
+            'search_after': hits[limit - 1]['sort'] if len(hits) > limit else None,
+            'total': response['hits']['total']['value'],
+            'facets': {
+                name: [
+                    {'value': bucket['key'], 'count': bucket['doc_count']}
+                    for bucket in aggregations.get(name, {}).get('buckets', [])
+                ]
+                for name in ('category', 'brand', 'price')
+            }
+        }
+    
+    def reindex_all(self, batch_size: int = 500) -> int:
+        """Rebuild the index from Postgres; returns the number of products indexed"""
+        from backend.models.product import Product
+        
+        indexed = 0
+        with db_manager.get_pg_connection() as conn:
+            # Named (server-side) cursor streams the table in batches
+            with conn.cursor(name='product_reindex') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(f"SELECT {', '.join(Product.COLUMNS)} FROM products")
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    products = [Product(**dict(zip(Product.COLUMNS, row))) for row in rows]
+                    if not self.index_products(products):
+                        raise RuntimeError("Bulk indexing failed during reindex")
+                    indexed += len(products)
+            conn.rollback()
+        
+        logger.info(f"Reindexed {indexed} products into {self.index}")
+        return indexed
+
+
+product_search = ProductSearchEngine(
+    retry_interval=float(os.getenv('PRODUCT_SEARCH_RETRY_INTERVAL', '30')),
+    retry_batch_size=int(os.getenv('PRODUCT_SEARCH_RETRY_BATCH', '500'))
+)
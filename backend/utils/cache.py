@@ -0,0 +1,659 @@
+"""
+Redis-backed caching utilities
+"""
+import json
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable
+from backend.utils.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+# Returned by RedisCache.get when the key is not cached at all
+CACHE_MISS = object()
+
+_NEGATIVE_MARKER = '__missing__'
+
+# All caches created in this process, by namespace
+CACHES: Dict[str, 'RedisCache'] = {}
+
+
+class RedisCache:
+    """Read-through JSON cache in Redis with negative caching and hit/miss stats
+    
+    Values must be JSON serializable. Unknown keys can be cached as
+    "missing" for ``negative_ttl`` seconds so repeated lookups of bogus IDs
+    never reach the database. Redis errors are logged and treated as
+    misses, so the cache degrades to the underlying store.
+    """
+    
+    STATS_FLUSH_EVERY = 100
+    
+    def __init__(self, namespace: str, ttl: int = 300, negative_ttl: int = 30):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'errors': 0}
+        self._unflushed = {}
+        self._unflushed_count = 0
+        CACHES[namespace] = self
+    
+    def key(self, key: str) -> str:
+        """Build the Redis key for an entry"""
+        return f"cache:{self.namespace}:{key}"
+    
+    @property
+    def stats_key(self) -> str:
+        return f"cache:stats:{self.namespace}"
+    
+    def _record(self, counter: str):
+        """Count a lookup outcome; batches cluster-wide counters into Redis"""
+        with self._lock:
+            self._stats[counter] += 1
+            self._unflushed[counter] = self._unflushed.get(counter, 0) + 1
+            self._unflushed_count += 1
+            if self._unflushed_count < self.STATS_FLUSH_EVERY:
+                return
+            pending, self._unflushed, self._unflushed_count = self._unflushed, {}, 0
+        
+        try:
+            pipe = db_manager.redis_client.pipeline(transaction=False)
+            for name, count in pending.items():
+                pipe.hincrby(self.stats_key, name, count)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to flush cache stats for {self.namespace}: {e}")
+    
+    def get(self, key: str) -> Any:
+        """Return the cached value, None if cached as missing, or CACHE_MISS"""
+        try:
+            raw = db_manager.redis_client.get(self.key(key))
+        except Exception as e:
+            logger.warning(f"Cache read failed for {self.key(key)}: {e}")
+            self._record('errors')
+            return CACHE_MISS
+        
+        if raw is None:
+            self._record('misses')
+            return CACHE_MISS
+        if raw == _NEGATIVE_MARKER:
+            self._record('negative_hits')
+            return None
+        self._record('hits')
+        return json.loads(raw)
+    
+    def set(self, key: str, value: Any, ttl: int = None):
+        """Cache a value"""
+        try:
+            db_manager.redis_client.set(self.key(key), json.dumps(value), ex=ttl or self.ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {self.key(key)}: {e}")
+    
+    def set_missing(self, key: str):
+        """Remember that a key does not exist in the underlying store"""
+        if not self.negative_ttl:
+            return
+        try:
+            db_manager.redis_client.set(self.key(key), _NEGATIVE_MARKER, ex=self.negative_ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {self.key(key)}: {e}")
+    
+    def delete(self, *keys: str):
+        """Invalidate entries"""
+        if not keys:
+            return
+        try:
+            db_manager.redis_client.delete(*(self.key(k) for k in keys))
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {self.namespace}: {e}")
+    
+    def get_or_load(self, key: str, loader: Callable[[str], Any]) -> Any:
+        """Read-through lookup; ``loader`` returns the value or None if unknown"""
+        value = self.get(key)
+        if value is not CACHE_MISS:
+            return value
+        
+        value = loader(key)
+        if value is None:
+            self.set_missing(key)
+        else:
+            self.set(key, value)
+        return value
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and, if available, all processes"""
+        with self._lock:
+            local = dict(self._stats)
+        lookups = local['hits'] + local['negative_hits'] + local['misses']
+        local['hit_ratio'] = round((local['hits'] + local['negative_hits']) / lookups, 4) if lookups else None
+        
+        result = {'ttl': self.ttl, 'negative_ttl': self.negative_ttl, 'process': local}
+        try:
+            shared = {k: int(v) for k, v in db_manager.redis_client.hgetall(self.stats_key).items()}
+            shared_lookups = sum(shared.get(k, 0) for k in ('hits', 'negative_hits', 'misses'))
+            shared['hit_ratio'] = round(
+                (shared.get('hits', 0) + shared.get('negative_hits', 0)) / shared_lookups, 4
+            ) if shared_lookups else None
+            result['cluster'] = shared
+        except Exception as e:
+            logger.warning(f"Failed to read shared cache stats for {self.namespace}: {e}")
+        return result
+
+
+class LocalLRUCache:
+    """Thread-safe in-process LRU cache bounded by entry count and TTL"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def get(self, key: str) -> Any:
+        """Return the cached value or CACHE_MISS"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return CACHE_MISS
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                self._stats['misses'] += 1
+                return CACHE_MISS
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+    
+    def set(self, key: str, value: Any):
+        """Cache a value, evicting the least recently used entries if full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def delete(self, *keys: str):
+        """Drop entries"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current size"""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._data), maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+class TieredCache(RedisCache):
+    """In-process LRU in front of Redis with cross-worker invalidation
+    
+    Invalidations delete the Redis entry and are broadcast over Redis
+    pub/sub so every worker evicts its local copy. If the broadcast is
+    missed (e.g. Redis is briefly unavailable) the local TTL bounds how
+    long a stale entry can be served.
+    """
+    
+    def __init__(self, namespace: str, ttl: int = 300, local_maxsize: int = 4096,
+                 local_ttl: float = 30):
+        super().__init__(namespace, ttl=ttl, negative_ttl=0)
+        self.local = LocalLRUCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+    
+    @property
+    def channel(self) -> str:
+        return f"cache:invalidate:{self.namespace}"
+    
+    def _ensure_listener(self):
+        """Start the invalidation subscriber once per process"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # Entries inherited across a fork may have missed invalidations
+            self.local.clear()
+            self._listener_pid = os.getpid()
+            thread = threading.Thread(
+                target=self._listen, name=f"cache-invalidate-{self.namespace}", daemon=True
+            )
+            thread.start()
+    
+    def _listen(self):
+        """Evict local entries named in invalidation messages"""
+        while True:
+            try:
+                pubsub = db_manager.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything cached before the subscription may be stale
+                self.local.clear()
+                for message in pubsub.listen():
+                    keys = json.loads(message['data'])
+                    self.local.delete(*keys)
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener for {self.namespace} failed: {e}")
+                time.sleep(1)
+    
+    def get(self, key: str) -> Any:
+        """Return the cached value or CACHE_MISS, checking the local tier first"""
+        self._ensure_listener()
+        value = self.local.get(key)
+        if value is not CACHE_MISS:
+            return value
+        
+        value = super().get(key)
+        if value is not CACHE_MISS and value is not None:
+            self.local.set(key, value)
+        return value
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Fetch many entries: local tier, then one Redis MGET; returns hits only"""
+        self._ensure_listener()
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is CACHE_MISS:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+        
+        if remote_keys:
+            try:
+                raws = db_manager.redis_client.mget([self.key(k) for k in remote_keys])
+            except Exception as e:
+                logger.warning(f"Cache read failed for {self.namespace}: {e}")
+                for _ in remote_keys:
+                    self._record('errors')
+                return found
+            
+            for key, raw in zip(remote_keys, raws):
+                if raw is None:
+                    self._record('misses')
+                    continue
+                self._record('hits')
+                value = json.loads(raw)
+                self.local.set(key, value)
+                found[key] = value
+        return found
+    
+    def set(self, key: str, value: Any, ttl: int = None):
+        """Cache a value in both tiers"""
+        self.local.set(key, value)
+        super().set(key, value, ttl)
+    
+    def set_many(self, values: Dict[str, Any]):
+        """Cache many values in both tiers with one Redis round trip"""
+        if not values:
+            return
+        for key, value in values.items():
+            self.local.set(key, value)
+        try:
+            pipe = db_manager.redis_client.pipeline(transaction=False)
+            for key, value in values.items():
+                pipe.set(self.key(key), json.dumps(value), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Cache write failed for {self.namespace}: {e}")
+    
+    def delete(self, *keys: str):
+        """Invalidate entries in Redis and in every worker's local tier"""
+        if not keys:
+            return
+        self.local.delete(*keys)
+        super().delete(*keys)
+        try:
+            db_manager.redis_client.publish(self.channel, json.dumps(list(keys)))
+        except Exception as e:
+            logger.warning(f"Cache invalidation broadcast failed for {self.namespace}: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Redis tier stats plus local tier stats"""
+        stats = super().stats()
+        stats['local'] = self.local.stats()
+        return stats
+
+
+# Delete a lock only if it still holds our token, so a worker whose
+# refresh outlived the lock timeout cannot release another worker's lock
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class StaleWhileRevalidateCache:
+    """Redis-backed cache of computed sections that serves stale data while refreshing
+    
+    Each section has its own loader and TTL. Reads never wait for a
+    recomputation if any previous value exists: a stale value is returned
+    and one worker, elected with a Redis lock, refreshes it in the
+    background. ``start_scheduler`` keeps sections warm so readers rarely
+    see stale data at all.
+    
+    A reader with nothing to serve only waits while another worker holds
+    the lock. If Redis is unreachable it loads the section itself, and if
+    the loader fails it returns at once rather than polling.
+    """
+    
+    def __init__(self, namespace: str, sections: Dict[str, tuple], max_stale: int = 3600,
+                 lock_timeout: int = 120, wait_timeout: float = 5.0):
+        self.namespace = namespace
+        self.sections = sections  # name -> (loader, ttl seconds)
+        self.max_stale = max_stale
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self._scheduler_pid = None
+        self._scheduler_lock = threading.Lock()
+        self._inflight = set()
+        self._release_script = None
+    
+    def _key(self, name: str) -> str:
+        return f"swr:{self.namespace}:{name}"
+    
+    def _read(self, name: str):
+        try:
+            raw = db_manager.redis_client.get(self._key(name))
+        except Exception as e:
+            logger.warning(f"Failed to read {self._key(name)}: {e}")
+            return None
+        return json.loads(raw) if raw else None
+    
+    def _compute(self, name: str):
+        """Run a section's loader; returns the entry or None if it failed"""
+        loader, _ = self.sections[name]
+        try:
+            started = time.perf_counter()
+            entry = {'value': loader(), 'computed_at': time.time()}
+            logger.info("Refreshed %s.%s in %.1f ms", self.namespace, name, (time.perf_counter() - started) * 1000)
+            return entry
+        except Exception as e:
+            logger.error(f"Failed to refresh {self.namespace}.{name}: {e}")
+            return None
+    
+    def _release(self, lock_key: str, token: str):
+        try:
+            if self._release_script is None:
+                self._release_script = db_manager.redis_client.register_script(_RELEASE_LOCK_SCRIPT)
+            self._release_script(keys=[lock_key], args=[token])
+        except Exception as e:
+            # The lock expires on its own after lock_timeout
+            logger.warning(f"Failed to release {lock_key}: {e}")
+    
+    def _load(self, name: str):
+        """Recompute a section under the refresh lock
+        
+        Returns (entry, busy): the new entry or None, and whether another
+        worker holds the lock. Without Redis the section is computed
+        directly and not shared.
+        """
+        _, ttl = self.sections[name]
+        lock_key = f"{self._key(name)}:lock"
+        token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        try:
+            redis_client = db_manager.redis_client
+            if not redis_client.set(lock_key, token, nx=True, ex=self.lock_timeout):
+                return None, True
+        except Exception as e:
+            logger.warning(f"Failed to lock {lock_key}, loading {self.namespace}.{name} directly: {e}")
+            return self._compute(name), False
+        
+        try:
+            entry = self._compute(name)
+            if entry is not None:
+                try:
+                    redis_client.set(self._key(name), json.dumps(entry), ex=ttl + self.max_stale)
+                except Exception as e:
+                    logger.warning(f"Failed to store {self._key(name)}: {e}")
+            return entry, False
+        finally:
+            self._release(lock_key, token)
+    
+    def refresh(self, name: str) -> bool:
+        """Recompute a section if no other worker is already doing it"""
+        entry, _ = self._load(name)
+        return entry is not None
+    
+    def _refresh_async(self, name: str):
+        """Refresh in a background thread, at most one per section per process"""
+        with self._scheduler_lock:
+            if name in self._inflight:
+                return
+            self._inflight.add(name)
+        
+        def run():
+            try:
+                self.refresh(name)
+            finally:
+                with self._scheduler_lock:
+                    self._inflight.discard(name)
+        
+        threading.Thread(target=run, daemon=True, name=f"swr-{self.namespace}-{name}").start()
+    
+    def _wait_for(self, name: str, newer_than: float):
+        """Poll for a value computed by the worker holding the lock
+        
+        Gives up as soon as the lock is released without a newer value (the
+        holder failed) or Redis stops answering.
+        """
+        lock_key = f"{self._key(name)}:lock"
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                raw = db_manager.redis_client.get(self._key(name))
+                entry = json.loads(raw) if raw else None
+                if entry and entry['computed_at'] > newer_than:
+                    return entry
+                if not db_manager.redis_client.exists(lock_key):
+                    return None
+            except Exception as e:
+                logger.warning(f"Stopped waiting for {self._key(name)}: {e}")
+                return None
+        return None
+    
+    def get(self, name: str, force: bool = False) -> Dict[str, Any]:
+        """Return {'value', 'computed_at', 'stale'} for a section (value None if unavailable)"""
+        _, ttl = self.sections[name]
+        entry = self._read(name)
+        now = time.time()
+        
+        if force or entry is None:
+            requested_at = now if force else 0
+            loaded, busy = self._load(name)
+            if loaded is not None:
+                entry = loaded
+            elif busy:
+                # Another worker is computing it; wait for its result
+                entry = self._wait_for(name, requested_at) or entry
+        elif now - entry['computed_at'] > ttl:
+            self._refresh_async(name)
+        
+        if entry is None:
+            return {'value': None, 'computed_at': None, 'stale': True}
+        return {
+            'value': entry['value'],
+            'computed_at': entry['computed_at'],
+            'stale': time.time() - entry['computed_at'] > ttl
+        }
+    
+    def get_all(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Every section, keyed by name"""
+        self.start_scheduler()
+        return {name: self.get(name, force=force) for name in self.sections}
+    
+    def start_scheduler(self, interval: float = None):
+        """Refresh sections in a background thread before they go stale (once per process)"""
+        if self._scheduler_pid == os.getpid():
+            return
+        with self._scheduler_lock:
+            if self._scheduler_pid == os.getpid():
+                return
+            self._scheduler_pid = os.getpid()
+            interval = interval or max(1, min(ttl for _, ttl in self.sections.values()) // 2)
+            threading.Thread(target=self._schedule, args=(interval,), daemon=True,
+                             name=f"swr-{self.namespace}-scheduler").start()
+    
+    def _schedule(self, interval: float):
+        while True:
+            for name, (_, ttl) in self.sections.items():
+                entry = self._read(name)
+                # Refresh a little early so readers keep seeing fresh data
+                if entry is None or time.time() - entry['computed_at'] > ttl * 0.8:
+                    self.refresh(name)
+            time.sleep(interval)
+
+
+# Replace the buffer only if no append happened since the caller read the
+# generation, so a rebuild from a stale read cannot drop newer entries
+_RING_REBUILD_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 4))
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisRingBuffer:
+    """Bounded list of the newest JSON entries per key, kept in Redis
+    
+    Appends only extend a buffer that already exists (RPUSHX), so a
+    partially populated buffer is never mistaken for the full history; a
+    miss is rebuilt from the source of truth with ``rebuild``. A marker
+    entry at the head distinguishes "known empty" from "not cached" and
+    falls off once the buffer is full. Each write refreshes the TTL, so
+    buffers of idle keys expire. Redis errors are logged and reads report
+    a miss.
+    """
+    
+    _HEAD = '__head__'
+    
+    def __init__(self, namespace: str, size: int = 20, ttl: int = 86400):
+        self.namespace = namespace
+        self.size = size
+        self.ttl = ttl
+        self._rebuild_script = None
+    
+    def key(self, key: str) -> str:
+        return f"ring:{self.namespace}:{key}"
+    
+    def _generation_key(self, key: str) -> str:
+        return f"ring:{self.namespace}:{key}:gen"
+    
+    def read(self, key: str) -> Any:
+        """Return the buffered entries oldest first, or None on a miss"""
+        try:
+            raw = db_manager.redis_client.lrange(self.key(key), 0, -1)
+        except Exception as e:
+            logger.warning(f"Ring buffer read failed for {self.key(key)}: {e}")
+            return None
+        if not raw:
+            return None
+        if isinstance(raw[0], bytes):
+            raw = [item.decode('utf-8') for item in raw]
+        return [json.loads(item) for item in raw if item != self._HEAD]
+    
+    def generation(self, key: str) -> str:
+        """Token to pass to ``rebuild``; read it before loading the source rows"""
+        try:
+            value = db_manager.redis_client.get(self._generation_key(key))
+        except Exception as e:
+            logger.warning(f"Ring buffer read failed for {self._generation_key(key)}: {e}")
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value or ''
+    
+    def append(self, key: str, *values: Any):
+        """Add entries to an existing buffer, dropping the oldest beyond ``size``"""
+        if not values:
+            return
+        try:
+            pipe = db_manager.redis_client.pipeline(transaction=True)
+            pipe.incr(self._generation_key(key))
+            pipe.expire(self._generation_key(key), self.ttl)
+            pipe.rpushx(self.key(key), *(json.dumps(v) for v in values))
+            pipe.ltrim(self.key(key), -self.size, -1)
+            pipe.expire(self.key(key), self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Ring buffer append failed for {self.key(key)}: {e}")
+            self.delete(key)
+    
+    def rebuild(self, key: str, values: Iterable[Any], generation: str) -> bool:
+        """Replace the buffer with ``values`` (oldest first) unless appended to meanwhile"""
+        if generation is None:
+            return False
+        try:
+            if self._rebuild_script is None:
+                self._rebuild_script = db_manager.redis_client.register_script(_RING_REBUILD_SCRIPT)
+            entries = [self._HEAD] + [json.dumps(v) for v in values][-self.size:]
+            return bool(self._rebuild_script(
+                keys=[self.key(key), self._generation_key(key)],
+                args=[generation, self.size + 1, self.ttl, *entries]
+            ))
+        except Exception as e:
+            logger.warning(f"Ring buffer rebuild failed for {self.key(key)}: {e}")
+            return False
+    
+    def delete(self, *keys: str):
+        """Drop buffers"""
+        if not keys:
+            return
+        try:
+            db_manager.redis_client.delete(*(self.key(k) for k in keys))
+        except Exception as e:
+            logger.warning(f"Ring buffer delete failed for {self.namespace}: {e}")
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Stats for every cache registered in this process"""
+    return {namespace: cache.stats() for namespace, cache in CACHES.items()}
+
+
+session_cache = RedisCache(
+    'chat_session',
+    ttl=int(os.getenv('SESSION_CACHE_TTL', '300')),
+    negative_ttl=int(os.getenv('SESSION_CACHE_NEGATIVE_TTL', '30'))
+)
+
+user_cache = RedisCache(
+    'user',
+    ttl=int(os.getenv('USER_CACHE_TTL', '60')),
+    negative_ttl=int(os.getenv('USER_CACHE_NEGATIVE_TTL', '10'))
+)
+
+product_cache = TieredCache(
+    'product',
+    ttl=int(os.getenv('PRODUCT_CACHE_TTL', '600')),
+    local_maxsize=int(os.getenv('PRODUCT_CACHE_LOCAL_SIZE', '4096')),
+    local_ttl=float(os.getenv('PRODUCT_CACHE_LOCAL_TTL', '30'))
+)
+
+recent_messages = RedisRingBuffer(
+    'chat_recent',
+    size=int(os.getenv('CHAT_CONTEXT_SIZE', '20')),
+    ttl=int(os.getenv('CHAT_CONTEXT_TTL', '86400'))
+)
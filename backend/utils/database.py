@@ -1,86 +1,442 @@
 """
 Database connection utilities for PostgreSQL and MongoDB
 """
+import io
 import os
+import json
+import time
 import logging
+import threading
+from collections import deque
 from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from pymongo import MongoClient
-import redis
-from elasticsearch import Elasticsearch
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, Json, execute_values
 
 logger = logging.getLogger(__name__)
 
-class DatabaseManager:
-    """Centralized database connection manager"""
+# Store dict values (metadata, preferences, addresses, ...) as JSONB
+extensions.register_adapter(dict, Json)
+
+def bulk_upsert(cursor, table, columns, rows, conflict_columns,
+                update_columns=None, page_size=1000):
+    """Write many rows with one multi-row INSERT ... ON CONFLICT per page
     
-    def __init__(self):
-        self.pg_pool = None
-        self.mongo_client = None
-        self.redis_client = None
-        self.es_client = None
-        self._initialize_connections()
-    
-    def _initialize_connections(self):
-        """Initialize all database connections"""
+    ``update_columns`` defaults to every non-conflict column; pass an empty
+    list to ignore conflicting rows instead of updating them. Rows sharing
+    a conflict key are collapsed to the last one first, since one statement
+    cannot update the same row twice. Returns the number of rows inserted
+    or updated.
+    """
+    if not rows:
+        return 0
+    
+    key_indexes = [list(columns).index(c) for c in conflict_columns]
+    unique = {}
+    for row in rows:
+        unique[tuple(row[i] for i in key_indexes)] = row
+    if len(unique) < len(rows):
+        rows = list(unique.values())
+    
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in conflict_columns]
+    
+    if update_columns:
+        assignments = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+        conflict_action = f"DO UPDATE SET {assignments}"
+    else:
+        conflict_action = "DO NOTHING"
+    
+    query = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+        f"ON CONFLICT ({', '.join(conflict_columns)}) {conflict_action}"
+    )
+    
+    written = 0
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        execute_values(cursor, query, page, page_size=len(page))
+        written += cursor.rowcount
+    return written
+
+def _copy_text_value(value):
+    """Render one value in PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        text = 't' if value else 'f'
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value, default=str)
+    elif hasattr(value, 'isoformat'):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into a table with COPY FROM STDIN
+    
+    Much cheaper than INSERT for large append-only batches, but has no
+    conflict handling: one bad row fails the whole COPY. dict and list
+    values are written as JSON. Returns the number of rows copied.
+    """
+    if not rows:
+        return 0
+    
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_text_value(v) for v in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return len(rows)
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class PostgresConnectionPool:
+    """Thread-safe PostgreSQL connection pool with bounded size and health checks"""
+    
+    def __init__(self, pg_config, min_size=1, max_size=10, acquire_timeout=5.0,
+                 validate_after=30.0, max_lifetime=3600.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        
+        self.pg_config = pg_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.validate_after = validate_after
+        self.max_lifetime = max_lifetime
+        
+        self._idle = deque()  # (conn, created_at, last_used_at)
+        self._in_use = {}  # id(conn) -> created_at
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0
+        }
+        
+        for _ in range(min_size):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+            self._size += 1
+            self._stats['created'] += 1
+    
+    def _connect(self):
+        """Open a new physical connection"""
+        return psycopg2.connect(**self.pg_config)
+    
+    def _is_healthy(self, conn, created_at, last_used_at):
+        """Validate an idle connection before handing it out"""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - last_used_at < self.validate_after:
+            return True
         try:
-            # PostgreSQL connection
-            self.pg_config = {
-                'host': os.getenv('POSTGRES_HOST', 'localhost'),
-                'port': os.getenv('POSTGRES_PORT', '5432'),
-                'database': os.getenv('POSTGRES_DB', 'ecom_chatbot'),
-                'user': os.getenv('POSTGRES_USER', 'postgres'),
-                'password': os.getenv('POSTGRES_PASSWORD', 'password')
-            }
-            
-            # MongoDB connection
-            mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ecom_chatbot')
-            self.mongo_client = MongoClient(mongo_uri)
-            self.mongo_db = self.mongo_client.get_default_database()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _discard(self, conn):
+        """Close a connection that is no longer usable"""
+        self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def getconn(self, timeout=None):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+        
+        while True:
+            candidate = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Connection pool is closed")
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve the slot before releasing the lock to connect
+                        self._size += 1
+                        break
+                    
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout}s waiting for a PostgreSQL connection"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
             
-            # Redis connection
-            redis_host = os.getenv('REDIS_HOST', 'localhost')
-            redis_port = int(os.getenv('REDIS_PORT', '6379'))
-            redis_password = os.getenv('REDIS_PASSWORD', None)
-            self.redis_client = redis.Redis(
-                host=redis_host,
-                port=redis_port,
-                password=redis_password,
-                decode_responses=True
-            )
+            # Validation and connecting happen outside the lock
+            if candidate is not None:
+                conn, created_at, last_used_at = candidate
+                if not self._is_healthy(conn, created_at, last_used_at):
+                    with self._cond:
+                        self._size -= 1
+                        self._discard(conn)
+                    continue
+            else:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._cond:
+                    self._stats['created'] += 1
             
-            # Elasticsearch connection
-            es_host = os.getenv('ELASTICSEARCH_HOST', 'localhost:9200')
-            self.es_client = Elasticsearch([es_host])
+            with self._cond:
+                self._in_use[id(conn)] = created_at
+                self._stats['acquired'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += time.monotonic() - started
+            return conn
+    
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool"""
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            if created_at is None:
+                logger.warning("Returned connection does not belong to the pool")
+                return
             
-            logger.info("Database connections initialized successfully")
+            if not discard and not conn.closed and not self._closed:
+                try:
+                    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except Exception:
+                    discard = True
+            else:
+                discard = True
             
-        except Exception as e:
-            logger.error(f"Failed to initialize database connections: {e}")
-            raise
+            if discard:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+    
+    def closeall(self):
+        """Close every idle connection and refuse new checkouts"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+    
+    def stats(self):
+        """Return a snapshot of pool usage counters"""
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self._stats
+            }
+
+class DatabaseManager:
+    """Centralized database connection manager
+    
+    Clients are created lazily on first use, so a process only connects to
+    the backends it actually touches and importing this module performs no
+    I/O. Clients are per process: after a fork the child drops the
+    inherited clients and builds its own on demand.
+    """
+    
+    BACKENDS = ('postgresql', 'mongodb', 'redis', 'elasticsearch')
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._clients = {}
+        self._abandoned = []
+        self.init_timings = {}
+        self.pg_config = {
+            'host': os.getenv('POSTGRES_HOST', 'localhost'),
+            'port': os.getenv('POSTGRES_PORT', '5432'),
+            'database': os.getenv('POSTGRES_DB', 'ecom_chatbot'),
+            'user': os.getenv('POSTGRES_USER', 'postgres'),
+            'password': os.getenv('POSTGRES_PASSWORD', 'password')
+        }
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self):
+        """Forget clients inherited from the parent process"""
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        # Keep references so garbage collection never closes sockets the
+        # parent is still using
+        self._abandoned.extend(self._clients.values())
+        self._clients = {}
+        self.init_timings = {}
+    
+    def _check_pid(self):
+        """Reset clients if we are running in a forked child"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+    
+    def _get_client(self, backend):
+        """Return the client for a backend, creating it on first use"""
+        self._check_pid()
+        
+        client = self._clients.get(backend)
+        if client is not None:
+            return client
+        
+        with self._lock:
+            client = self._clients.get(backend)
+            if client is None:
+                started = time.perf_counter()
+                try:
+                    client = getattr(self, f"_create_{backend}")()
+                except Exception as e:
+                    logger.error(f"Failed to initialize {backend} connection: {e}")
+                    raise
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.init_timings[backend] = round(elapsed_ms, 3)
+                self._clients[backend] = client
+                logger.info(f"Initialized {backend} client in {elapsed_ms:.1f} ms (pid {self._pid})")
+            return client
+    
+    def _create_postgresql(self):
+        """Create the PostgreSQL connection pool"""
+        return PostgresConnectionPool(
+            self.pg_config,
+            min_size=int(os.getenv('POSTGRES_POOL_MIN_SIZE', '1')),
+            max_size=int(os.getenv('POSTGRES_POOL_MAX_SIZE', '10')),
+            acquire_timeout=float(os.getenv('POSTGRES_POOL_TIMEOUT', '5')),
+            validate_after=float(os.getenv('POSTGRES_POOL_VALIDATE_AFTER', '30')),
+            max_lifetime=float(os.getenv('POSTGRES_POOL_MAX_LIFETIME', '3600'))
+        )
+    
+    def _create_mongodb(self):
+        """Create the MongoDB client"""
+        from pymongo import MongoClient
+        
+        mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ecom_chatbot')
+        return MongoClient(mongo_uri)
+    
+    def _create_redis(self):
+        """Create the Redis client"""
+        import redis
+        
+        return redis.Redis(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', '6379')),
+            password=os.getenv('REDIS_PASSWORD', None),
+            decode_responses=True
+        )
+    
+    def _create_elasticsearch(self):
+        """Create the Elasticsearch client"""
+        from elasticsearch import Elasticsearch
+        
+        es_host = os.getenv('ELASTICSEARCH_HOST', 'localhost:9200')
+        return Elasticsearch([es_host])
+    
+    @property
+    def pg_pool(self):
+        return self._get_client('postgresql')
+    
+    @property
+    def mongo_client(self):
+        return self._get_client('mongodb')
+    
+    @property
+    def mongo_db(self):
+        return self.mongo_client.get_default_database()
+    
+    @property
+    def redis_client(self):
+        return self._get_client('redis')
+    
+    @property
+    def es_client(self):
+        return self._get_client('elasticsearch')
+    
+    def warm_up(self, *backends):
+        """Eagerly create clients, e.g. from a gunicorn post_fork hook"""
+        for backend in backends or self.BACKENDS:
+            self._get_client(backend)
+        return self.get_startup_report()
+    
+    def get_startup_report(self):
+        """Report which clients this process created and how long each took"""
+        self._check_pid()
+        return {
+            'pid': self._pid,
+            'initialized': sorted(self._clients),
+            'init_timings_ms': dict(self.init_timings)
+        }
     
     @contextmanager
     def get_pg_connection(self):
-        """Get PostgreSQL connection with automatic cleanup"""
+        """Get pooled PostgreSQL connection, returned to the pool on exit"""
         conn = None
+        discard = False
         try:
-            conn = psycopg2.connect(**self.pg_config)
+            conn = self.pg_pool.getconn()
             yield conn
         except Exception as e:
             if conn:
-                conn.rollback()
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+                if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                    discard = True
             logger.error(f"PostgreSQL connection error: {e}")
             raise
         finally:
             if conn:
-                conn.close()
+                self.pg_pool.putconn(conn, discard=discard)
     
     @contextmanager
-    def get_pg_cursor(self, commit=True):
-        """Get PostgreSQL cursor with automatic transaction handling"""
+    def get_pg_cursor(self, commit=True, name=None, itersize=2000):
+        """Get PostgreSQL cursor with automatic transaction handling
+        
+        Passing ``name`` opens a server-side cursor that fetches ``itersize``
+        rows per round trip while iterated, so large results stream in
+        constant memory.
+        """
         with self.get_pg_connection() as conn:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor(name=name, cursor_factory=RealDictCursor)
+            if name:
+                cursor.itersize = itersize
             try:
                 yield cursor
                 if commit:
@@ -92,6 +448,10 @@ class DatabaseManager:
             finally:
                 cursor.close()
     
+    def get_pg_pool_stats(self):
+        """Get PostgreSQL connection pool statistics"""
+        return self.pg_pool.stats()
+    
     def get_mongo_collection(self, collection_name):
         """Get MongoDB collection"""
         return self.mongo_db[collection_name]
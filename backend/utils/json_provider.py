@@ -0,0 +1,82 @@
+"""
+Fast JSON encoding for API responses (orjson when installed)
+"""
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def default(obj: Any) -> Any:
+    """Encode types the JSON encoder does not handle itself
+    
+    Models expose ``__json__`` returning their raw field values, which are
+    then encoded here or natively instead of being converted one by one in
+    ``to_dict``.
+    """
+    if hasattr(obj, '__json__'):
+        return obj.__json__()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+    
+    def loads(data) -> Any:
+        """Decode JSON from str or bytes"""
+        return orjson.loads(data)
+else:
+    _encoder = json.JSONEncoder(default=default, ensure_ascii=False, separators=(',', ':'))
+    
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode to UTF-8 JSON bytes"""
+        return _encoder.encode(obj).encode('utf-8')
+    
+    def loads(data) -> Any:
+        """Decode JSON from str or bytes"""
+        return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encode to a JSON string"""
+    return dumps_bytes(obj).decode('utf-8')
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, with a stdlib fallback
+    
+    Datetimes are written as ISO 8601, Decimals as numbers and UUIDs as
+    strings, whichever backend is in use. Responses are always compact.
+    """
+    
+    mimetype = 'application/json'
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj)
+    
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,209 @@
+"""
+Asynchronous, sampled logging pipeline
+"""
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from typing import Dict, Optional
+
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including ``extra=`` fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING, per route or logger
+    
+    ``rates`` maps a logger name prefix (``backend.models``) or a route
+    (``route:chat.send_message``, matched against ``extra={'route': ...}``)
+    to the fraction of records kept. The longest matching logger prefix
+    wins. Warnings and errors are never dropped.
+    """
+    
+    def __init__(self, rates: Dict[str, float] = None, default_rate: float = 1.0):
+        super().__init__()
+        self.routes = {}
+        self.loggers = {}
+        for key, rate in (rates or {}).items():
+            if key.startswith('route:'):
+                self.routes[key[len('route:'):]] = rate
+            else:
+                self.loggers[key] = rate
+        self.default_rate = default_rate
+        self._resolved = {}
+    
+    def rate_for(self, record: logging.LogRecord) -> float:
+        route = getattr(record, 'route', None)
+        if route is not None and route in self.routes:
+            return self.routes[route]
+        rate = self._resolved.get(record.name)
+        if rate is None:
+            rate = self.default_rate
+            best = -1
+            for prefix, prefix_rate in self.loggers.items():
+                if (record.name == prefix or record.name.startswith(prefix + '.')) and len(prefix) > best:
+                    rate, best = prefix_rate, len(prefix)
+            self._resolved[record.name] = rate
+        return rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue records without formatting them on the calling thread
+    
+    The stock QueueHandler renders the message and traceback in ``prepare``
+    so records can be pickled; records here never leave the process, so
+    that work is left to the listener thread. When the queue is full,
+    records below ERROR are dropped and counted rather than blocking the
+    request.
+    """
+    
+    def __init__(self, log_queue: queue.Queue, error_timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.error_timeout = error_timeout
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.ERROR:
+                try:
+                    self.queue.put(record, timeout=self.error_timeout)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse ``name=rate,name=rate`` into a dict"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, rate = item.rsplit('=', 1)
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class LoggingPipeline:
+    """Root logger -> sampling filter -> queue -> background writer"""
+    
+    def __init__(self, level: str = 'INFO', log_file: str = None, fmt: str = 'text',
+                 queue_size: int = 10000, sample_rates: Dict[str, float] = None,
+                 default_rate: float = 1.0):
+        self.level = getattr(logging, level.upper(), logging.INFO)
+        self.log_file = log_file
+        self.fmt = fmt
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DeferredQueueHandler(self.queue)
+        self.handler.addFilter(SamplingFilter(sample_rates, default_rate))
+        self.listener: Optional[QueueListener] = None
+        self._lock = threading.Lock()
+    
+    def _formatter(self) -> logging.Formatter:
+        if self.fmt == 'json':
+            return JsonFormatter()
+        return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    def _handlers(self):
+        handlers = [logging.StreamHandler()]
+        if self.log_file:
+            os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+            # Every worker appends to the same file, so none of them may rotate
+            # it; rotate externally (logrotate) and each reopens the new file
+            handlers.append(WatchedFileHandler(self.log_file))
+        formatter = self._formatter()
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        return handlers
+    
+    def start(self):
+        """Install the queue handler and start the writer thread"""
+        with self._lock:
+            root = logging.getLogger()
+            root.setLevel(self.level)
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            self.listener = QueueListener(self.queue, *self._handlers(), respect_handler_level=True)
+            self.listener.start()
+    
+    def stop(self):
+        """Flush queued records and stop the writer thread"""
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+    
+    def _restart_after_fork(self):
+        # The writer thread does not survive fork; start a fresh one and
+        # discard records queued by the parent (it writes those itself)
+        self._lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.handler.queue = self.queue
+        self.listener = QueueListener(self.queue, *self._handlers(), respect_handler_level=True)
+        self.listener.start()
+    
+    def stats(self) -> Dict[str, int]:
+        return {'queued': self.queue.qsize(), 'dropped': self.handler.dropped}
+
+
+_pipeline: Optional[LoggingPipeline] = None
+
+
+def configure_logging() -> LoggingPipeline:
+    """Set up the logging pipeline once per process from the environment"""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+    
+    _pipeline = LoggingPipeline(
+        level=os.getenv('LOG_LEVEL', 'INFO'),
+        log_file=os.getenv('LOG_FILE') or None,
+        fmt=os.getenv('LOG_FORMAT', 'text'),
+        queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+        sample_rates=parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', '')),
+        default_rate=float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+    )
+    _pipeline.start()
+    atexit.register(_pipeline.stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_pipeline._restart_after_fork)
+    return _pipeline
+
+
+def logging_stats() -> Dict[str, int]:
+    """Queue depth and dropped record count for this process"""
+    return _pipeline.stats() if _pipeline is not None else {}
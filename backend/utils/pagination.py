@@ -0,0 +1,84 @@
+"""
+Opaque cursor tokens for keyset pagination
+"""
+import base64
+import binascii
+import json
+import uuid
+from collections import namedtuple
+from datetime import date, datetime
+from typing import Any, List, Sequence
+
+# One page of results; next_cursor is None on the last page
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+# Sort key of the (timestamp, uuid) keyset listings
+KEYSET_TYPES = (datetime, uuid.UUID)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token is malformed or belongs to another listing"""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def encode_cursor(kind: str, values: List[Any]) -> str:
+    """Encode the sort key of the last row of a page as an opaque token
+    
+    ``kind`` names the listing (and its sort order) so a token from one
+    listing is rejected by another. Datetimes are stored as ISO strings,
+    which Postgres coerces back to timestamps in keyset comparisons.
+    """
+    payload = json.dumps([kind, [_encode_value(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _check_value(value: Any, expected: type) -> None:
+    if expected is datetime:
+        datetime.fromisoformat(value)
+    elif expected is uuid.UUID:
+        uuid.UUID(value)
+    elif not isinstance(value, expected):
+        raise TypeError(f"expected {expected.__name__}")
+
+
+def decode_cursor(token: str, kind: str, types: Sequence[type] = None) -> List[Any]:
+    """Decode a token produced by encode_cursor for the given listing
+    
+    ``types`` lists the expected type of each sort key value (datetime and
+    uuid.UUID values are checked as their string forms). A token with a
+    different number of values or an unparseable value raises
+    InvalidCursor, so it is rejected up front instead of failing the query.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        token_kind, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    
+    if token_kind != kind or not isinstance(values, list):
+        raise InvalidCursor(f"Cursor does not belong to listing '{kind}'")
+    if types is not None:
+        if len(values) != len(types):
+            raise InvalidCursor(f"Malformed cursor: expected {len(types)} values, got {len(values)}")
+        try:
+            for value, expected in zip(values, types):
+                _check_value(value, expected)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise InvalidCursor(f"Malformed cursor: {e}")
+    return values
+
+
+def cursor_kind(token: str) -> str:
+    """Return the listing a token was issued for"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))[0]
+    except (ValueError, TypeError, IndexError, KeyError, binascii.Error) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
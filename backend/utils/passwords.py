@@ -0,0 +1,131 @@
+"""
+Password hashing off the request thread with a calibrated bcrypt cost
+"""
+import os
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+_COST_PATTERN = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class HasherBusyError(Exception):
+    """Raised when the hashing queue is full or too slow; callers should answer 503"""
+
+
+class PasswordHasher:
+    """Bounded worker pool for bcrypt hashing and verification
+    
+    The pool bounds how many hashes run at once, so a login burst cannot
+    spend every CPU on bcrypt; the calling request thread still blocks
+    until its hash is done. At most ``max_workers`` hashes run at once and
+    at most ``max_queue`` more may wait; beyond that, or when a hash is not
+    done within ``timeout`` seconds, HasherBusyError is raised instead of
+    piling up work.
+    """
+    
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, target_ms: float = 250,
+                 min_rounds: int = 10, max_rounds: int = 16, timeout: float = 10.0,
+                 rounds: int = None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.target_ms = target_ms
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.timeout = timeout
+        self._rounds = rounds
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+    
+    @property
+    def rounds(self) -> int:
+        """bcrypt cost factor for new hashes, calibrated on first use"""
+        if self._rounds is None:
+            self.calibrate()
+        return self._rounds
+    
+    def calibrate(self, sample_rounds: int = 8, samples: int = 3) -> int:
+        """Pick the highest cost whose hash time stays within target_ms
+        
+        Each extra round doubles the work, so timing a cheap cost once and
+        scaling is enough to estimate the others.
+        """
+        salt = bcrypt.gensalt(rounds=sample_rounds)
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.hashpw(b'calibration-password', salt)
+            timings.append((time.perf_counter() - started) * 1000)
+        base_ms = min(timings)
+        
+        rounds = self.min_rounds
+        while rounds < self.max_rounds and base_ms * 2 ** (rounds + 1 - sample_rounds) <= self.target_ms:
+            rounds += 1
+        
+        self._rounds = rounds
+        logger.info(f"Calibrated bcrypt cost to {rounds} "
+                    f"(~{base_ms * 2 ** (rounds - sample_rounds):.0f} ms, target {self.target_ms} ms)")
+        return rounds
+    
+    def _ensure_pool(self):
+        """Create the worker pool once per process (threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='bcrypt')
+            self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+            self._pid = os.getpid()
+    
+    def _run(self, fn, *args):
+        """Run fn on the pool and wait for it, rejecting work when saturated"""
+        self._ensure_pool()
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError("Password hashing queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HasherBusyError(f"Password hashing did not finish within {self.timeout}s")
+    
+    def hash(self, password: str) -> str:
+        """Hash a password with the calibrated cost"""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+    
+    def verify(self, password: str, password_hash: str) -> bool:
+        """Check a password against a stored hash"""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a stored hash was made with a lower cost than the current one
+        
+        Calibration can land on different costs on different hosts, so a
+        hash is only upgraded, never rewritten at a lower or merely
+        different cost; otherwise logins would flip it back and forth.
+        """
+        match = _COST_PATTERN.match(password_hash or '')
+        return not match or int(match.group(1)) < self.rounds
+
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.getenv('BCRYPT_WORKERS', '2')),
+    max_queue=int(os.getenv('BCRYPT_MAX_QUEUE', '32')),
+    target_ms=float(os.getenv('BCRYPT_TARGET_MS', '250')),
+    rounds=int(os.environ['BCRYPT_ROUNDS']) if os.getenv('BCRYPT_ROUNDS') else None
+)
@@ -0,0 +1,209 @@
+"""
+Distributed token-bucket rate limiting backed by Redis
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional
+from backend.utils.database import db_manager
+from backend.utils.cache import LocalLRUCache, CACHE_MISS
+
+logger = logging.getLogger(__name__)
+
+# capacity tokens, refilled continuously over period seconds
+RateLimit = namedtuple('RateLimit', ['name', 'capacity', 'period'])
+
+# Outcome of one bucket check
+BucketState = namedtuple('BucketState', ['allowed', 'limit', 'remaining', 'reset', 'retry_after'])
+
+# Atomically refill every bucket in KEYS and take tokens only if all of them
+# have one, so a request denied by one budget is not charged to the others.
+# ARGV holds the lease request and fraction, then capacity and rate per key.
+# Each bucket grants up to ARGV[1] tokens but never more than ARGV[2] of what
+# is left (at least one), so workers only lease tokens in bulk while the
+# client is far from its limit. Returns the 1-based index of the first
+# denying bucket (0 if allowed), then granted and remaining tokens per key.
+TOKEN_BUCKET_SCRIPT = """
+local requested = tonumber(ARGV[1])
+local lease_fraction = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local denied = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[1 + 2 * i])
+    local rate = tonumber(ARGV[2 + 2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens[i] = math.min(capacity, current + math.max(0, now - ts) * rate)
+    if tokens[i] < 1 and denied == 0 then
+        denied = i
+    end
+end
+local result = {denied}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[1 + 2 * i])
+    local rate = tonumber(ARGV[2 + 2 * i])
+    local granted = 0
+    if denied == 0 then
+        granted = math.min(requested, math.max(1, math.floor(tokens[i] * lease_fraction)))
+        tokens[i] = tokens[i] - granted
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens[i]), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    table.insert(result, granted)
+    table.insert(result, tostring(tokens[i]))
+end
+return result
+"""
+
+
+class RateLimiter:
+    """Token buckets in Redis with a local lease to skip most round trips
+    
+    When a bucket has plenty of tokens, a worker takes a small lease of
+    several tokens in one script call and spends them locally for up to
+    ``lease_ttl`` seconds. Clients that are clearly under their limit
+    therefore cost one Redis round trip per lease rather than per request;
+    near the limit leases shrink to a single token so enforcement stays
+    exact. If Redis is unavailable requests are allowed (fail open).
+    """
+    
+    def __init__(self, lease_size: int = 10, lease_fraction: float = 0.1,
+                 lease_ttl: float = 1.0, max_leases: int = 10000):
+        self.lease_size = lease_size
+        self.lease_fraction = lease_fraction
+        self.lease_ttl = lease_ttl
+        self.max_leases = max_leases
+        self._script = None
+        self._pid = None
+        self._leases = None
+        self._lock = threading.Lock()
+    
+    def _ensure_process(self):
+        """Leases and the script handle are per process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._leases = LocalLRUCache(maxsize=self.max_leases, ttl=self.lease_ttl)
+                self._script = None
+                self._pid = os.getpid()
+    
+    @staticmethod
+    def _state(limit: RateLimit, remaining: float) -> BucketState:
+        rate = limit.capacity / limit.period
+        return BucketState(True, limit.capacity, int(remaining),
+                           math.ceil((limit.capacity - int(remaining)) / rate), 0)
+    
+    def check(self, buckets: List[tuple]) -> Optional[BucketState]:
+        """Take one token from every (key, limit) pair, or from none of them
+        
+        Buckets with a local lease are checked without Redis; the rest are
+        checked and charged together in one script call. Returns the denying
+        bucket's state, else the most constraining allowed one.
+        """
+        if not buckets:
+            return None
+        self._ensure_process()
+        
+        with self._lock:
+            leased = {}
+            for key, limit in buckets:
+                lease = self._leases.get(key)
+                if lease is not CACHE_MISS and lease['tokens'] > 0:
+                    leased[key] = lease
+            # Reserve a leased token now; it is handed back if Redis denies
+            for lease in leased.values():
+                lease['tokens'] -= 1
+            if len(leased) == len(buckets):
+                # Local pre-check: every budget was spent without touching Redis
+                return min((self._state(limit, leased[key]['redis_tokens'] + leased[key]['tokens'])
+                            for key, limit in buckets), key=lambda state: state.remaining)
+        
+        pending = [(key, limit) for key, limit in buckets if key not in leased]
+        args = [self.lease_size, self.lease_fraction]
+        for _, limit in pending:
+            args.extend((limit.capacity, limit.capacity / limit.period))
+        try:
+            if self._script is None:
+                self._script = db_manager.redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+            result = self._script(keys=[f"ratelimit:{key}" for key, _ in pending], args=args)
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return BucketState(True, buckets[0][1].capacity, buckets[0][1].capacity, 0, 0)
+        
+        denied = int(result[0])
+        if denied:
+            with self._lock:
+                for lease in leased.values():
+                    lease['tokens'] += 1
+            _, limit = pending[denied - 1]
+            rate = limit.capacity / limit.period
+            tokens = float(result[2 * denied])
+            retry_after = math.ceil((1 - tokens) / rate)
+            return BucketState(False, limit.capacity, 0,
+                               math.ceil((limit.capacity - tokens) / rate), max(retry_after, 1))
+        
+        states = []
+        with self._lock:
+            for i, (key, limit) in enumerate(pending):
+                granted, tokens = int(result[1 + 2 * i]), float(result[2 + 2 * i])
+                if granted > 1:
+                    self._leases.set(key, {'tokens': granted - 1, 'redis_tokens': tokens})
+                states.append(self._state(limit, tokens + granted - 1))
+            for key, limit in buckets:
+                lease = leased.get(key)
+                if lease is not None:
+                    states.append(self._state(limit, lease['redis_tokens'] + lease['tokens']))
+        return min(states, key=lambda state: state.remaining)
+
+
+def _limit(name: str, env_var: str, default: int, period: int) -> RateLimit:
+    return RateLimit(name, int(os.getenv(env_var, default)), period)
+
+
+IP_LIMITS = [
+    _limit('ip-minute', 'RATE_LIMIT_PER_MINUTE', 60, 60),
+    _limit('ip-hour', 'RATE_LIMIT_PER_HOUR', 1000, 3600)
+]
+
+USER_LIMITS = [
+    _limit('user-minute', 'RATE_LIMIT_USER_PER_MINUTE', 120, 60)
+]
+
+# Extra budgets for expensive endpoints, per client (user if known, else IP)
+ROUTE_LIMITS: Dict[str, RateLimit] = {
+    'chat.send_message': _limit('chat-message', 'RATE_LIMIT_CHAT_PER_MINUTE', 30, 60),
+    'products.search_products': _limit('product-search', 'RATE_LIMIT_SEARCH_PER_MINUTE', 60, 60)
+}
+
+rate_limiter = RateLimiter(
+    lease_size=int(os.getenv('RATE_LIMIT_LEASE_SIZE', '10')),
+    lease_ttl=float(os.getenv('RATE_LIMIT_LEASE_TTL', '1.0'))
+)
+
+
+def buckets_for_request(endpoint: str, ip: str, user_id: str = None) -> List[tuple]:
+    """Bucket keys and limits that apply to one request"""
+    buckets = [(f"{limit.name}:{ip}", limit) for limit in IP_LIMITS]
+    if user_id:
+        buckets.extend((f"{limit.name}:{user_id}", limit) for limit in USER_LIMITS)
+    route_limit = ROUTE_LIMITS.get(endpoint)
+    if route_limit:
+        buckets.append((f"{route_limit.name}:{user_id or ip}", route_limit))
+    return buckets
+
+
+def apply_headers(response, state: BucketState):
+    """Attach X-RateLimit-* (and Retry-After when limited) headers"""
+    response.headers['X-RateLimit-Limit'] = str(state.limit)
+    response.headers['X-RateLimit-Remaining'] = str(max(state.remaining, 0))
+    response.headers['X-RateLimit-Reset'] = str(state.reset)
+    if not state.allowed:
+        response.headers['Retry-After'] = str(state.retry_after)
+    return response
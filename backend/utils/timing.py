@@ -0,0 +1,41 @@
+"""
+Lightweight per-stage request timing
+"""
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Collect per-stage durations and render them as a Server-Timing header"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []  # (name, duration_ms)
+    
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one named stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, (time.perf_counter() - started) * 1000))
+    
+    def total_ms(self) -> float:
+        """Milliseconds elapsed since the timer was created"""
+        return (time.perf_counter() - self.started) * 1000
+    
+    def as_dict(self):
+        """Stage durations in milliseconds, including the running total"""
+        timings = {name: round(duration, 3) for name, duration in self.stages}
+        timings['total'] = round(self.total_ms(), 3)
+        return timings
+    
+    def header_value(self) -> str:
+        """Format the timings for the Server-Timing response header"""
+        return ", ".join(f"{name};dur={duration:.3f}" for name, duration in self.as_dict().items())
+    
+    def apply(self, response):
+        """Attach the Server-Timing header to a Flask response"""
+        response.headers['Server-Timing'] = self.header_value()
+        return response
@@ -0,0 +1,88 @@
+"""
+Measure what the co-purchase trigger adds to writing an order's items
+
+Seeds products and an order history, then inserts orders the way
+Order.place does (one multi-row order_items INSERT per order) with the
+maintain_order_items_co_purchases trigger disabled and enabled. Everything
+runs in one transaction that is rolled back; ALTER TABLE takes an exclusive
+lock on order_items meanwhile, so do not run it against a live database.
+
+Run: python scripts/bench_co_purchase_trigger.py [--history 5000] [--basket 4]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from psycopg2.extras import execute_values
+from backend.utils.database import db_manager
+
+
+def insert_orders(cursor, user_id, product_ids, count, basket, rng):
+    """Insert ``count`` orders; returns per-order order_items INSERT latencies in ms"""
+    latencies = []
+    for _ in range(count):
+        order_id = str(uuid.uuid4())
+        cursor.execute("INSERT INTO orders (order_id, user_id, total_amount) VALUES (%s, %s, 0)",
+                       (order_id, user_id))
+        items = [(str(uuid.uuid4()), order_id, product_id, 1, 10, 10)
+                 for product_id in sorted(rng.sample(product_ids, basket))]
+        started = time.perf_counter()
+        execute_values(cursor, """
+            INSERT INTO order_items (item_id, order_id, product_id, quantity, unit_price, total_price)
+            VALUES %s
+        """, items)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<12} p50={statistics.median(latencies):7.3f} ms  p99={p99:7.3f} ms  "
+          f"mean={statistics.mean(latencies):7.3f} ms")
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='co-purchase trigger cost')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--history', type=int, default=5000, help='orders written before measuring')
+    parser.add_argument('--orders', type=int, default=500, help='orders measured per mode')
+    parser.add_argument('--basket', type=int, default=4, help='distinct products per order')
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    with db_manager.get_pg_cursor(commit=False) as cursor:
+        try:
+            user_id = str(uuid.uuid4())
+            cursor.execute("""
+                INSERT INTO users (user_id, username, email, password_hash)
+                VALUES (%s, %s, %s, 'x')
+            """, (user_id, f"bench-{user_id}", f"{user_id}@bench.invalid"))
+            product_ids = [str(uuid.uuid4()) for _ in range(args.products)]
+            execute_values(cursor, "INSERT INTO products (product_id, external_id, source, name) VALUES %s",
+                           [(pid, pid, 'bench', f"Bench product {i}") for i, pid in enumerate(product_ids)])
+            insert_orders(cursor, user_id, product_ids, args.history, args.basket, rng)
+            
+            results = {}
+            for label, state in (('no trigger', 'DISABLE'), ('trigger', 'ENABLE')):
+                cursor.execute("SAVEPOINT bench")
+                cursor.execute(f"ALTER TABLE order_items {state} TRIGGER maintain_order_items_co_purchases")
+                results[label] = report(label, insert_orders(cursor, user_id, product_ids,
+                                                             args.orders, args.basket, rng))
+                cursor.execute("ROLLBACK TO SAVEPOINT bench")
+            
+            print(f"Trigger adds ~{results['trigger'] - results['no trigger']:.3f} ms (p50) per order "
+                  f"of {args.basket} products after {args.history} orders")
+        finally:
+            cursor.connection.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark intent classification latency, one message at a time and in batches
+
+Run: python scripts/bench_intent_classifier.py [--messages 20000] [--batch 256]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from backend.services.intents import IntentClassifier, SEED_EXAMPLES
+
+FILLERS = ['please', 'hi', 'thanks', 'asap', 'for my wife', 'today', 'again', 'quickly', 'hey there']
+
+
+def sample_messages(count, seed=7):
+    rng = random.Random(seed)
+    examples = [text for texts in SEED_EXAMPLES.values() for text in texts]
+    messages = []
+    for _ in range(count):
+        words = rng.choice(examples).split()
+        words.insert(rng.randrange(len(words) + 1), rng.choice(FILLERS))
+        messages.append(' '.join(words).capitalize() + rng.choice(['', '?', '!', '.']))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='intent classifier benchmark')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=256)
+    args = parser.parse_args()
+    
+    started = time.perf_counter()
+    classifier = IntentClassifier()
+    print(f"model built in {(time.perf_counter() - started) * 1000:.1f} ms")
+    
+    messages = sample_messages(args.messages)
+    classifier.classify_batch(messages[:100])  # warm the feature cache
+    
+    started = time.perf_counter()
+    for message in messages:
+        classifier.classify(message)
+    single = (time.perf_counter() - started) / len(messages)
+    
+    started = time.perf_counter()
+    for i in range(0, len(messages), args.batch):
+        classifier.classify_batch(messages[i:i + args.batch])
+    batched = (time.perf_counter() - started) / len(messages)
+    
+    print(f"{len(messages)} messages")
+    print(f"single   {single * 1e6:8.1f} us/message  {1 / single:12,.0f} messages/s")
+    print(f"batch {args.batch:<4} {batched * 1e6:5.1f} us/message  {1 / batched:12,.0f} messages/s")
+
+
+if __name__ == '__main__':
+    main()
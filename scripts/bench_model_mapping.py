@@ -0,0 +1,140 @@
+"""
+Benchmark row-to-model mapping: memory per object and rows per second
+
+Compares the previous dict-backed models built with ``from_dict(dict(row))``
+against the slot-based models built by their row mappers, on synthetic
+rows shaped like RealDictCursor output.
+Run: python scripts/bench_model_mapping.py [--rows 100000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from backend.models.chat import ChatMessage
+from backend.models.order import Order
+
+
+class LegacyChatMessage:
+    """ChatMessage as it was before slots: a plain instance __dict__"""
+    
+    def __init__(self, message_id=None, session_id=None, sender_type='user',
+                 content=None, created_at=None, metadata=None):
+        self.message_id = message_id or str(uuid.uuid4())
+        self.session_id = session_id
+        self.sender_type = sender_type
+        self.content = content
+        self.created_at = created_at or datetime.utcnow()
+        self.metadata = metadata or {}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            message_id=data.get('message_id'),
+            session_id=data.get('session_id'),
+            sender_type=data.get('sender_type', 'user'),
+            content=data.get('content'),
+            created_at=data.get('created_at') or None,
+            metadata=data.get('metadata', {})
+        )
+
+
+class LegacyOrder:
+    """Order as it was before slots: a plain instance __dict__"""
+    
+    def __init__(self, order_id=None, user_id=None, status='pending',
+                 total_amount=None, shipping_address=None, billing_address=None,
+                 payment_method=None, payment_status='pending',
+                 created_at=None, updated_at=None, metadata=None):
+        self.order_id = order_id or str(uuid.uuid4())
+        self.user_id = user_id
+        self.status = status
+        self.total_amount = total_amount
+        self.shipping_address = shipping_address or {}
+        self.billing_address = billing_address or {}
+        self.payment_method = payment_method
+        self.payment_status = payment_status
+        self.created_at = created_at or datetime.utcnow()
+        self.updated_at = updated_at or datetime.utcnow()
+        self.metadata = metadata or {}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: data.get(key) for key in (
+            'order_id', 'user_id', 'status', 'total_amount', 'shipping_address',
+            'billing_address', 'payment_method', 'payment_status',
+            'created_at', 'updated_at', 'metadata'
+        )})
+
+
+def message_rows(count):
+    session_id = str(uuid.uuid4())
+    start = datetime(2024, 1, 1)
+    return [{
+        'message_id': str(uuid.uuid4()),
+        'session_id': session_id,
+        'sender_type': 'user' if i % 2 == 0 else 'bot',
+        'content': f'message number {i}',
+        'created_at': start + timedelta(seconds=i),
+        'metadata': {}
+    } for i in range(count)]
+
+
+def order_rows(count):
+    user_id = str(uuid.uuid4())
+    start = datetime(2024, 1, 1)
+    return [{
+        'order_id': str(uuid.uuid4()),
+        'user_id': user_id,
+        'status': 'delivered',
+        'total_amount': Decimal('49.90'),
+        'shipping_address': {'city': 'Springfield'},
+        'billing_address': {'city': 'Springfield'},
+        'payment_method': 'card',
+        'payment_status': 'paid',
+        'created_at': start + timedelta(minutes=i),
+        'updated_at': start + timedelta(minutes=i),
+        'metadata': {}
+    } for i in range(count)]
+
+
+def measure(label, mapper, rows):
+    # Memory retained by the mapped objects (rows are already allocated)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    objects = mapper(rows)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del objects
+    
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        mapper(rows)
+        best = min(best, time.perf_counter() - started)
+    
+    print(f"{label:<22} {retained / len(rows):8.1f} bytes/object  {len(rows) / best:12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='model row mapping benchmark')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+    
+    rows = message_rows(args.rows)
+    measure('chat message (dict)', lambda rs: [LegacyChatMessage.from_dict(dict(r)) for r in rs], rows)
+    measure('chat message (slots)', lambda rs: [ChatMessage.from_row(r) for r in rs], rows)
+    
+    rows = order_rows(args.rows)
+    measure('order (dict)', lambda rs: [LegacyOrder.from_dict(dict(r)) for r in rs], rows)
+    measure('order (slots)', lambda rs: [Order.from_row(r) for r in rs], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark login throughput with and without the bcrypt hashing pool
+
+Simulates a threaded worker: ``--threads`` request threads each verify
+passwords, while a probe thread serves cheap "other" requests and records
+their latency. Run: python scripts/bench_password_hashing.py [--logins 64]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bcrypt
+from backend.utils.passwords import PasswordHasher, HasherBusyError
+
+
+def _probe(stop, latencies):
+    """A cheap non-login request, issued continuously during the burst"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        sum(i * i for i in range(2000))
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.005)
+
+
+def run(label, verify, logins, threads):
+    stop = threading.Event()
+    latencies = []
+    probe = threading.Thread(target=_probe, args=(stop, latencies), daemon=True)
+    probe.start()
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as requests:
+        results = list(requests.map(lambda _: verify(), range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe.join()
+    
+    rejected = sum(1 for r in results if r is None)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    print(f"{label:<12} {(logins - rejected) / elapsed:8.1f} logins/s  "
+          f"rejected={rejected:<4} other requests p50={statistics.median(latencies):6.2f} ms "
+          f"p99={p99:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bcrypt pool benchmark')
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16, help='request threads per worker')
+    parser.add_argument('--workers', type=int, default=2, help='hashing pool size')
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+    
+    password = 'correct horse battery staple'
+    stored = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=args.rounds))
+    hasher = PasswordHasher(max_workers=args.workers, max_queue=args.threads, rounds=args.rounds)
+    
+    def direct():
+        return bcrypt.checkpw(password.encode('utf-8'), stored)
+    
+    def pooled():
+        try:
+            return hasher.verify(password, stored.decode('utf-8'))
+        except HasherBusyError:
+            return None
+    
+    print(f"{args.logins} logins, {args.threads} request threads, cost {args.rounds}, "
+          f"pool of {args.workers}, {os.cpu_count()} CPUs")
+    run('direct', direct, args.logins, args.threads)
+    run('pooled', pooled, args.logins, args.threads)
+
+
+if __name__ == '__main__':
+    main()
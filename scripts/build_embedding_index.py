@@ -0,0 +1,46 @@
+"""
+Rebuild or compact the product embedding index
+
+Usage: python scripts/build_embedding_index.py [--batch-size 1000] [--compact]
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from backend.models.product import Product
+from backend.services.embeddings import product_embeddings
+from backend.utils.database import db_manager
+
+
+def product_batches(batch_size):
+    """Stream active products from Postgres through a server-side cursor"""
+    with db_manager.get_pg_cursor(commit=False, name='embedding_rebuild', itersize=batch_size) as cursor:
+        cursor.execute("SELECT * FROM products WHERE is_active = true")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [Product.from_row(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--compact', action='store_true',
+                        help='drop superseded rows instead of rebuilding from the database')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.compact:
+        rows = product_embeddings.compact()
+        print(f"Compacted embedding index to {rows} rows in '{product_embeddings.path}'")
+    else:
+        written = product_embeddings.rebuild(product_batches(args.batch_size))
+        print(f"Embedded {written} products into '{product_embeddings.path}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ CREATE EXTENSION IF NOT EXISTS "pg_trgm";
 
 -- Users table
 CREATE TABLE IF NOT EXISTS users (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     username VARCHAR(255) UNIQUE NOT NULL,
     email VARCHAR(255) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
@@ -21,20 +21,23 @@ CREATE TABLE IF NOT EXISTS users (
 
 -- Chat sessions table
 CREATE TABLE IF NOT EXISTS chat_sessions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-    session_token VARCHAR(255) UNIQUE NOT NULL,
+    session_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(user_id) ON DELETE CASCADE,
+    session_token VARCHAR(255) UNIQUE,
     started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     ended_at TIMESTAMP WITH TIME ZONE,
     is_active BOOLEAN DEFAULT true,
-    metadata JSONB DEFAULT '{}'
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    metadata JSONB DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Chat messages table
 CREATE TABLE IF NOT EXISTS chat_messages (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    session_id UUID REFERENCES chat_sessions(id) ON DELETE CASCADE,
-    message_type VARCHAR(20) NOT NULL CHECK (message_type IN ('user', 'bot', 'system')),
+    message_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    session_id UUID REFERENCES chat_sessions(session_id) ON DELETE CASCADE,
+    sender_type VARCHAR(20) NOT NULL CHECK (sender_type IN ('user', 'bot', 'system')),
     content TEXT NOT NULL,
     metadata JSONB DEFAULT '{}',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
@@ -42,7 +45,7 @@ CREATE TABLE IF NOT EXISTS chat_messages (
 
 -- Products table (cached from external APIs)
 CREATE TABLE IF NOT EXISTS products (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    product_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     external_id VARCHAR(255) NOT NULL,
     source VARCHAR(50) NOT NULL, -- 'shopify', 'scraped', etc.
     name VARCHAR(500) NOT NULL,
@@ -54,6 +57,8 @@ CREATE TABLE IF NOT EXISTS products (
     image_url TEXT,
     product_url TEXT,
     availability VARCHAR(50),
+    stock_quantity INTEGER NOT NULL DEFAULT 0 CHECK (stock_quantity >= 0),
+    is_active BOOLEAN DEFAULT true,
     metadata JSONB DEFAULT '{}',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -62,9 +67,9 @@ CREATE TABLE IF NOT EXISTS products (
 
 -- Orders table
 CREATE TABLE IF NOT EXISTS orders (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-    session_id UUID REFERENCES chat_sessions(id),
+    order_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(user_id) ON DELETE CASCADE,
+    session_id UUID REFERENCES chat_sessions(session_id),
     external_order_id VARCHAR(255),
     status VARCHAR(50) NOT NULL DEFAULT 'pending',
     total_amount DECIMAL(10,2) NOT NULL,
@@ -79,11 +84,22 @@ CREATE TABLE IF NOT EXISTS orders (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Order line items (written by OrderItem)
+CREATE TABLE IF NOT EXISTS order_items (
+    item_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    order_id UUID NOT NULL REFERENCES orders(order_id) ON DELETE CASCADE,
+    product_id UUID NOT NULL REFERENCES products(product_id),
+    quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0),
+    unit_price DECIMAL(10,2),
+    total_price DECIMAL(10,2),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Analytics events table
 CREATE TABLE IF NOT EXISTS analytics_events (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
-    session_id UUID REFERENCES chat_sessions(id) ON DELETE SET NULL,
+    user_id UUID REFERENCES users(user_id) ON DELETE SET NULL,
+    session_id UUID REFERENCES chat_sessions(session_id) ON DELETE SET NULL,
     event_type VARCHAR(100) NOT NULL,
     event_data JSONB NOT NULL DEFAULT '{}',
     ip_address INET,
@@ -91,6 +107,56 @@ CREATE TABLE IF NOT EXISTS analytics_events (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Pre-aggregated sales per day/week/month, maintained by trigger on orders.
+-- Each bucket is split over a few shards so concurrent orders don't all
+-- contend for the same row; reports sum the shards.
+CREATE TABLE IF NOT EXISTS sales_rollups (
+    period VARCHAR(10) NOT NULL CHECK (period IN ('day', 'week', 'month')),
+    bucket_start DATE NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (period, bucket_start, shard)
+);
+
+-- Products whose Elasticsearch update failed, replayed once search is back
+CREATE TABLE IF NOT EXISTS search_index_dirty (
+    product_id UUID PRIMARY KEY,
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Item-to-item co-purchase model, maintained by triggers on order_items and
+-- orders. Counts are per order (a product bought twice in one order counts
+-- once) and leave out cancelled orders; pair counts are stored in both
+-- directions. product_neighbors keeps the
+-- top-k cosine-scored neighbors per product and is refreshed for products
+-- listed in recommendation_dirty (see backend/models/recommendation.py).
+CREATE TABLE IF NOT EXISTS product_purchase_counts (
+    product_id UUID PRIMARY KEY REFERENCES products(product_id) ON DELETE CASCADE,
+    order_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS product_pair_counts (
+    product_id UUID NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    other_id UUID NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    co_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, other_id)
+);
+
+CREATE TABLE IF NOT EXISTS product_neighbors (
+    product_id UUID NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    neighbor_id UUID NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    score REAL NOT NULL,
+    co_count INTEGER NOT NULL,
+    PRIMARY KEY (product_id, neighbor_id)
+);
+
+CREATE TABLE IF NOT EXISTS recommendation_dirty (
+    product_id UUID PRIMARY KEY,
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- API keys and configurations
 CREATE TABLE IF NOT EXISTS api_configurations (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -104,11 +170,20 @@ CREATE TABLE IF NOT EXISTS api_configurations (
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id ON chat_messages(session_id);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_created_at ON chat_sessions(created_at);
 CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (name gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
 CREATE INDEX IF NOT EXISTS idx_products_source ON products(source);
 CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+-- Keyset pagination indexes, matching each listing's ORDER BY
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_keyset ON chat_messages(session_id, created_at, message_id);
+CREATE INDEX IF NOT EXISTS idx_orders_user_keyset ON orders(user_id, created_at DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_updated_keyset ON products(updated_at DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+-- Recommendation reads
+CREATE INDEX IF NOT EXISTS idx_product_neighbors_rank ON product_neighbors(product_id, score DESC);
+CREATE INDEX IF NOT EXISTS idx_product_purchase_counts_rank ON product_purchase_counts(order_count DESC);
 CREATE INDEX IF NOT EXISTS idx_analytics_events_type ON analytics_events(event_type);
 CREATE INDEX IF NOT EXISTS idx_analytics_events_created_at ON analytics_events(created_at);
 
@@ -134,6 +209,257 @@ CREATE TRIGGER update_orders_updated_at BEFORE UPDATE ON orders
 CREATE TRIGGER update_api_configurations_updated_at BEFORE UPDATE ON api_configurations
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Incremental sales rollups
+CREATE OR REPLACE FUNCTION apply_sales_rollup(p_created_at TIMESTAMPTZ, p_orders INTEGER, p_revenue DECIMAL)
+RETURNS VOID AS $$
+DECLARE
+    utc_ts TIMESTAMP := p_created_at AT TIME ZONE 'UTC';
+    bucket_shard SMALLINT := floor(random() * 8)::SMALLINT;
+BEGIN
+    INSERT INTO sales_rollups (period, bucket_start, shard, orders_count, revenue)
+    VALUES
+        ('day', date_trunc('day', utc_ts)::DATE, bucket_shard, p_orders, p_revenue),
+        ('week', date_trunc('week', utc_ts)::DATE, bucket_shard, p_orders, p_revenue),
+        ('month', date_trunc('month', utc_ts)::DATE, bucket_shard, p_orders, p_revenue)
+    ON CONFLICT (period, bucket_start, shard) DO UPDATE SET
+        orders_count = sales_rollups.orders_count + EXCLUDED.orders_count,
+        revenue = sales_rollups.revenue + EXCLUDED.revenue,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION maintain_sales_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Cancelled orders don't count as sales
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status <> 'cancelled' THEN
+        PERFORM apply_sales_rollup(OLD.created_at, -1, -COALESCE(OLD.total_amount, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status <> 'cancelled' THEN
+        PERFORM apply_sales_rollup(NEW.created_at, 1, COALESCE(NEW.total_amount, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER maintain_orders_sales_rollups
+    AFTER INSERT OR DELETE ON orders
+    FOR EACH ROW EXECUTE FUNCTION maintain_sales_rollups();
+
+CREATE TRIGGER maintain_orders_sales_rollups_on_update
+    AFTER UPDATE OF status, total_amount, created_at ON orders
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.total_amount IS DISTINCT FROM NEW.total_amount
+          OR OLD.created_at IS DISTINCT FROM NEW.created_at)
+    EXECUTE FUNCTION maintain_sales_rollups();
+
+-- Incremental co-purchase counts. Only orders that are not cancelled count;
+-- the counts follow item inserts and deletes, cancellation (and its
+-- reversal) and order deletion, so they always match CoPurchaseModel.rebuild.
+-- Checkout pays for this inside the order's transaction: roughly 0.5 ms for
+-- a 2-4 item order and 4-7 ms for a 10 item one
+-- (scripts/bench_co_purchase_trigger.py), and the pair count rows it
+-- updates stay locked until the order commits, so concurrent checkouts of
+-- the same products queue behind each other. Disable the triggers and run
+-- CoPurchaseModel.rebuild periodically if that becomes a bottleneck.
+--
+-- shift_co_purchases adds (p_sign = 1) or removes (p_sign = -1) products
+-- from the counted baskets of orders: product p_product_ids[i] joins or
+-- leaves order p_order_ids[i]. Its pairs with the rest of the order's
+-- items are adjusted too; counts that drop to zero are deleted.
+CREATE OR REPLACE FUNCTION shift_co_purchases(p_order_ids UUID[], p_product_ids UUID[], p_sign INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_order_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    WITH changed AS (
+        SELECT DISTINCT order_id, product_id
+        FROM unnest(p_order_ids, p_product_ids) AS c(order_id, product_id)
+    ),
+    basket AS (
+        -- Leaving products may already be gone from order_items
+        SELECT order_id, product_id FROM order_items WHERE order_id = ANY(p_order_ids)
+        UNION
+        SELECT order_id, product_id FROM changed
+    ),
+    pairs AS (
+        -- Every pair in the order with at least one changed product, both directions
+        SELECT a.product_id, b.product_id AS other_id, COUNT(*) * p_sign AS co_count
+        FROM basket a
+        JOIN basket b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+        WHERE EXISTS (
+            SELECT 1 FROM changed c
+            WHERE c.order_id = a.order_id AND c.product_id IN (a.product_id, b.product_id)
+        )
+        GROUP BY a.product_id, b.product_id
+    ),
+    -- Upserts are sorted so concurrent orders lock rows in the same order
+    purchased AS (
+        INSERT INTO product_purchase_counts AS c (product_id, order_count)
+        SELECT product_id, COUNT(*) * p_sign FROM changed GROUP BY product_id ORDER BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET order_count = c.order_count + EXCLUDED.order_count
+    ),
+    paired AS (
+        INSERT INTO product_pair_counts AS c (product_id, other_id, co_count)
+        SELECT product_id, other_id, co_count FROM pairs ORDER BY product_id, other_id
+        ON CONFLICT (product_id, other_id) DO UPDATE SET co_count = c.co_count + EXCLUDED.co_count
+        RETURNING c.product_id
+    )
+    INSERT INTO recommendation_dirty (product_id)
+    SELECT DISTINCT product_id FROM paired ORDER BY product_id
+    ON CONFLICT (product_id) DO NOTHING;
+
+    IF p_sign < 0 THEN
+        -- Pairs are stored both ways, so every emptied pair starts at a basket product
+        DELETE FROM product_pair_counts
+        WHERE co_count <= 0
+        AND product_id = ANY(ARRAY(
+            SELECT product_id FROM order_items WHERE order_id = ANY(p_order_ids)
+        ) || p_product_ids);
+        DELETE FROM product_purchase_counts
+        WHERE order_count <= 0 AND product_id = ANY(p_product_ids);
+    END IF;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION maintain_co_purchases()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Same counting as shift_co_purchases, inlined in one statement because
+    -- this runs at every checkout
+    WITH basket_items AS (
+        -- Every item of the counted orders touched by this statement.
+        -- Transition tables have no statistics, so joining order_items to
+        -- new_items gets planned as a scan of all of order_items; id arrays
+        -- keep this an index lookup whatever the order history
+        SELECT order_id, product_id, item_id FROM order_items
+        WHERE order_id = ANY(ARRAY(
+            SELECT order_id FROM orders
+            WHERE order_id = ANY(ARRAY(SELECT DISTINCT order_id FROM new_items))
+            AND status <> 'cancelled'
+        ))
+    ),
+    fresh AS (
+        -- Products joining an order in this statement (not already in it)
+        SELECT DISTINCT n.order_id, n.product_id
+        FROM new_items n
+        WHERE n.order_id IN (SELECT order_id FROM basket_items)
+        AND NOT EXISTS (
+            SELECT 1 FROM basket_items o
+            WHERE o.order_id = n.order_id AND o.product_id = n.product_id
+            AND o.item_id NOT IN (SELECT item_id FROM new_items)
+        )
+    ),
+    basket AS (
+        SELECT DISTINCT order_id, product_id FROM basket_items
+        WHERE order_id IN (SELECT order_id FROM fresh)
+    ),
+    pairs AS (
+        -- Every pair in the order with at least one fresh product, both directions
+        SELECT a.product_id, b.product_id AS other_id, COUNT(*) AS co_count
+        FROM basket a
+        JOIN basket b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+        WHERE EXISTS (
+            SELECT 1 FROM fresh f
+            WHERE f.order_id = a.order_id AND f.product_id IN (a.product_id, b.product_id)
+        )
+        GROUP BY a.product_id, b.product_id
+    ),
+    -- Upserts are sorted so concurrent orders lock rows in the same order
+    purchased AS (
+        INSERT INTO product_purchase_counts AS c (product_id, order_count)
+        SELECT product_id, COUNT(*) FROM fresh GROUP BY product_id ORDER BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET order_count = c.order_count + EXCLUDED.order_count
+    ),
+    paired AS (
+        INSERT INTO product_pair_counts AS c (product_id, other_id, co_count)
+        SELECT product_id, other_id, co_count FROM pairs ORDER BY product_id, other_id
+        ON CONFLICT (product_id, other_id) DO UPDATE SET co_count = c.co_count + EXCLUDED.co_count
+        RETURNING c.product_id
+    )
+    INSERT INTO recommendation_dirty (product_id)
+    SELECT DISTINCT product_id FROM paired ORDER BY product_id
+    ON CONFLICT (product_id) DO NOTHING;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION forget_co_purchases()
+RETURNS TRIGGER AS $$
+DECLARE
+    order_ids UUID[];
+    product_ids UUID[];
+BEGIN
+    -- Products no longer in a counted order after this statement. Items
+    -- removed with their order have no order row left; the
+    -- forget_order_co_purchases trigger uncounted them before the delete
+    -- cascaded. Id arrays keep the lookups indexed, as in
+    -- maintain_co_purchases
+    SELECT array_agg(order_id), array_agg(product_id) INTO order_ids, product_ids
+    FROM (
+        SELECT DISTINCT d.order_id, d.product_id
+        FROM old_items d
+        WHERE d.order_id IN (
+            SELECT order_id FROM orders
+            WHERE order_id = ANY(ARRAY(SELECT DISTINCT order_id FROM old_items))
+            AND status <> 'cancelled'
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM order_items o
+            WHERE o.order_id = ANY(ARRAY(SELECT DISTINCT order_id FROM old_items))
+            AND o.order_id = d.order_id AND o.product_id = d.product_id
+        )
+    ) gone;
+    PERFORM shift_co_purchases(order_ids, product_ids, -1);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION maintain_order_co_purchases()
+RETURNS TRIGGER AS $$
+DECLARE
+    order_ids UUID[];
+    product_ids UUID[];
+BEGIN
+    SELECT array_agg(order_id), array_agg(product_id) INTO order_ids, product_ids
+    FROM (SELECT DISTINCT order_id, product_id FROM order_items WHERE order_id = OLD.order_id) basket;
+    -- Un-cancelling counts the basket again; cancelling or deleting uncounts it
+    PERFORM shift_co_purchases(order_ids, product_ids,
+                               CASE WHEN TG_OP = 'UPDATE' AND OLD.status = 'cancelled' THEN 1 ELSE -1 END);
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER maintain_order_items_co_purchases
+    AFTER INSERT ON order_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_co_purchases();
+
+CREATE TRIGGER forget_order_items_co_purchases
+    AFTER DELETE ON order_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION forget_co_purchases();
+
+CREATE TRIGGER maintain_orders_co_purchases_on_cancel
+    AFTER UPDATE OF status ON orders
+    FOR EACH ROW
+    WHEN ((OLD.status = 'cancelled') IS DISTINCT FROM (NEW.status = 'cancelled'))
+    EXECUTE FUNCTION maintain_order_co_purchases();
+
+-- BEFORE, while the order's items are still there to uncount
+CREATE TRIGGER forget_order_co_purchases
+    BEFORE DELETE ON orders
+    FOR EACH ROW
+    WHEN (OLD.status <> 'cancelled')
+    EXECUTE FUNCTION maintain_order_co_purchases();
+
 -- Insert initial configuration data
 INSERT INTO api_configurations (service_name, config_data) VALUES
 ('openai', '{"model": "gpt-3.5-turbo", "max_tokens": 150, "temperature": 0.7}'),
@@ -0,0 +1,33 @@
+"""
+Rebuild or refresh the co-purchase recommendation table
+
+Usage: python scripts/rebuild_recommendations.py [--refresh]
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from backend.services.recommendations import co_purchases, neighbor_refresher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--refresh', action='store_true',
+                        help='only re-rank products marked dirty instead of rebuilding from order_items')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.refresh:
+        refreshed = neighbor_refresher.drain()
+        print(f"Refreshed neighbors for {refreshed} products")
+    elif co_purchases.rebuild():
+        print("Rebuilt co-purchase neighbors from order_items")
+    else:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
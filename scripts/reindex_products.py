@@ -0,0 +1,38 @@
+"""
+Rebuild the Elasticsearch product index from PostgreSQL
+
+Usage: python scripts/reindex_products.py [--batch-size 500] [--queued]
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from backend.services.search import product_search
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--queued', action='store_true',
+                        help='only re-index products whose index update failed')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.queued:
+        indexed = 0
+        while True:
+            batch = product_search.reindex_dirty(batch_size=args.batch_size)
+            indexed += batch
+            if batch < args.batch_size:
+                break
+        print(f"Re-indexed {indexed} queued products into '{product_search.index}'")
+        return
+    indexed = product_search.reindex_all(batch_size=args.batch_size)
+    print(f"Indexed {indexed} products into '{product_search.index}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""
+Shared test setup
+"""
+import os
+import sys
+
+# Make the ``backend`` package importable when running ``pytest tests/``
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
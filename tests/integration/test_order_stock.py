@@ -0,0 +1,118 @@
+"""
+Integration tests for stock reservation against Postgres
+
+Needs a database loaded with scripts/init-db.sql, configured through the
+usual POSTGRES_* variables; skipped when none is reachable.
+"""
+import os
+import uuid
+import psycopg2
+import pytest
+from backend.models.order import Order, OrderRejected
+from backend.models.product import Product
+from backend.utils.database import db_manager
+
+
+@pytest.fixture(scope='module', autouse=True)
+def database():
+    try:
+        conn = psycopg2.connect(host=os.getenv('POSTGRES_HOST', 'localhost'),
+                                port=os.getenv('POSTGRES_PORT', '5432'),
+                                dbname=os.getenv('POSTGRES_DB', 'ecom_chatbot'),
+                                user=os.getenv('POSTGRES_USER', 'postgres'),
+                                password=os.getenv('POSTGRES_PASSWORD', 'password'),
+                                connect_timeout=2)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres not available: {e}")
+    with conn, conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('order_items') IS NOT NULL")
+        ready = cursor.fetchone()[0]
+    conn.close()
+    if not ready:
+        pytest.skip("Database schema not loaded")
+
+
+@pytest.fixture
+def catalog():
+    """A user and three products (stock 5, 2 and inactive), removed afterwards"""
+    user_id = str(uuid.uuid4())
+    products = {name: str(uuid.uuid4()) for name in ('speaker', 'headphones', 'retired')}
+    with db_manager.get_pg_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO users (user_id, username, email, password_hash)
+            VALUES (%s, %s, %s, 'x')
+        """, (user_id, user_id, f"{user_id}@test.invalid"))
+        for name, stock, active in (('speaker', 5, True), ('headphones', 2, True), ('retired', 9, False)):
+            cursor.execute("""
+                INSERT INTO products (product_id, external_id, source, name, price, stock_quantity, is_active)
+                VALUES (%s, %s, 'test', %s, 10, %s, %s)
+            """, (products[name], products[name], name, stock, active))
+    yield user_id, products
+    with db_manager.get_pg_cursor() as cursor:
+        cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM search_index_dirty WHERE product_id = ANY(%s::uuid[])",
+                       (list(products.values()),))
+        cursor.execute("DELETE FROM products WHERE product_id = ANY(%s::uuid[])", (list(products.values()),))
+
+
+def stock(products):
+    with db_manager.get_pg_cursor() as cursor:
+        cursor.execute("SELECT name, stock_quantity FROM products WHERE product_id = ANY(%s::uuid[])",
+                       (list(products.values()),))
+        return {row['name']: row['stock_quantity'] for row in cursor.fetchall()}
+
+
+def order_count(user_id):
+    with db_manager.get_pg_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS orders FROM orders WHERE user_id = %s", (user_id,))
+        return cursor.fetchone()['orders']
+
+
+def test_place_reserves_stock_and_queues_reindex(catalog):
+    user_id, products = catalog
+    
+    order, items = Order.place(user_id, {products['speaker']: 2, products['headphones']: 1})
+    
+    assert order.total_amount == 30
+    assert stock(products) == {'speaker': 3, 'headphones': 1, 'retired': 9}
+    with db_manager.get_pg_cursor() as cursor:
+        cursor.execute("SELECT product_id FROM search_index_dirty WHERE product_id = ANY(%s::uuid[])",
+                       (list(products.values()),))
+        assert {str(row['product_id']) for row in cursor.fetchall()} == {products['speaker'],
+                                                                       products['headphones']}
+
+
+def test_partial_reservation_rolls_back_with_409(catalog):
+    user_id, products = catalog
+    
+    with pytest.raises(OrderRejected) as rejected:
+        Order.place(user_id, {products['speaker']: 2, products['headphones']: 3})
+    
+    assert rejected.value.status == 409
+    assert rejected.value.product_ids == [products['headphones']]
+    assert stock(products) == {'speaker': 5, 'headphones': 2, 'retired': 9}
+    assert order_count(user_id) == 0
+
+
+@pytest.mark.parametrize('product', ['retired', 'unknown'])
+def test_unknown_or_inactive_product_is_rejected_with_400(catalog, product):
+    user_id, products = catalog
+    product_id = products.get(product, str(uuid.uuid4()))
+    
+    with pytest.raises(OrderRejected) as rejected:
+        Order.place(user_id, {products['speaker']: 1, product_id: 1})
+    
+    assert rejected.value.status == 400
+    assert rejected.value.product_ids == [product_id]
+    assert stock(products)['speaker'] == 5
+    assert order_count(user_id) == 0
+
+
+def test_stock_never_goes_below_zero(catalog):
+    _, products = catalog
+    
+    assert Product.adjust_stock(products['headphones'], -3) is None
+    assert Product.adjust_stock(products['headphones'], -2) == 0
+    assert Product.reserve_stock({products['headphones']: 1, products['speaker']: 5}) == {products['speaker']: 0}
+    assert Product.release_stock({products['speaker']: 1}) == {products['speaker']: 1}
+    assert stock(products) == {'speaker': 1, 'headphones': 0, 'retired': 9}
@@ -0,0 +1,14 @@
+"""
+Shared unit test fixtures
+"""
+import pytest
+from backend.utils.database import DatabaseManager
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """In-memory Redis behind db_manager.redis_client"""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(DatabaseManager, 'redis_client', property(lambda self: client))
+    return client
@@ -0,0 +1,45 @@
+"""
+Unit tests for slot-based model helpers
+"""
+from datetime import datetime
+from backend.models.base import RowMapper, SlotModel, parse_datetime
+
+
+class Widget(SlotModel):
+    __slots__ = ('widget_id', 'name', 'tags', 'created_at')
+    JSON_FIELDS = ('widget_id', 'name')
+
+
+def test_row_mapper_assigns_slots_without_init():
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    mapper = RowMapper(Widget)
+    
+    widget = mapper({'widget_id': 'w1', 'name': 'Lamp', 'tags': ['home'],
+                     'created_at': created, 'extra': 'ignored'})
+    
+    assert isinstance(widget, Widget)
+    assert (widget.widget_id, widget.name, widget.tags, widget.created_at) == ('w1', 'Lamp', ['home'], created)
+
+
+def test_row_mapper_defaults_fill_missing_and_null_columns():
+    mapper = RowMapper(Widget, {'tags': list})
+    
+    first, second = mapper.map_all([{'widget_id': 'w1', 'tags': None}, {'widget_id': 'w2'}])
+    
+    assert first.tags == [] and second.tags == []
+    assert first.tags is not second.tags
+    assert first.name is None
+
+
+def test_json_uses_declared_fields():
+    widget = RowMapper(Widget)({'widget_id': 'w1', 'name': 'Lamp', 'tags': []})
+    
+    assert widget.__json__() == {'widget_id': 'w1', 'name': 'Lamp'}
+
+
+def test_parse_datetime_accepts_cached_strings():
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    
+    assert parse_datetime(created) is created
+    assert parse_datetime(created.isoformat()) == created
+    assert parse_datetime(None) is None
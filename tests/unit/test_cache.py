@@ -0,0 +1,66 @@
+"""
+Unit tests for the stale-while-revalidate cache
+"""
+import json
+import time
+from backend.utils.cache import StaleWhileRevalidateCache
+from backend.utils.database import DatabaseManager
+
+
+class BrokenRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("Redis is down")
+        return fail
+
+
+def test_miss_without_redis_loads_directly(monkeypatch):
+    monkeypatch.setattr(DatabaseManager, 'redis_client', property(lambda self: BrokenRedis()))
+    swr = StaleWhileRevalidateCache('test', {'totals': (lambda: 42, 60)})
+    
+    started = time.monotonic()
+    result = swr.get('totals')
+    
+    assert result['value'] == 42
+    assert time.monotonic() - started < 1
+
+
+def test_failing_loader_returns_without_waiting(redis_client):
+    def loader():
+        raise RuntimeError("query failed")
+    
+    swr = StaleWhileRevalidateCache('test', {'totals': (loader, 60)}, wait_timeout=5)
+    
+    started = time.monotonic()
+    result = swr.get('totals')
+    
+    assert result == {'value': None, 'computed_at': None, 'stale': True}
+    assert time.monotonic() - started < 1
+    assert not redis_client.exists('swr:test:totals:lock')
+
+
+def test_wait_stops_when_lock_holder_gives_up(redis_client):
+    swr = StaleWhileRevalidateCache('test', {'totals': (lambda: 42, 60)}, wait_timeout=5)
+    redis_client.set('swr:test:totals:lock', 'other-worker', px=200)
+    
+    started = time.monotonic()
+    result = swr.get('totals')
+    
+    assert result['value'] is None
+    assert time.monotonic() - started < 1
+
+
+def test_refresh_does_not_release_another_workers_lock(redis_client, monkeypatch):
+    swr = StaleWhileRevalidateCache('test', {'totals': (lambda: 42, 60)})
+    lock_key = 'swr:test:totals:lock'
+    
+    def slow_compute(name):
+        # Our lock expired mid-refresh and another worker took it over
+        redis_client.set(lock_key, 'other-worker')
+        return {'value': 42, 'computed_at': time.time()}
+    
+    monkeypatch.setattr(swr, '_compute', slow_compute)
+    
+    assert swr.refresh('totals')
+    assert redis_client.get(lock_key) == b'other-worker'
+    assert json.loads(redis_client.get('swr:test:totals'))['value'] == 42
@@ -0,0 +1,190 @@
+"""
+Unit tests for the streaming chat routes
+"""
+import json
+import uuid
+from datetime import datetime, timezone
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from backend.models.chat import ChatSession, ChatMessage
+from backend.routes import chat as chat_routes
+from backend.routes.chat import chat_bp, _ndjson_history, _stream_reply
+from backend.services.responder import StubResponder
+from backend.utils.pagination import encode_cursor
+
+SESSION_ID = str(uuid.uuid4())
+ANCHOR = [datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc), str(uuid.uuid4())]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret'
+    JWTManager(app)
+    app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    monkeypatch.setattr(ChatSession, 'find_by_id',
+                        classmethod(lambda cls, session_id: ChatSession(session_id=session_id)))
+    return app.test_client()
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """No messages after the anchor; records the keyset params of each stream"""
+    reads = []
+    after_condition = ChatMessage._after_condition
+    
+    def fake_after_condition(session_id, cursor=None, since_id=None):
+        if since_id:
+            return "(created_at, message_id) > (%s, %s)", list(ANCHOR)
+        return after_condition(session_id, cursor, since_id)
+    
+    def fake_stream_rows(query, params, batch_size):
+        reads.append(params)
+        return iter([])
+    
+    monkeypatch.setattr(ChatMessage, '_after_condition', staticmethod(fake_after_condition))
+    monkeypatch.setattr(ChatMessage, '_stream_rows', staticmethod(fake_stream_rows))
+    return reads
+
+
+def stream_lines(response):
+    return [json.loads(line) for line in response.get_data().splitlines()]
+
+
+def test_ndjson_history_ends_with_cursor_of_last_message():
+    message = ChatMessage(session_id=SESSION_ID, content='hi')
+    
+    lines = [json.loads(line) for chunk in _ndjson_history([message], None, lines_per_chunk=1)
+             for line in chunk.splitlines()]
+    
+    assert lines[0]['message_id'] == message.message_id
+    assert lines[-1] == {'next_cursor': encode_cursor('chat_messages:session',
+                                                      [message.created_at, message.message_id])}
+
+
+def test_ndjson_history_echoes_cursor_when_empty():
+    lines = b''.join(_ndjson_history(iter([]), 'abc')).splitlines()
+    
+    assert [json.loads(line) for line in lines] == [{'next_cursor': 'abc'}]
+
+
+def test_empty_delta_after_since_id_returns_anchor_cursor(client, history):
+    response = client.get(f'/api/chat/history/{SESSION_ID}/stream?since_id={ANCHOR[1]}')
+    
+    assert response.status_code == 200
+    assert stream_lines(response) == [{'next_cursor': encode_cursor('chat_messages:session', ANCHOR)}]
+
+
+def test_cursor_from_since_id_resumes_at_same_position(client, history):
+    first = client.get(f'/api/chat/history/{SESSION_ID}/stream?since_id={ANCHOR[1]}')
+    cursor = stream_lines(first)[-1]['next_cursor']
+    
+    second = client.get(f'/api/chat/history/{SESSION_ID}/stream?cursor={cursor}')
+    
+    assert stream_lines(second) == [{'next_cursor': cursor}]
+    assert history == [[SESSION_ID, ANCHOR[0].isoformat(), ANCHOR[1]]] * 2
+
+
+def test_malformed_cursor_is_rejected_before_streaming(client, history):
+    response = client.get(f'/api/chat/history/{SESSION_ID}/stream?cursor=garbage')
+    
+    assert response.status_code == 400
+    assert history == []
+
+
+class FakeResponseCache:
+    def __init__(self, entry=None):
+        self.entry = entry
+        self.stored = []
+    
+    def get(self, message, intent, context_key, version):
+        return self.entry
+    
+    def put(self, message, intent, content, metadata, context_key, version):
+        self.stored.append(content)
+
+
+class FailingResponder(StubResponder):
+    def stream(self, message, context=None):
+        yield 'Partial '
+        raise RuntimeError("model went away")
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    """Stub responder, no context; records every turn passed to record_turn"""
+    recorded = []
+    
+    def fake_record_turn(cls, session_id, messages):
+        recorded.append([(m.sender_type, m.content, m.metadata) for m in messages])
+        return True
+    
+    monkeypatch.setattr(chat_routes, 'responder', StubResponder())
+    monkeypatch.setattr(chat_routes, 'response_cache', FakeResponseCache())
+    monkeypatch.setattr(ChatMessage, 'get_recent_messages', classmethod(lambda cls, session_id: []))
+    monkeypatch.setattr(ChatSession, 'record_turn', classmethod(fake_record_turn))
+    return recorded
+
+
+def parse_event(raw):
+    event, data = raw.rstrip('\n').split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+
+def user_message(content='laptops'):
+    return ChatMessage(session_id=SESSION_ID, sender_type='user', content=content)
+
+
+def test_stream_reply_sends_start_deltas_done(turns):
+    events = [parse_event(raw) for raw in _stream_reply(SESSION_ID, user_message())]
+    reply = StubResponder().complete('laptops')
+    
+    assert events[0][0] == 'start'
+    assert [name for name, _ in events[1:-1]] == ['delta'] * (len(events) - 2)
+    assert ''.join(data['text'] for _, data in events[1:-1]) == reply
+    assert events[-1][0] == 'done'
+    assert events[-1][1]['message_id'] == events[0][1]['message_id']
+    assert events[-1][1]['content'] == reply
+    assert len(turns) == 1
+    assert turns[0][1][1] == reply
+    assert 'truncated' not in turns[0][1][2]
+
+
+def test_stream_reply_serves_cached_reply_in_one_delta(turns, monkeypatch):
+    cache = FakeResponseCache({'content': 'Cached reply', 'metadata': {'suggestions': []}})
+    monkeypatch.setattr(chat_routes, 'response_cache', cache)
+    
+    events = [parse_event(raw) for raw in _stream_reply(SESSION_ID, user_message())]
+    
+    assert [name for name, _ in events] == ['start', 'delta', 'done']
+    assert events[1][1] == {'text': 'Cached reply'}
+    assert turns[0][1][2] == {'suggestions': [], 'cached': True}
+
+
+def test_stream_reply_reports_unknown_session(turns, monkeypatch):
+    monkeypatch.setattr(ChatSession, 'record_turn', classmethod(lambda cls, session_id, messages: False))
+    
+    events = [parse_event(raw) for raw in _stream_reply(SESSION_ID, user_message())]
+    
+    assert events[-1] == ('error', {'error': 'Invalid session ID'})
+
+
+def test_stream_reply_error_stores_partial_reply(turns, monkeypatch):
+    monkeypatch.setattr(chat_routes, 'responder', FailingResponder())
+    
+    events = [parse_event(raw) for raw in _stream_reply(SESSION_ID, user_message())]
+    
+    assert [name for name, _ in events] == ['start', 'delta', 'error']
+    assert turns == [[('user', 'laptops', {}), ('bot', 'Partial ', {'truncated': True})]]
+
+
+def test_client_disconnect_stores_truncated_reply(turns):
+    stream = _stream_reply(SESSION_ID, user_message())
+    received = [parse_event(next(stream)) for _ in range(3)]
+    
+    stream.close()
+    
+    partial = ''.join(data['text'] for name, data in received if name == 'delta')
+    assert partial and partial != StubResponder().complete('laptops')
+    assert turns == [[('user', 'laptops', {}), ('bot', partial, {'truncated': True})]]
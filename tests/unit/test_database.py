@@ -0,0 +1,42 @@
+"""
+Unit tests for database write helpers
+"""
+from backend.utils import database
+from backend.utils.database import bulk_upsert
+
+
+class RecordingCursor:
+    rowcount = 0
+
+
+def test_bulk_upsert_collapses_duplicate_keys_last_write_wins(monkeypatch):
+    pages = []
+    
+    def fake_execute_values(cursor, query, page, page_size):
+        pages.append(list(page))
+        cursor.rowcount = len(page)
+    
+    monkeypatch.setattr(database, 'execute_values', fake_execute_values)
+    rows = [('a', 1), ('b', 2), ('a', 3)]
+    
+    written = bulk_upsert(RecordingCursor(), 'items', ('id', 'value'), rows, conflict_columns=('id',))
+    
+    assert written == 2
+    assert pages == [[('a', 3), ('b', 2)]]
+
+
+def test_bulk_upsert_dedupes_across_pages(monkeypatch):
+    pages = []
+    
+    def fake_execute_values(cursor, query, page, page_size):
+        pages.append(list(page))
+        cursor.rowcount = len(page)
+    
+    monkeypatch.setattr(database, 'execute_values', fake_execute_values)
+    rows = [('a', 1), ('b', 2), ('a', 3), ('c', 4)]
+    
+    bulk_upsert(RecordingCursor(), 'items', ('id', 'value'), rows, conflict_columns=('id',), page_size=2)
+    
+    keys = [row[0] for page in pages for row in page]
+    assert sorted(keys) == ['a', 'b', 'c']
+    assert ('a', 3) in pages[0] + pages[1]
@@ -0,0 +1,110 @@
+"""
+Unit tests for the memory-mapped embedding index
+"""
+import os
+from types import SimpleNamespace
+import pytest
+from backend.services.embeddings import EmbeddingIndex, HashingEmbedder
+
+
+def product(product_id, name, description='', category='audio', is_active=True):
+    return SimpleNamespace(product_id=product_id, name=name, brand=None, category=category,
+                           description=description, is_active=is_active)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return EmbeddingIndex(str(tmp_path / 'embeddings'), HashingEmbedder(dim=64), refresh_interval=0,
+                          block_rows=2, compact_min_rows=1000)
+
+
+def test_search_returns_closest_products_first(index):
+    index.upsert([
+        product('p1', 'wireless headphones', 'noise cancelling over ear'),
+        product('p2', 'running shoes', 'lightweight trail shoes', category='sports'),
+        product('p3', 'bluetooth speaker', 'portable speaker'),
+    ])
+    
+    hits = index.search_text(['wireless noise cancelling headphones', 'trail running shoes'], k=2)
+    
+    assert hits[0][0][0] == 'p1'
+    assert hits[1][0][0] == 'p2'
+    assert len(index) == 3
+
+
+def test_unchanged_products_are_not_appended(index):
+    headphones = product('p1', 'wireless headphones')
+    
+    assert index.upsert([headphones]) == 1
+    assert index.upsert([headphones]) == 0
+    headphones.description = 'now with longer battery life'
+    assert index.upsert([headphones]) == 1
+    assert index.dead_rows() == 1
+
+
+def test_inactive_and_removed_products_leave_results(index):
+    index.upsert([product('p1', 'wireless headphones'), product('p2', 'wired headphones')])
+    
+    assert index.upsert([product('p1', 'wireless headphones', is_active=False)]) == 1
+    assert index.remove(['p2', 'unknown']) == 1
+    
+    assert index.search_text(['headphones'])[0] == []
+    assert index.upsert([product('p1', 'wireless headphones', is_active=False)]) == 0
+
+
+def test_compacts_once_dead_rows_pass_threshold(tmp_path):
+    index = EmbeddingIndex(str(tmp_path / 'embeddings'), HashingEmbedder(dim=16), refresh_interval=0,
+                           compact_ratio=0.5, compact_min_rows=3)
+    speaker = product('p1', 'speaker')
+    index.upsert([speaker, product('p2', 'headphones')])
+    
+    for version in range(3):
+        speaker.description = f"revision {version}"
+        index.upsert([speaker])
+    
+    assert index.dead_rows() == 0
+    assert len(index) == 2
+    assert len([name for name in os.listdir(index.path) if name.startswith('gen-')]) == 1
+    assert index.search_text(['speaker revision 2'], k=1)[0][0][0] == 'p1'
+
+
+def test_other_processes_see_appends(tmp_path):
+    path = str(tmp_path / 'embeddings')
+    writer = EmbeddingIndex(path, HashingEmbedder(dim=16), refresh_interval=0)
+    reader = EmbeddingIndex(path, HashingEmbedder(dim=16), refresh_interval=0)
+    
+    writer.upsert([product('p1', 'speaker')])
+    assert len(reader) == 1
+    writer.compact()
+    writer.upsert([product('p2', 'headphones')])
+    assert len(reader) == 2
+
+
+def test_append_discards_rows_left_by_crashed_writer(index):
+    index.upsert([product('p1', 'wireless headphones')])
+    directory = index._current_dir()
+    # Crash after writing a vector but before its id line completed
+    with open(os.path.join(directory, 'vectors.f32'), 'ab') as f:
+        f.write(HashingEmbedder(dim=64).embed('garbage').tobytes())
+    with open(os.path.join(directory, 'ids.txt'), 'ab') as f:
+        f.write(b'p9\tdead')
+    
+    index.upsert([product('p2', 'running shoes', category='sports')])
+    
+    hits = index.search_text(['running shoes sports'], k=1)[0]
+    assert hits[0][0] == 'p2'
+    assert hits[0][1] == pytest.approx(1.0)
+    assert len(index) == 2
+    assert os.path.getsize(os.path.join(directory, 'vectors.f32')) == 2 * 64 * 4
+
+
+def test_refresh_survives_generation_removed_underneath(tmp_path):
+    path = str(tmp_path / 'embeddings')
+    writer = EmbeddingIndex(path, HashingEmbedder(dim=16), refresh_interval=0)
+    writer.upsert([product('p1', 'speaker')])
+    os.remove(os.path.join(writer._current_dir(), 'vectors.f32'))
+    reader = EmbeddingIndex(path, HashingEmbedder(dim=16), refresh_interval=0)
+    
+    assert len(reader) == 0
+    writer.rebuild([[product('p1', 'speaker')]])
+    assert len(reader) == 1
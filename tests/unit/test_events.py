@@ -0,0 +1,90 @@
+"""
+Unit tests for buffered analytics ingestion
+"""
+import time
+from contextlib import contextmanager
+import psycopg2
+import pytest
+from backend.models import analytics
+from backend.models.analytics import AnalyticsEvent
+from backend.services.events import EventBuffer
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_buffer_retries_batch_until_sink_recovers():
+    calls = []
+    
+    def flaky_sink(batch):
+        calls.append(list(batch))
+        if len(calls) < 3:
+            raise psycopg2.OperationalError("server closed the connection")
+        return len(batch)
+    
+    buffer = EventBuffer(flaky_sink, batch_size=10, flush_interval=0.01,
+                         retry_backoff=0.01, max_backoff=0.02)
+    for i in range(5):
+        assert buffer.offer(i)
+    
+    wait_for(lambda: buffer.stats()['flushed'] == 5)
+    buffer.close()
+    
+    stats = buffer.stats()
+    assert stats['failed'] == 0
+    assert stats['retries'] == 2
+    assert calls[-1] == [0, 1, 2, 3, 4]
+
+
+def test_buffer_counts_rows_the_sink_rejects():
+    buffer = EventBuffer(lambda batch: len(batch) - 1, batch_size=4, flush_interval=0.01)
+    for i in range(4):
+        buffer.offer(i)
+    
+    wait_for(lambda: buffer.stats()['batches'] == 1)
+    buffer.close()
+    
+    assert buffer.stats()['flushed'] == 3
+    assert buffer.stats()['failed'] == 1
+
+
+@pytest.fixture
+def copy_calls(monkeypatch):
+    """Route AnalyticsEvent.save_many's COPY to a fake that rejects 'bad' events"""
+    calls = []
+    
+    @contextmanager
+    def fake_cursor(*args, **kwargs):
+        yield None
+    
+    def fake_copy_rows(cursor, table, columns, rows):
+        calls.append(len(rows))
+        if any(row[3] == 'bad' for row in rows):
+            raise psycopg2.IntegrityError("violates foreign key constraint")
+        if any(row[3] == 'outage' for row in rows):
+            raise psycopg2.OperationalError("could not connect to server")
+        return len(rows)
+    
+    monkeypatch.setattr(analytics.db_manager, 'get_pg_cursor', fake_cursor)
+    monkeypatch.setattr(analytics, 'copy_rows', fake_copy_rows)
+    return calls
+
+
+def test_save_many_isolates_rows_with_bad_data(copy_calls):
+    events = [AnalyticsEvent(event_type='page_view') for _ in range(7)]
+    events[5].event_type = 'bad'
+    
+    assert AnalyticsEvent.save_many(events) == 6
+
+
+def test_save_many_does_not_split_on_connection_errors(copy_calls):
+    events = [AnalyticsEvent(event_type='outage') for _ in range(8)]
+    
+    with pytest.raises(psycopg2.OperationalError):
+        AnalyticsEvent.save_many(events)
+    assert copy_calls == [8]
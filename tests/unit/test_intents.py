@@ -0,0 +1,46 @@
+"""
+Unit tests for in-process intent classification
+"""
+from types import SimpleNamespace
+import pytest
+from backend.services.intents import IntentClassifier, OTHER
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return IntentClassifier()
+
+
+@pytest.mark.parametrize('text, intent', [
+    ("Where is my order #123456?", 'order_status'),
+    ("I'd like to speak to a human please", 'support'),
+    ("What's the battery life on this one?", 'product_info'),
+    ("Show me running shoes under $100", 'product_search'),
+])
+def test_classifies_pattern_matches(classifier, text, intent):
+    assert classifier.classify(text).intent == intent
+
+
+def test_batch_matches_single_classification(classifier):
+    texts = ["track my package", "i want a refund", "", "looking for a laptop"]
+    
+    assert classifier.classify_batch(texts) == [classifier.classify(text) for text in texts]
+
+
+def test_empty_and_unknown_messages_are_other(classifier):
+    assert classifier.classify('').intent == OTHER
+    assert classifier.classify(None).intent == OTHER
+    assert classifier.classify('zxqv wplk').intent == OTHER
+
+
+def test_tag_only_labels_untagged_user_messages(classifier):
+    user = SimpleNamespace(sender_type='user', content='where is my order', metadata=None)
+    tagged = SimpleNamespace(sender_type='user', content='refund', metadata={'intent': 'support'})
+    bot = SimpleNamespace(sender_type='bot', content='show me laptops', metadata={})
+    
+    classifier.tag([user, tagged, bot])
+    
+    assert user.metadata['intent'] == 'order_status'
+    assert 0 < user.metadata['intent_confidence'] <= 1
+    assert tagged.metadata == {'intent': 'support'}
+    assert bot.metadata == {}
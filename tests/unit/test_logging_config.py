@@ -0,0 +1,42 @@
+"""
+Unit tests for sampled logging
+"""
+import logging
+from backend.utils.logging_config import SamplingFilter, parse_sample_rates
+
+
+def make_record(name='backend.models.user', level=logging.INFO, route=None):
+    record = logging.LogRecord(name, level, __file__, 1, 'message', (), None)
+    if route is not None:
+        record.route = route
+    return record
+
+
+def test_longest_logger_prefix_wins():
+    sampler = SamplingFilter({'backend': 0.5, 'backend.models': 0.1, 'backend.models.user': 0.2})
+    
+    assert sampler.rate_for(make_record('backend.models.user')) == 0.2
+    assert sampler.rate_for(make_record('backend.models.order')) == 0.1
+    assert sampler.rate_for(make_record('backend.routes')) == 0.5
+    assert sampler.rate_for(make_record('backendish')) == 1.0
+
+
+def test_route_rate_overrides_logger_rate():
+    sampler = SamplingFilter({'backend.models': 1.0, 'route:chat.send_message': 0.05})
+    
+    assert sampler.rate_for(make_record(route='chat.send_message')) == 0.05
+    assert sampler.rate_for(make_record(route='products.get_product')) == 1.0
+
+
+def test_warnings_are_never_dropped():
+    sampler = SamplingFilter(default_rate=0.0)
+    
+    assert not sampler.filter(make_record())
+    assert sampler.filter(make_record(level=logging.WARNING))
+    assert sampler.filter(make_record(level=logging.ERROR))
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates('backend.models=0.1, route:chat.send_message=0.05,bad') == {
+        'backend.models': 0.1, 'route:chat.send_message': 0.05
+    }
@@ -0,0 +1,64 @@
+"""
+Unit tests for keyset pagination cursors
+"""
+import uuid
+from datetime import datetime, timezone
+import pytest
+from backend.utils.pagination import encode_cursor, decode_cursor, cursor_kind, InvalidCursor, KEYSET_TYPES
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    message_id = uuid.uuid4()
+    
+    token = encode_cursor('chat_messages:session', [created_at, message_id])
+    
+    assert decode_cursor(token, 'chat_messages:session') == [created_at.isoformat(), str(message_id)]
+    assert cursor_kind(token) == 'chat_messages:session'
+
+
+def test_cursor_is_url_safe_without_padding():
+    token = encode_cursor('orders:user', ['2024-05-01T00:00:00', 'a' * 37])
+    
+    assert '=' not in token
+    assert all(c.isalnum() or c in '-_' for c in token)
+
+
+def test_cursor_from_another_listing_is_rejected():
+    token = encode_cursor('orders:user', ['2024-05-01T00:00:00', 'x'])
+    
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 'chat_messages:session')
+
+
+@pytest.mark.parametrize('token', ['', 'not-base64!', encode_cursor('orders:user', []) + 'x', 'W10'])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 'orders:user')
+
+
+def test_cursor_kind_rejects_garbage():
+    with pytest.raises(InvalidCursor):
+        cursor_kind('%%%')
+
+
+@pytest.mark.parametrize('values', [
+    ['2024-05-01T00:00:00'],
+    ['2024-05-01T00:00:00', str(uuid.uuid4()), 'extra'],
+    ['yesterday', str(uuid.uuid4())],
+    [None, str(uuid.uuid4())],
+    ['2024-05-01T00:00:00', 'not-a-uuid'],
+])
+def test_cursor_with_wrong_shape_is_rejected(values):
+    token = encode_cursor('orders:user', values)
+    
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 'orders:user', KEYSET_TYPES)
+
+
+def test_cursor_types_accept_encoded_keyset():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    order_id = uuid.uuid4()
+    token = encode_cursor('orders:user', [created_at, order_id])
+    
+    assert decode_cursor(token, 'orders:user', KEYSET_TYPES) == [created_at.isoformat(), str(order_id)]
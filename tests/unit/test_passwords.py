@@ -0,0 +1,24 @@
+"""
+Unit tests for password hashing
+"""
+import threading
+import pytest
+from backend.utils.passwords import PasswordHasher, HasherBusyError
+
+
+def test_needs_rehash_only_upgrades_cost():
+    hasher = PasswordHasher(rounds=12)
+    
+    assert hasher.needs_rehash('$2b$10$' + 'a' * 53)
+    assert not hasher.needs_rehash('$2b$12$' + 'a' * 53)
+    assert not hasher.needs_rehash('$2b$13$' + 'a' * 53)
+    assert hasher.needs_rehash('not-a-bcrypt-hash')
+
+
+def test_slow_hash_raises_busy_instead_of_timeout():
+    hasher = PasswordHasher(max_workers=1, timeout=0.05, rounds=4)
+    release = threading.Event()
+    
+    with pytest.raises(HasherBusyError):
+        hasher._run(release.wait, 5)
+    release.set()
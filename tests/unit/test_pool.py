@@ -0,0 +1,171 @@
+"""
+Unit tests for the PostgreSQL connection pool
+"""
+import threading
+import time
+import pytest
+from psycopg2 import extensions
+from backend.utils.database import PostgresConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def execute(self, query):
+        self.conn.queries += 1
+        if self.conn.broken:
+            raise RuntimeError("server closed the connection")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.queries = 0
+        self.rollbacks = 0
+    
+    def cursor(self):
+        return FakeCursor(self)
+    
+    def get_transaction_status(self):
+        return self.status
+    
+    def rollback(self):
+        if self.broken:
+            raise RuntimeError("server closed the connection")
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+    
+    def close(self):
+        self.closed = 1
+
+
+class FakePool(PostgresConnectionPool):
+    def __init__(self, **kwargs):
+        self.connections = []
+        super().__init__({}, **kwargs)
+    
+    def _connect(self):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+
+def test_reuses_returned_connection():
+    pool = FakePool(min_size=1, max_size=2)
+    
+    conn = pool.getconn()
+    pool.putconn(conn)
+    
+    assert pool.getconn() is conn
+    assert pool.stats()['created'] == 1
+
+
+def test_getconn_times_out_when_exhausted():
+    pool = FakePool(min_size=0, max_size=1)
+    pool.getconn()
+    
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn(timeout=0.1)
+    
+    assert 0.1 <= time.monotonic() - started < 1
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_getconn_blocks_until_a_connection_is_returned():
+    pool = FakePool(min_size=0, max_size=1)
+    conn = pool.getconn()
+    threading.Timer(0.1, pool.putconn, args=(conn,)).start()
+    
+    assert pool.getconn(timeout=2) is conn
+    assert pool.stats()['waits'] == 1
+
+
+def test_discards_connections_failing_validation():
+    pool = FakePool(min_size=1, max_size=1, validate_after=0)
+    stale = pool.connections[0]
+    stale.broken = True
+    
+    conn = pool.getconn()
+    
+    assert conn is not stale and stale.closed
+    assert pool.stats()['discarded'] == 1
+    assert pool.stats()['size'] == 1
+
+
+def test_discards_connections_past_max_lifetime():
+    pool = FakePool(min_size=1, max_size=1, max_lifetime=0.05)
+    old = pool.connections[0]
+    time.sleep(0.1)
+    
+    conn = pool.getconn()
+    
+    assert conn is not old and old.closed
+
+
+def test_putconn_rolls_back_open_transactions():
+    pool = FakePool(min_size=0, max_size=1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    
+    pool.putconn(conn)
+    
+    assert conn.rollbacks == 1 and not conn.closed
+    assert pool.stats()['idle'] == 1
+
+
+def test_putconn_discards_when_rollback_fails_or_asked():
+    pool = FakePool(min_size=0, max_size=2)
+    broken, unwanted = pool.getconn(), pool.getconn()
+    broken.status = extensions.TRANSACTION_STATUS_INERROR
+    broken.broken = True
+    
+    pool.putconn(broken)
+    pool.putconn(unwanted, discard=True)
+    
+    assert broken.closed and unwanted.closed
+    assert pool.stats()['size'] == 0 and pool.stats()['idle'] == 0
+
+
+def test_putconn_ignores_foreign_connections():
+    pool = FakePool(min_size=0, max_size=1)
+    
+    pool.putconn(FakeConnection())
+    
+    assert pool.stats()['idle'] == 0
+
+
+def test_closeall_closes_idle_and_refuses_checkouts():
+    pool = FakePool(min_size=2, max_size=2)
+    in_use = pool.getconn()
+    
+    pool.closeall()
+    
+    assert [conn.closed for conn in pool.connections if conn is not in_use] == [1]
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    pool.putconn(in_use)
+    assert in_use.closed
+    assert pool.stats()['size'] == 0
+
+
+def test_failed_connect_frees_the_slot():
+    pool = FakePool(min_size=0, max_size=1)
+    
+    def refuse():
+        raise RuntimeError("connection refused")
+    
+    pool._connect = refuse
+    with pytest.raises(RuntimeError):
+        pool.getconn()
+    
+    assert pool.stats()['size'] == 0
@@ -0,0 +1,70 @@
+"""
+Unit tests for token-bucket rate limiting
+"""
+import pytest
+from backend.utils import rate_limit
+from backend.utils.rate_limit import (RateLimit, RateLimiter, TOKEN_BUCKET_SCRIPT,
+                                      buckets_for_request)
+
+
+def run_script(client, keys, limits, requested=1, lease_fraction=1.0):
+    args = [requested, lease_fraction]
+    for limit in limits:
+        args.extend((limit.capacity, limit.capacity / limit.period))
+    result = client.register_script(TOKEN_BUCKET_SCRIPT)(keys=keys, args=args)
+    return int(result[0]), [(int(result[i]), float(result[i + 1])) for i in range(1, len(result), 2)]
+
+
+def test_script_drains_bucket_then_denies(redis_client):
+    limit = RateLimit('test', 3, 3600)
+    
+    grants = [run_script(redis_client, ['a'], [limit]) for _ in range(4)]
+    
+    assert [denied for denied, _ in grants] == [0, 0, 0, 1]
+    assert [buckets[0][0] for _, buckets in grants] == [1, 1, 1, 0]
+    assert grants[2][1][0][1] == pytest.approx(0, abs=0.01)
+
+
+def test_script_leases_a_fraction_of_what_is_left(redis_client):
+    limit = RateLimit('test', 100, 3600)
+    
+    denied, buckets = run_script(redis_client, ['a'], [limit], requested=10, lease_fraction=0.05)
+    
+    assert denied == 0
+    assert buckets[0][0] == 5
+    assert buckets[0][1] == pytest.approx(95, abs=0.01)
+
+
+def test_script_charges_no_bucket_when_one_denies(redis_client):
+    roomy, tight = RateLimit('roomy', 10, 3600), RateLimit('tight', 1, 3600)
+    run_script(redis_client, ['tight'], [tight])
+    
+    denied, buckets = run_script(redis_client, ['roomy', 'tight'], [roomy, tight])
+    
+    assert denied == 2
+    assert buckets[0] == (0, pytest.approx(10, abs=0.01))
+
+
+def test_check_does_not_spend_earlier_budgets_on_denied_request(redis_client):
+    limiter = RateLimiter(lease_size=1)
+    roomy, tight = RateLimit('roomy', 10, 3600), RateLimit('tight', 1, 3600)
+    
+    assert limiter.check([('ip', roomy), ('route', tight)]).allowed
+    for _ in range(3):
+        assert not limiter.check([('ip', roomy), ('route', tight)]).allowed
+    
+    assert limiter.check([('ip', roomy)]).remaining == 8
+
+
+def test_buckets_for_request_keys():
+    anonymous = buckets_for_request('chat.send_message', '10.0.0.1')
+    signed_in = buckets_for_request('chat.send_message', '10.0.0.1', 'user-1')
+    
+    assert [key for key, _ in anonymous] == [
+        'ip-minute:10.0.0.1', 'ip-hour:10.0.0.1', 'chat-message:10.0.0.1'
+    ]
+    assert [key for key, _ in signed_in] == [
+        'ip-minute:10.0.0.1', 'ip-hour:10.0.0.1', 'user-minute:user-1', 'chat-message:user-1'
+    ]
+    assert signed_in[-1][1] is rate_limit.ROUTE_LIMITS['chat.send_message']
+    assert len(buckets_for_request('products.get_product', '10.0.0.1')) == len(rate_limit.IP_LIMITS)
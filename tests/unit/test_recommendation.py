@@ -0,0 +1,101 @@
+"""
+Unit tests for co-purchase recommendations
+"""
+import uuid
+from contextlib import contextmanager
+import pytest
+from backend.models import product as product_module
+from backend.models import recommendation
+from backend.models.product import Product
+from backend.models.recommendation import CoPurchaseModel
+
+
+class ScriptedCursor:
+    """Records statements; each fetch returns the next scripted result"""
+    
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+    
+    def execute(self, sql, params=None):
+        if self.results and isinstance(self.results[0], Exception):
+            raise self.results.pop(0)
+        self.statements.append((' '.join(sql.split()), params))
+    
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def use_cursor(monkeypatch, module, cursor):
+    @contextmanager
+    def fake_cursor(*args, **kwargs):
+        yield cursor
+    
+    monkeypatch.setattr(module.db_manager, 'get_pg_cursor', fake_cursor)
+
+
+def product_row(name, category='audio'):
+    return {'product_id': str(uuid.uuid4()), 'name': name, 'category': category, 'is_active': True}
+
+
+def test_refresh_dirty_reranks_only_claimed_products(monkeypatch):
+    dirty = [str(uuid.uuid4()), str(uuid.uuid4())]
+    cursor = ScriptedCursor([[{'product_id': pid} for pid in dirty]])
+    use_cursor(monkeypatch, recommendation, cursor)
+    
+    assert CoPurchaseModel(top_k=5).refresh_dirty(batch_size=10) == 2
+    
+    claim, delete, rank = cursor.statements
+    assert claim[1] == (10,)
+    assert 'SKIP LOCKED' in claim[0]
+    assert delete[0].startswith('DELETE FROM product_neighbors') and delete[1] == (dirty,)
+    assert 'pc.product_id = ANY(%(product_ids)s::uuid[])' in rank[0]
+    assert rank[1] == {'product_ids': dirty, 'min_co_count': 1, 'top_k': 5}
+
+
+def test_refresh_dirty_with_empty_queue_does_nothing(monkeypatch):
+    cursor = ScriptedCursor([[]])
+    use_cursor(monkeypatch, recommendation, cursor)
+    
+    assert CoPurchaseModel().refresh_dirty() == 0
+    assert len(cursor.statements) == 1
+
+
+def test_refresh_dirty_reports_zero_on_database_error(monkeypatch):
+    use_cursor(monkeypatch, recommendation, ScriptedCursor([RuntimeError("deadlock detected")]))
+    
+    assert CoPurchaseModel().refresh_dirty() == 0
+
+
+def test_product_without_neighbors_falls_back_to_category(monkeypatch):
+    similar = [product_row('wired headphones'), product_row('earbuds')]
+    cursor = ScriptedCursor([[], similar])
+    use_cursor(monkeypatch, product_module, cursor)
+    
+    recommended = Product.get_recommendations(product_id='p1', limit=2)
+    
+    assert [p.name for p in recommended] == ['wired headphones', 'earbuds']
+    assert 'FROM product_neighbors' in cursor.statements[0][0]
+    assert 'JOIN products p2 ON p1.category = p2.category' in cursor.statements[1][0]
+    assert cursor.statements[1][1] == ('p1', 'p1', 2)
+
+
+def test_product_with_neighbors_skips_fallback(monkeypatch):
+    cursor = ScriptedCursor([[product_row('headphone case')]])
+    use_cursor(monkeypatch, product_module, cursor)
+    
+    assert [p.name for p in Product.get_recommendations(product_id='p1')] == ['headphone case']
+    assert len(cursor.statements) == 1
+
+
+@pytest.mark.parametrize('user_id, empty_queries', [('u1', 1), (None, 0)])
+def test_falls_back_to_best_sellers_then_newest(monkeypatch, user_id, empty_queries):
+    cursor = ScriptedCursor([[]] * empty_queries + [[], [product_row('newest speaker')]])
+    use_cursor(monkeypatch, product_module, cursor)
+    
+    recommended = Product.get_recommendations(user_id=user_id)
+    
+    assert [p.name for p in recommended] == ['newest speaker']
+    tables = [sql for sql, _ in cursor.statements]
+    assert 'FROM product_purchase_counts' in tables[-2]
+    assert tables[-1].startswith('SELECT * FROM products WHERE is_active = true ORDER BY updated_at DESC')
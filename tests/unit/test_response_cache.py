@@ -0,0 +1,62 @@
+"""
+Unit tests for the chat response cache
+"""
+import pytest
+from backend.services.responder import StubResponder
+from backend.services.response_cache import ResponseCache
+
+INTENT = 'product_search'
+
+
+def ask(cache, responder, message, reply_for):
+    """Answer a message the way the chat route does, returning the reply"""
+    context_key = responder.context_key() if responder.shares_replies else ''
+    cached = cache.get(message, INTENT, context_key, responder.version)
+    if cached:
+        return cached['content']
+    reply = reply_for(message)
+    cache.put(message, INTENT, reply, {}, context_key, responder.version)
+    return reply
+
+
+def test_two_users_two_messages_no_reply_crosses_with_stub(redis_client):
+    cache = ResponseCache(near_duplicates=True, similarity=0.1)
+    responder = StubResponder()
+    
+    alice = ask(cache, responder, "show me red laptops for alice", responder.complete)
+    bob = ask(cache, responder, "show me red laptops for bob", responder.complete)
+    
+    assert 'alice' in alice and 'alice' not in bob
+    assert 'bob' in bob
+
+
+def test_two_users_two_messages_no_reply_crosses_by_default(redis_client):
+    cache = ResponseCache()
+    responder = StubResponder()
+    responder.shares_replies = True
+    
+    alice = ask(cache, responder, "show me red laptops", lambda message: "Here are red laptops")
+    bob = ask(cache, responder, "show me laptops in red", lambda message: "Here are laptops in red")
+    
+    assert alice == "Here are red laptops"
+    assert bob == "Here are laptops in red"
+
+
+def test_replies_quoting_the_question_are_not_cached(redis_client):
+    cache = ResponseCache()
+    
+    assert not cache.put("gift for my wife anna", INTENT, "You asked: 'gift for my wife Anna'.",
+                         {}, 'stateless', 'v1')
+    assert cache.put("show me laptops", INTENT, "Here are our laptops", {}, 'stateless', 'v1')
+
+
+def test_entries_need_a_context_key_and_matching_version(redis_client):
+    cache = ResponseCache()
+    
+    assert not cache.put("show me laptops", INTENT, "Here are our laptops", {}, '', 'v1')
+    assert cache.get("show me laptops", INTENT, '', 'v1') is None
+    
+    cache.put("show me laptops", INTENT, "Here are our laptops", {}, 'stateless', 'v1')
+    assert cache.get("Show me laptops!", INTENT, 'stateless', 'v1')['content'] == "Here are our laptops"
+    assert cache.get("show me laptops", INTENT, 'stateless', 'v2') is None
+    assert cache.get("show me laptops", INTENT, 'other-context', 'v1') is None
@@ -0,0 +1,33 @@
+"""
+Consistency checks for scripts/init-db.sql
+"""
+import os
+import re
+
+SCHEMA = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'init-db.sql')
+TABLE_RE = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+) \((.*?)\n\);", re.S)
+
+
+def primary_keys():
+    with open(SCHEMA) as f:
+        schema = f.read()
+    keys = {}
+    for table, body in TABLE_RE.findall(schema):
+        keys[table] = set(re.findall(r"^\s*(\w+) \w+.*PRIMARY KEY", body, re.M))
+    return schema, keys
+
+
+def test_foreign_keys_reference_primary_keys():
+    schema, keys = primary_keys()
+    references = re.findall(r"REFERENCES (\w+)\((\w+)\)", schema)
+    
+    assert references
+    for table, column in references:
+        assert column in keys[table], f"{table}({column}) is not the primary key of {table}"
+
+
+def test_co_purchase_tables_use_model_identifiers():
+    _, keys = primary_keys()
+    
+    assert keys['products'] == {'product_id'}
+    assert keys['orders'] == {'order_id'}
@@ -0,0 +1,30 @@
+"""
+Unit tests for the user identity cache
+"""
+from backend.models import user as user_module
+from backend.models.user import User
+
+
+class RecordingCache:
+    def __init__(self):
+        self.entries = {}
+    
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def test_cache_never_stores_password_hash(monkeypatch):
+    cache = RecordingCache()
+    monkeypatch.setattr(user_module, 'user_cache', cache)
+    user = User(email='a@example.com', username='a', password_hash='$2b$12$secret')
+    
+    user.cache()
+    
+    assert 'password_hash' not in cache.entries[user.user_id]
+    assert User.from_dict(cache.entries[user.user_id]).password_hash is None
+
+
+def test_save_refuses_user_without_hash():
+    user = User(email='a@example.com', username='a')
+    
+    assert user.save() is False